@@ -1,15 +1,37 @@
 # app.py
+import time
+_import_start = time.perf_counter()
+
 import streamlit as st
-import json, logging, os
+import logging
 
 from config.config import settings
-from utils.ingest_courses import ingest
-
 from utils.retrieve import CourseRetriever, parse_profile_from_message, make_followup_for_missing
+from utils.prefetch import RetrievalPrefetcher
+from utils.session_store import SessionRegistry
+from utils.startup import record_timing, warm_up
+from utils.tracing import start_metrics_server
+
+record_timing("import:app", time.perf_counter() - _import_start)
 
 logging.basicConfig(level=logging.DEBUG if settings.DEBUG else logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@st.cache_resource
+def get_retriever():
+    # one retriever per process, shared by every session and rerun
+    if settings.WARMUP_ON_START:
+        warm_up()
+    start_metrics_server()
+    return CourseRetriever()
+
+
+@st.cache_resource
+def get_sessions():
+    # per-session state lives here (bounded, idle sessions parked in sqlite), not in st.session_state
+    return SessionRegistry()
+
 st.set_page_config(page_title='CourseAdvisor RAG', layout='wide')
 
 st.markdown("""
@@ -22,50 +44,59 @@ st.markdown("""
 
 st.title('Edu.AI - Student Advisor')
 
-retriever = CourseRetriever()
+retriever = get_retriever()
 
 # --------------------------
 # Session state initialization
 # --------------------------
-if "conversation" not in st.session_state:
-    st.session_state.conversation = []  # list of tuples (role, msg)
-
-if "profile" not in st.session_state:
-    st.session_state.profile = {
-        k: None for k in [
-            'field_of_interest',
-            'skills_to_master',
-            'preference',
-            'level',
-            'availability',
-            'career_goal'
-        ]
-    }
-
-if "retrieved_courses" not in st.session_state:
-    st.session_state.retrieved_courses = []
-
-# flags controlling flow
-if "intent_active" not in st.session_state:
-    st.session_state.intent_active = False   # user signalled intent to learn (profile collection in progress)
-
-if "roadmap_generated" not in st.session_state:
-    st.session_state.roadmap_generated = False  # roadmap already created
+if "session_id" not in st.session_state:
+    st.session_state.session_id = SessionRegistry.new_session_id()
+
+if "prefetcher" not in st.session_state:
+    st.session_state.prefetcher = RetrievalPrefetcher(retriever, top_k=settings.TOP_K)  # background retrieval while collecting the profile
+
+# conversation (capped history), LLM memory, profile, course refs and flow flags
+session = get_sessions().get(st.session_state.session_id)
 
 def update_profile(parsed: dict):
     for k, v in parsed.items():
-        if k in st.session_state.profile and v:
-            st.session_state.profile[k] = v
+        if k in session.profile and v:
+            session.profile[k] = v
+
+
+def prefetch_retrieval():
+    # start searching for what we already know while the user answers follow-ups
+    if settings.PREFETCH_RETRIEVAL:
+        st.session_state.prefetcher.prefetch(dict(session.profile))
+
+
+def stream_assistant_reply(chunks) -> str:
+    """
+    Render LLM tokens into an assistant bubble as they arrive and
+    return the full text once the stream is finished.
+    """
+    placeholder = st.empty()
+    text = ""
+    for piece in chunks:
+        text += piece
+        placeholder.markdown(f"<div class='assistant-bubble'>{text}▌</div>", unsafe_allow_html=True)
+    placeholder.markdown(f"<div class='assistant-bubble'>{text}</div>", unsafe_allow_html=True)
+    return text
+
+def render_bubble(role: str, msg: str):
+    bubble = "user-bubble" if role == "user" else "assistant-bubble"
+    st.markdown(f"<div class='{bubble}'>{msg}</div>", unsafe_allow_html=True)
 
 # --------------------------
 # Render conversation
 # --------------------------
 st.markdown("<div class='chat-container'>", unsafe_allow_html=True)
-for role, msg in st.session_state.conversation:
-    if role == "user":
-        st.markdown(f"<div class='user-bubble'>{msg}</div>", unsafe_allow_html=True)
-    else:
-        st.markdown(f"<div class='assistant-bubble'>{msg}</div>", unsafe_allow_html=True)
+# older turns are spilled to disk; only load them when asked
+if session.history.offset and st.checkbox(f"Show {session.history.offset} earlier messages"):
+    for role, msg in session.history.earlier():
+        render_bubble(role, msg)
+for role, msg in session.history.recent:
+    render_bubble(role, msg)
 st.markdown("</div>", unsafe_allow_html=True)
 
 # --------------------------
@@ -80,96 +111,104 @@ with st.form("chat_form", clear_on_submit=True):
 # --------------------------
 if submitted and user_input:
     # record user message
-    st.session_state.conversation.append(("user", user_input))
+    session.history.append("user", user_input)
 
     # If roadmap already generated -> normal chat via LLM
-    if st.session_state.roadmap_generated:
+    if session.roadmap_generated:
         try:
-            reply = retriever.continue_conversation(user_input, st.session_state.conversation)
+            reply = stream_assistant_reply(
+                retriever.continue_conversation_stream(user_input, session.history,
+                                                      session.memory))
         except Exception as e:
             logger.exception("Error continuing chat after roadmap")
             reply = "Sorry — I couldn't continue the conversation due to an internal error."
-        st.session_state.conversation.append(("assistant", reply))
+        session.history.append("assistant", reply)
         st.rerun()
 
     # If intent already active (we are in the middle of gathering profile)
-    if st.session_state.intent_active and not st.session_state.roadmap_generated:
+    if session.intent_active and not session.roadmap_generated:
         # parse any profile fragments from this message
         parsed = parse_profile_from_message(user_input)
         update_profile(parsed)
 
         # check whether we have the required fields now
         required = ["field_of_interest", "skills_to_master", "preference", "level", "availability"]
-        missing = [k for k in required if not st.session_state.profile.get(k)]
+        missing = [k for k in required if not session.profile.get(k)]
 
         if missing:
+            prefetch_retrieval()
             # ask targeted follow-up (only those missing)
             follow = make_followup_for_missing(missing)
-            st.session_state.conversation.append(("assistant", follow))
+            session.history.append("assistant", follow)
             st.rerun()
         else:
             # all required info collected -> run retrieval + generate roadmap once
-            query = ((st.session_state.profile.get("field_of_interest") or "") + " " +
-                     (st.session_state.profile.get("skills_to_master") or "")).strip()
-
-            retrieved = retriever.retrieve_courses(query, top_k=settings.TOP_K)
-            st.session_state.retrieved_courses = retrieved
-
-            llm_output = retriever.generate_learning_path(st.session_state.profile, retrieved)
-            st.session_state.conversation.append(("assistant", llm_output))
-
-            st.session_state.roadmap_generated = True
-            st.session_state.intent_active = False
+            # reuses whatever the prefetcher already searched; only new sub-queries run now
+            retrieved = st.session_state.prefetcher.retrieve(session.profile)
+            st.session_state.prefetcher.clear()
+            session.set_courses(retrieved)
+
+            llm_output = stream_assistant_reply(
+                retriever.generate_learning_path_stream(session.profile, retrieved))
+            session.history.append("assistant", llm_output)
+            session.memory.pin_roadmap(llm_output)
+
+            session.roadmap_generated = True
+            session.intent_active = False
             st.rerun()
 
     # If no intent yet: check if this message indicates learning intent
-    if (not st.session_state.intent_active) and (not st.session_state.roadmap_generated):
+    if (not session.intent_active) and (not session.roadmap_generated):
         if retriever.is_learning_intent(user_input):
             # start profile collection
-            st.session_state.intent_active = True
+            session.intent_active = True
 
             parsed = parse_profile_from_message(user_input)
             update_profile(parsed)
 
             # find missing fields
             required = ["field_of_interest", "skills_to_master", "preference", "level", "availability"]
-            missing = [k for k in required if not st.session_state.profile.get(k)]
+            missing = [k for k in required if not session.profile.get(k)]
 
             if missing:
+                prefetch_retrieval()
                 follow = make_followup_for_missing(missing)
-                st.session_state.conversation.append(("assistant", follow))
+                session.history.append("assistant", follow)
                 st.rerun()
             else:
                 # If user accidentally provided full profile in same message, generate immediately
-                query = ((st.session_state.profile.get("field_of_interest") or "") + " " +
-                         (st.session_state.profile.get("skills_to_master") or "")).strip()
-
-                retrieved = retriever.retrieve_courses(query, top_k=settings.TOP_K)
-                st.session_state.retrieved_courses = retrieved
-
-                llm_output = retriever.generate_learning_path(st.session_state.profile, retrieved)
-                st.session_state.conversation.append(("assistant", llm_output))
-
-                st.session_state.roadmap_generated = True
-                st.session_state.intent_active = False
+                # reuses whatever the prefetcher already searched; only new sub-queries run now
+                retrieved = st.session_state.prefetcher.retrieve(session.profile)
+                st.session_state.prefetcher.clear()
+                session.set_courses(retrieved)
+
+                llm_output = stream_assistant_reply(
+                    retriever.generate_learning_path_stream(session.profile, retrieved))
+                session.history.append("assistant", llm_output)
+                session.memory.pin_roadmap(llm_output)
+
+                session.roadmap_generated = True
+                session.intent_active = False
                 st.rerun()
 
         else:
             # Normal chat (user didn't ask to learn yet) - forward to LLM with full conversation
             try:
-                reply = retriever.continue_conversation(user_input, st.session_state.conversation)
+                reply = stream_assistant_reply(
+                    retriever.continue_conversation_stream(user_input, session.history,
+                                                          session.memory))
             except Exception as e:
                 logger.exception("Chat failed")
                 reply = "Sorry — something went wrong while chatting."
-            st.session_state.conversation.append(("assistant", reply))
+            session.history.append("assistant", reply)
             st.rerun()
 
 #  show retrieved courses for debugging - set to True to display
 if False:
-    if st.session_state.retrieved_courses:
+    if session.course_refs:
         st.subheader("Recommended Courses (raw)")
-        for item in st.session_state.retrieved_courses:
+        for item in session.courses():
             p = item.get("payload", {})
             st.write(f"### {p.get('title')}")
             st.write(p.get("url"))
-            st.write(p.get("short_intro") or p.get("Short Intro", ""))
+            st.write(p.get("intro", ""))
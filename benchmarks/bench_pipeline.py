@@ -0,0 +1,321 @@
+# benchmarks/bench_pipeline.py
+"""
+Offline benchmark for the RAG pipeline (no network needed).
+
+    python -m benchmarks.bench_pipeline --sizes 1000 10000 --out bench.json
+
+Vector store: the in-process LocalVectorIndex (default) or Qdrant's
+in-memory mode (--store qdrant-memory). The LLM is replaced by FakeLLM
+with configurable latency and token rate; embeddings use a hashing
+embedder unless --embedder real is given (needs the model weights).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from config.config import settings
+
+TOPICS = ["machine learning", "web development", "data science", "cybersecurity",
+          "cloud computing", "ui design", "java", "python", "ai", "devops"]
+SKILLS = ["python", "sql", "pandas", "numpy", "pytorch", "react", "node", "javascript",
+          "html", "css", "nlp", "docker", "kubernetes", "aws", "statistics"]
+SITES = ["Coursera", "Udemy", "edX", "Pluralsight"]
+LEVELS = ["Beginner", "Intermediate", "Advanced", "All Levels"]
+
+PROFILE_MESSAGES = [
+    "I want to learn machine learning with python and pandas, beginner, video courses, 10 hours/week",
+    "recommend courses for web development, react and node, intermediate, 5 hrs weekly, become a frontend developer",
+    "teach me data science, sql and statistics please, I prefer books, advanced, 8 hours",
+]
+
+
+# ------------------------------------------------------
+# LOCAL STAND-INS
+# ------------------------------------------------------
+class HashingEmbedder:
+    """
+    Deterministic bag-of-words hashing embedder with the same interface as
+    models.embedding_backends.EmbeddingBackend (no model download).
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.model = self
+
+    def dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for tok in str(text).lower().split():
+                h = zlib.crc32(tok.encode("utf-8"))
+                out[i, h % self.dim] += -1.0 if h & 0x80000000 else 1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+class FakeLLM:
+    """
+    Stand-in for models.llm.LLMModel: sleeps for a fixed latency (time to
+    first token) plus output_tokens / tokens_per_s, and returns filler text.
+    """
+
+    def __init__(self, latency_s: float = 0.2, tokens_per_s: float = 400.0, output_tokens: int = 400):
+        self.model = "fake-llm"
+        self.latency_s = latency_s
+        self.tokens_per_s = tokens_per_s
+        self.output_tokens = output_tokens
+
+    def _stream(self):
+        time.sleep(self.latency_s)
+        chunk = 16
+        for _ in range(0, self.output_tokens, chunk):
+            time.sleep(chunk / self.tokens_per_s)
+            yield "lorem " * chunk
+
+    def generate(self, prompt: str, temperature: float = 0.7):
+        return "".join(self._stream())
+
+    def generate_stream(self, prompt: str, temperature: float = 0.7):
+        return self._stream()
+
+    def chat(self, user_message: str, history):
+        return "".join(self._stream())
+
+    def chat_stream(self, user_message: str, history):
+        return self._stream()
+
+    def summarize(self, previous_summary: str, turns, max_tokens: int = 300):
+        return previous_summary
+
+
+def synthetic_catalogue(n: int, seed: int = 7) -> pd.DataFrame:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        topic = rng.choice(TOPICS)
+        skills = ", ".join(rng.sample(SKILLS, 4))
+        title = f"{topic.title()} {rng.choice(['Foundations', 'Bootcamp', 'Masterclass', 'in Practice'])} #{i}"
+        intro = f"Learn {topic} with hands-on projects covering {skills}. " * rng.randint(1, 4)
+        row = {
+            "title": title,
+            "url": f"https://example.com/course/{i}",
+            "site": rng.choice(SITES),
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "skills": skills,
+            "instructors": f"Instructor {rng.randint(1, 500)}",
+            "category": topic,
+            "level": rng.choice(LEVELS),
+            "language": "English",
+            "short_intro": intro,
+        }
+        row["embedding_text"] = f"Title: {title}\nShort Intro: {intro}\nCategory: {topic}\nSkills: {skills}"
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+# ------------------------------------------------------
+# MEASUREMENT
+# ------------------------------------------------------
+def summarize_latencies(latencies, items_per_call: int = 1) -> dict:
+    arr = np.asarray(latencies, dtype=np.float64)
+    total = arr.sum()
+    return {
+        "calls": int(len(arr)),
+        "mean_ms": round(float(arr.mean()) * 1000, 3),
+        "p50_ms": round(float(np.percentile(arr, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(arr, 95)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(arr, 99)) * 1000, 3),
+        "throughput_per_s": round(len(arr) * items_per_call / total, 2) if total else None,
+    }
+
+
+def measure(fn, repeats: int, warmup: int = 2, items_per_call: int = 1) -> dict:
+    for i in range(warmup):
+        fn(-1 - i)
+    latencies = []
+    for i in range(repeats):
+        t0 = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t0)
+    return summarize_latencies(latencies, items_per_call)
+
+
+# ------------------------------------------------------
+# SETUP
+# ------------------------------------------------------
+def configure(args, workdir: str):
+    """
+    Point the shared singletons at the local stand-ins. Everything the run
+    writes (course store, ingest manifest) goes to workdir, and embeddings
+    are cached in memory only, so the real deployment's files are untouched.
+    """
+    from models import embeddings, llm
+    from models.embedding_cache import EmbeddingCache
+    from utils import indexer
+
+    settings.COURSE_STORE_PATH = os.path.join(workdir, "course_store.arrow")
+    settings.INGEST_MANIFEST_PATH = os.path.join(workdir, "ingest_manifest.sqlite")
+    settings.ROADMAP_CACHE_PATH = ""
+
+    if args.embedder == "fake":
+        embeddings._backend = HashingEmbedder()
+    if embeddings._cache is not None:
+        embeddings._cache = EmbeddingCache(f"bench:{args.embedder}:{embeddings.EMBEDDING_ID}",
+                                           max_bytes=settings.EMBEDDING_CACHE_MB * 1024 * 1024)
+
+    llm._llm = FakeLLM(args.llm_latency, args.llm_tps, args.llm_tokens)
+
+    if args.store == "qdrant-memory":
+        from qdrant_client import QdrantClient
+        indexer._client = QdrantClient(":memory:")
+        indexer._backend = indexer.QdrantBackend()
+    else:
+        from utils.local_index import LocalVectorIndex
+        indexer._backend = LocalVectorIndex(os.path.join(workdir, "index"),
+                                            filter_fields=list(indexer.PAYLOAD_INDEX_FIELDS))
+
+
+def reset_store(args, workdir: str, size: int):
+    from utils import indexer
+    if args.store == "qdrant-memory":
+        try:
+            indexer.get_qdrant_client().delete_collection(settings.COLLECTION_NAME)
+        except Exception:
+            pass
+    else:
+        from utils.local_index import LocalVectorIndex
+        indexer._backend = LocalVectorIndex(os.path.join(workdir, f"index_{size}"),
+                                            filter_fields=list(indexer.PAYLOAD_INDEX_FIELDS))
+
+
+def bench_size(args, workdir: str, size: int) -> dict:
+    from models.embeddings import embed_texts, embed_single
+    from utils.indexer import search_vector
+    from utils.ingest_courses import ingest
+    from utils.prompts import build_learning_path_prompt
+    from utils.retrieve import CourseRetriever, parse_profile_from_message, filters_from_profile
+
+    df = synthetic_catalogue(size)
+    csv_path = os.path.join(workdir, f"catalogue_{size}.csv")
+    df.to_csv(csv_path, index=False)
+    reset_store(args, workdir, size)
+
+    stages = {}
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        ingest(csv_path, batch_size=args.batch_size)
+    wall = time.perf_counter() - t0
+    stages["ingest"] = {"rows": size, "wall_s": round(wall, 3), "rows_per_s": round(size / wall, 1)}
+
+    texts = df["embedding_text"].tolist()
+    batch = texts[:args.batch_size]
+    stages["embed_texts_batch"] = measure(
+        lambda i: embed_texts(batch, use_cache=False), args.repeats, items_per_call=len(batch))
+    stages["embed_single_miss"] = measure(
+        lambda i: embed_single(f"unique benchmark query {size} {i}"), args.repeats)
+    stages["embed_single_hit"] = measure(
+        lambda i: embed_single("machine learning python"), args.repeats)
+
+    query_vecs = embed_texts([f"{t} course" for t in TOPICS])
+    stages["search_vector"] = measure(
+        lambda i: search_vector(query_vecs[i % len(query_vecs)], settings.TOP_K), args.repeats)
+    stages["search_vector_filtered"] = measure(
+        lambda i: search_vector(query_vecs[i % len(query_vecs)], settings.TOP_K,
+                                query_filter={"level": ["Beginner", "All Levels"]}), args.repeats)
+
+    stages["parse_profile_from_message"] = measure(
+        lambda i: parse_profile_from_message(PROFILE_MESSAGES[i % len(PROFILE_MESSAGES)]), args.repeats * 10)
+
+    retriever = CourseRetriever()
+    retriever.response_cache = None   # measure the uncached path
+    profile = parse_profile_from_message(PROFILE_MESSAGES[0])
+    retrieved = retriever.retrieve_courses_multi(profile, settings.TOP_K, filters_from_profile(profile))
+    courses = [r["payload"] for r in retrieved]
+    stages["build_learning_path_prompt"] = measure(
+        lambda i: build_learning_path_prompt(profile, courses), args.repeats * 10)
+
+    ttft = []
+
+    def full_turn(i):
+        p = parse_profile_from_message(PROFILE_MESSAGES[i % len(PROFILE_MESSAGES)])
+        hits = retriever.retrieve_courses_multi(p, settings.TOP_K, filters_from_profile(p))
+        t_start = time.perf_counter()
+        stream = retriever.generate_learning_path_stream(p, hits)
+        next(stream)
+        if i >= 0:
+            ttft.append(time.perf_counter() - t_start)
+        for _ in stream:
+            pass
+
+    stages["generate_learning_path_turn"] = measure(full_turn, args.turns, warmup=1)
+    stages["generate_learning_path_ttft"] = summarize_latencies(ttft)
+    return {"size": size, "stages": stages}
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline RAG pipeline benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--store", choices=["local", "qdrant-memory"], default="local")
+    parser.add_argument("--embedder", choices=["fake", "real"], default="fake")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM time to first token (s)")
+    parser.add_argument("--llm-tps", type=float, default=400.0, help="fake LLM tokens per second")
+    parser.add_argument("--llm-tokens", type=int, default=400, help="fake LLM output tokens")
+    parser.add_argument("--out", help="write JSON results here (default: stdout)")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "args": vars(args),
+        },
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure(args, workdir)
+        for size in args.sizes:
+            results["results"].append(bench_size(args, workdir, size))
+            print(f"size={size} done", file=sys.stderr, flush=True)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,117 @@ class Settings:
     HF_API_TOKEN = os.getenv("HF_API_TOKEN")
     QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
     QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+    QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "10"))
+    # snapshot uploads/downloads move the whole collection: allow far longer than QDRANT_TIMEOUT
+    QDRANT_SNAPSHOT_TIMEOUT = int(os.getenv("QDRANT_SNAPSHOT_TIMEOUT", "600"))
+    QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "False").lower() in ('true','1','yes')
+    QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+    QDRANT_POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "20"))
+    QDRANT_KEEPALIVE_SECONDS = float(os.getenv("QDRANT_KEEPALIVE_SECONDS", "60"))
+
+    # Quantization: "none", "scalar" (int8) or "binary"; applied at collection creation
+    QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+    QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+    QDRANT_RESCORE = os.getenv("QDRANT_RESCORE", "True").lower() in ('true','1','yes')
+    QDRANT_VECTORS_ON_DISK = os.getenv("QDRANT_VECTORS_ON_DISK", "False").lower() in ('true','1','yes')
+
+    # Vector search backend: "qdrant", "local" (in-process index) or "auto"
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto").lower()
+    LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "local_index")
+    LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float16")
+
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    # Embedding runtime: "torch", "torch-int8", "onnx" or "onnx-int8"
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = library default
+    # ONNX file inside the model repo for the onnx backends (empty: onnx/model.onnx,
+    # or for onnx-int8 the arm64 / avx2 quantized export matching this CPU)
+    EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "")
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "8192"))
     COLLECTION_NAME = os.getenv("COLLECTION_NAME", "courses_collection")
     TOP_K = int(os.getenv("TOP_K", "6"))
+
+    # Profile-driven search filters (level always; language/rating when set)
+    PROFILE_FILTERS = os.getenv("PROFILE_FILTERS", "True").lower() in ('true','1','yes')
+    COURSE_LANGUAGE = os.getenv("COURSE_LANGUAGE", "")
+    MIN_COURSE_RATING = float(os.getenv("MIN_COURSE_RATING", "0"))
+
+    TAXONOMY_PATH = os.getenv("TAXONOMY_PATH", "")  # default: config/taxonomy.json
     MAX_CONTEXT_CHUNKS = int(os.getenv("MAX_CONTEXT_CHUNKS", "6"))
     HF_MODEL = os.getenv("HF_MODEL", "mistralai/mistral-7b-instruct")
     DEBUG = os.getenv("DEBUG", "True").lower() in ('true','1','yes')
+    WARMUP_ON_START = os.getenv("WARMUP_ON_START", "True").lower() in ('true','1','yes')
+
+    # Embedding cache (in-process LRU + optional sqlite file)
+    EMBEDDING_CACHE_MB = int(os.getenv("EMBEDDING_CACHE_MB", "64"))
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")
+    EMBEDDING_CACHE_DISK_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_ENTRIES", "200000"))
+
+    # Roadmap response cache (TTL + LRU, optional sqlite file)
+    ROADMAP_CACHE_SIZE = int(os.getenv("ROADMAP_CACHE_SIZE", "1000"))
+    ROADMAP_CACHE_TTL = float(os.getenv("ROADMAP_CACHE_TTL", "86400"))
+    ROADMAP_CACHE_PATH = os.getenv("ROADMAP_CACHE_PATH", "")
+
+    # Chat context window for continue_conversation
+    CHAT_MAX_TOKENS = int(os.getenv("CHAT_MAX_TOKENS", "3000"))
+    CHAT_MAX_TURNS = int(os.getenv("CHAT_MAX_TURNS", "8"))
+    CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+    CHAT_ROADMAP_TOKENS = int(os.getenv("CHAT_ROADMAP_TOKENS", "400"))
+
+    # Per-session state: in-memory turn/size caps, idle sessions parked in sqlite
+    SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "20"))
+    SESSION_MAX_KB = int(os.getenv("SESSION_MAX_KB", "64"))
+    SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "900"))
+    SESSION_SPILL_PATH = os.getenv("SESSION_SPILL_PATH", "sessions.sqlite")
+    SESSION_SPILL_MAX_ENTRIES = int(os.getenv("SESSION_SPILL_MAX_ENTRIES", "500000"))
+    # parked sessions (and their spilled turns) untouched for this long are deleted
+    SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+
+    # Roadmap prompt budget (input tokens) and per-course trimming
+    PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "2500"))
+    PROMPT_INTRO_TOKENS = int(os.getenv("PROMPT_INTRO_TOKENS", "60"))
+    PROMPT_MAX_SKILLS = int(os.getenv("PROMPT_MAX_SKILLS", "8"))
+
+    # Columnar course metadata (Arrow IPC, memory-mapped); empty = read metadata from vector payloads
+    COURSE_STORE_PATH = os.getenv("COURSE_STORE_PATH", "course_store.arrow")
+    # Strip vector payloads to the filter fields (metadata then only lives in the store file)
+    COURSE_STORE_SLIM_PAYLOADS = os.getenv("COURSE_STORE_SLIM_PAYLOADS", "False").lower() in ('true','1','yes')
+
+    # Rows read from the catalogue file at a time during ingestion (bounds memory)
+    INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "10000"))
+
+    # Incremental ingestion manifest (point id -> content hash)
+    INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "ingest_manifest.sqlite")
+
+    # Start retrieval in the background while the profile is still being collected
+    PREFETCH_RETRIEVAL = os.getenv("PREFETCH_RETRIEVAL", "True").lower() in ('true','1','yes')
+    PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+    PREFETCH_OVERFETCH = int(os.getenv("PREFETCH_OVERFETCH", "4"))  # x per-query k, so filters can be applied locally
+
+    # Groq calls: per-attempt timeout, overall deadline, retries, rate limit, hedging
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+    LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "60"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+    LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+    LLM_RATE_LIMIT_RPM = float(os.getenv("LLM_RATE_LIMIT_RPM", "0"))  # 0 = no client-side rate limit
+    LLM_RATE_LIMIT_BURST = int(os.getenv("LLM_RATE_LIMIT_BURST", "5"))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))  # seconds; 0 = no hedged requests
+    LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "True").lower() in ('true','1','yes')
+    # USD per 1M tokens, for cost reports (defaults: Groq llama-3.3-70b-versatile)
+    LLM_PRICE_INPUT_PER_M = float(os.getenv("LLM_PRICE_INPUT_PER_M", "0.59"))
+    LLM_PRICE_OUTPUT_PER_M = float(os.getenv("LLM_PRICE_OUTPUT_PER_M", "0.79"))
+
+    # Async request path: embedding thread pool + per-loop concurrency limits
+    ASYNC_EMBED_WORKERS = int(os.getenv("ASYNC_EMBED_WORKERS", "2"))
+    ASYNC_SEARCH_CONCURRENCY = int(os.getenv("ASYNC_SEARCH_CONCURRENCY", "32"))
+    ASYNC_LLM_CONCURRENCY = int(os.getenv("ASYNC_LLM_CONCURRENCY", "8"))
+
+    # Per-stage tracing (0 disables spans; metrics served on METRICS_PORT when > 0)
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+    TRACE_LOG = os.getenv("TRACE_LOG", "False").lower() in ('true','1','yes')
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
 
 settings = Settings()
@@ -0,0 +1,162 @@
+# models/embedding_backends.py
+import abc
+import logging
+import platform
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackend(abc.ABC):
+    """
+    Base class: loads a sentence-transformers model lazily and encodes with
+    length-sorted dynamic batching, returning a float32 NumPy array.
+    Subclasses only decide how the model is loaded.
+    """
+
+    name = "base"
+
+    def __init__(self, model_name: str, threads: int = 0, batch_size: int = 64,
+                 max_batch_tokens: int = 8192):
+        self.model_name = model_name
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            t0 = time.perf_counter()
+            self._model = self._load()
+            logger.info("Loaded embedding model %s [%s] in %.2fs",
+                        self.model_name, self.name, time.perf_counter() - t0)
+        return self._model
+
+    @abc.abstractmethod
+    def _load(self):
+        """
+        Load and return the SentenceTransformer-compatible model.
+        """
+
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def _batches(self, texts):
+        """
+        Group indices of similar length so padding stays small; a batch is
+        closed when it reaches batch_size or its padded size would exceed
+        max_batch_tokens (estimated at ~4 chars/token).
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        batch, longest = [], 0
+        for i in order:
+            est = len(texts[i]) // 4 + 2
+            longest = max(longest, est)
+            if batch and (len(batch) >= self.batch_size or longest * (len(batch) + 1) > self.max_batch_tokens):
+                yield batch
+                batch, longest = [], est
+            batch.append(i)
+        if batch:
+            yield batch
+
+    def encode(self, texts) -> np.ndarray:
+        texts = [str(t) for t in texts]
+        if not texts:
+            return np.zeros((0, self.dimension()), dtype=np.float32)
+        out = None
+        for idx in self._batches(texts):
+            vecs = self.model.encode([texts[i] for i in idx], batch_size=len(idx),
+                                     show_progress_bar=False, convert_to_numpy=True)
+            if out is None:
+                out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+            out[idx] = vecs
+        return out
+
+
+class TorchBackend(EmbeddingBackend):
+    """
+    PyTorch fp32 on CPU (the original behaviour).
+    """
+
+    name = "torch"
+
+    def _load(self):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        return SentenceTransformer(self.model_name, device="cpu")
+
+
+class TorchInt8Backend(TorchBackend):
+    """
+    PyTorch with dynamic int8 quantization of the Linear layers.
+    """
+
+    name = "torch-int8"
+
+    def _load(self):
+        import torch
+        model = super()._load()
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    ONNX Runtime via sentence-transformers' onnx backend (needs optimum/onnxruntime).
+    """
+
+    name = "onnx"
+    file_name = None
+
+    def __init__(self, *args, file_name: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.file_name = file_name or self.file_name
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+        model_kwargs = {"provider": "CPUExecutionProvider"}
+        if self.file_name:
+            model_kwargs["file_name"] = self.file_name
+        if self.threads:
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            model_kwargs["session_options"] = options
+        return SentenceTransformer(self.model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+
+def default_int8_onnx_file() -> str:
+    """
+    The int8 export of the model that runs on this CPU: the ARM build on
+    arm64, else the AVX2 one (every x86-64 CPU from the last decade).
+    """
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    return "onnx/model_quint8_avx2.onnx"
+
+
+class OnnxInt8Backend(OnnxBackend):
+    """
+    ONNX Runtime with the model's int8 dynamically quantized export
+    (EMBEDDING_ONNX_FILE picks another one, e.g. the avx512_vnni build).
+    """
+
+    name = "onnx-int8"
+
+    def __init__(self, *args, file_name: str = None, **kwargs):
+        super().__init__(*args, file_name=file_name or default_int8_onnx_file(), **kwargs)
+
+
+BACKENDS = {b.name: b for b in [TorchBackend, TorchInt8Backend, OnnxBackend, OnnxInt8Backend]}
+
+
+def create_backend(name: str, model_name: str, **kwargs) -> EmbeddingBackend:
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {name} (choose from {', '.join(BACKENDS)})")
+    return cls(model_name, **kwargs)
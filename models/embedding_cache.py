@@ -0,0 +1,79 @@
+# models/embedding_cache.py
+import hashlib
+import logging
+
+import numpy as np
+
+from utils.cache import LRUCache, SqliteStore
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text) -> str:
+    """
+    Collapse whitespace so trivially different strings share one cache entry.
+    """
+    return " ".join(str(text).split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for embeddings: an in-process LRU bounded by bytes,
+    backed by an optional sqlite file that survives restarts.
+    Keys are sha1(model name + normalized text).
+    """
+
+    def __init__(self, model_name: str, max_bytes: int, disk_path: str = None,
+                 disk_max_entries: int = None):
+        self.model_name = model_name
+        self.memory = LRUCache(max_entries=None, max_bytes=max_bytes, sizeof=lambda v: v.nbytes)
+        self.disk = None
+        self.disk_hits = 0
+        if disk_path:
+            try:
+                self.disk = SqliteStore(disk_path, table="embeddings", max_entries=disk_max_entries)
+            except Exception as e:
+                logger.warning("Embedding disk cache disabled (%s): %s", disk_path, e)
+
+    def key(self, text) -> str:
+        raw = f"{self.model_name}\x00{normalize_text(text)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys) -> dict:
+        """
+        Return {key: float32 vector} for every cached key.
+        Disk hits are promoted into the memory tier.
+        """
+        found = self.memory.get_many(keys)
+        if self.disk is not None:
+            missing = [k for k in keys if k not in found]
+            if missing:
+                from_disk = {
+                    k: np.frombuffer(blob, dtype=np.float32)
+                    for k, blob in self.disk.get_many(missing).items()
+                }
+                if from_disk:
+                    self.disk_hits += len(from_disk)
+                    self.memory.set_many(from_disk)
+                    found.update(from_disk)
+        return found
+
+    def set_many(self, items: dict):
+        # copy: a row view would keep its whole batch alive while only row.nbytes is counted
+        items = {k: np.array(v, dtype=np.float32) for k, v in items.items()}
+        self.memory.set_many(items)
+        if self.disk is not None:
+            try:
+                self.disk.set_many({k: v.tobytes() for k, v in items.items()})
+            except Exception as e:
+                logger.warning("Embedding disk cache write failed: %s", e)
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        stats["disk_hits"] = self.disk_hits
+        # a lookup only misses overall if it missed both tiers
+        stats["misses"] = stats["misses"] - self.disk_hits
+        stats["hits"] = stats["hits"] + self.disk_hits
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] / total) if total else 0.0
+        return stats
@@ -1,28 +1,156 @@
-from sentence_transformers import SentenceTransformer
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-# Load model once globally (efficient)
-_model = SentenceTransformer("all-MiniLM-L6-v2")
+import numpy as np
 
+from config.config import settings
+from models.embedding_backends import create_backend
+from models.embedding_cache import EmbeddingCache
+from utils.tracing import span
 
-def embed_texts(texts):
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = settings.EMBEDDING_MODEL
+# model + runtime: int8 / ONNX variants produce slightly different vectors
+EMBEDDING_ID = f"{MODEL_NAME}@{settings.EMBEDDING_BACKEND}"
+
+# Loaded once per process, on first use (keeps imports and cold start cheap)
+_backend = None
+_backend_lock = threading.Lock()
+
+# Query embeddings repeat a lot (same profiles, same probes) -> cache them
+_cache = EmbeddingCache(
+    EMBEDDING_ID,
+    max_bytes=settings.EMBEDDING_CACHE_MB * 1024 * 1024,
+    disk_path=settings.EMBEDDING_CACHE_PATH or None,
+    disk_max_entries=settings.EMBEDDING_CACHE_DISK_ENTRIES,
+) if settings.EMBEDDING_CACHE_MB > 0 else None
+
+
+def get_model():
     """
-    Generate embeddings for a list of texts using SentenceTransformers.
-    Used by both ingestion and retrieval to keep things consistent.
+    Return the shared embedding backend, loading the model on first call.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                extra = {}
+                if settings.EMBEDDING_BACKEND.startswith("onnx") and settings.EMBEDDING_ONNX_FILE:
+                    extra["file_name"] = settings.EMBEDDING_ONNX_FILE
+                backend = create_backend(
+                    settings.EMBEDDING_BACKEND,
+                    MODEL_NAME,
+                    threads=settings.EMBEDDING_THREADS,
+                    batch_size=settings.EMBEDDING_BATCH_SIZE,
+                    max_batch_tokens=settings.EMBEDDING_MAX_BATCH_TOKENS,
+                    **extra,
+                )
+                backend.model  # force the load inside the lock
+                _backend = backend
+    return _backend
+
+
+def _encode(texts) -> np.ndarray:
+    return get_model().encode(texts)
+
+
+def embed_texts_np(texts, use_cache: bool = True) -> np.ndarray:
+    """
+    Same as embed_texts but returns a float32 array of shape (n, dim),
+    skipping the conversion to Python lists.
     """
     if isinstance(texts, str):
         texts = [texts]
 
-    embeddings = _model.encode(
-        texts,
-        batch_size=64,
-        show_progress_bar=False
-    )
+    with span("embed", vectors=len(texts)) as s:
+        vectors, encoded = _embed_np(texts, use_cache)
+        s.set(encoded=encoded)
+    return vectors
+
+
+def _embed_np(texts, use_cache: bool):
+    """
+    Returns (vectors, number of texts actually encoded).
+    """
+    if _cache is None or not use_cache:
+        return _encode(texts), len(texts)
+
+    keys = [_cache.key(t) for t in texts]
+    found = _cache.get_many(keys)
+
+    # encode each distinct miss once, even if repeated inside the batch
+    missing = {}
+    for k, t in zip(keys, texts):
+        if k not in found and k not in missing:
+            missing[k] = t
+
+    if missing:
+        vectors = _encode(list(missing.values()))
+        fresh = dict(zip(missing.keys(), vectors))
+        _cache.set_many(fresh)
+        found.update(fresh)
 
-    return embeddings.tolist()
+    if not keys:
+        return np.zeros((0, get_model().dimension()), dtype=np.float32), 0
+    return np.stack([found[k] for k in keys]).astype(np.float32, copy=False), len(missing)
+
+
+def embed_texts(texts, use_cache: bool = True):
+    """
+    Generate embeddings for a list of texts using SentenceTransformers.
+    Used by both ingestion and retrieval to keep things consistent.
+    Cached texts are served from the embedding cache; only misses are encoded.
+    Pass use_cache=False for one-off bulk work (e.g. ingestion) so it does
+    not evict hot query embeddings.
+    """
+    return embed_texts_np(texts, use_cache=use_cache).tolist()
 
 
 def embed_single(text: str):
     """
     Embed a single text string.
     """
-    return _model.encode([text], show_progress_bar=False)[0].tolist()
+    return embed_texts([text])[0]
+
+
+# ------------------------------------------------------
+# ASYNC
+# ------------------------------------------------------
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _embed_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, settings.ASYNC_EMBED_WORKERS),
+                                               thread_name_prefix="embed")
+    return _executor
+
+
+async def embed_texts_async(texts, use_cache: bool = True):
+    """
+    embed_texts without blocking the event loop. Encoding runs on a small
+    dedicated thread pool, whose size also caps concurrent encodes.
+    """
+    loop = asyncio.get_running_loop()
+    vectors = await loop.run_in_executor(_embed_executor(),
+                                         functools.partial(embed_texts_np, texts, use_cache))
+    return vectors.tolist()
+
+
+async def embed_single_async(text: str):
+    return (await embed_texts_async([text]))[0]
+
+
+def embedding_cache_stats() -> dict:
+    """
+    Hit/miss counters of the embedding cache (empty if caching is disabled).
+    """
+    return _cache.stats() if _cache is not None else {}
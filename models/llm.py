@@ -1,58 +1,255 @@
 import os
 import logging
-from groq import Groq
+import threading
+from groq import AsyncGroq, Groq
 from dotenv import load_dotenv
 
+from config.config import settings
+from models.llm_client import get_llm_caller, request_key
+from utils.aio import per_loop, loop_semaphore
+from utils.tracing import span
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 
+SYSTEM_PROMPT = "You are an expert education advisor."
+
+# canned replies returned when Groq fails (never cached)
+GENERATE_ERROR = "⚠️ Sorry, I couldn't generate the roadmap right now."
+CHAT_ERROR = "⚠️ Sorry, I could not continue the conversation."
+
+
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm():
+    """
+    Process-wide LLMModel, so every rerun / retriever shares one Groq client.
+    """
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                _llm = LLMModel()
+    return _llm
+
+
 class LLMModel:
 
     def __init__(self):
         self.api_key = os.getenv("GROQ_API_KEY")
         self.model = os.getenv("GROQ_MODEL") or "llama-3.3-70b-versatile"
+        # small, fast model for housekeeping calls (conversation summaries)
+        self.summary_model = os.getenv("GROQ_SUMMARY_MODEL") or "llama-3.1-8b-instant"
 
         if not self.api_key:
             raise ValueError("Missing GROQ_API_KEY in .env")
 
-        self.client = Groq(api_key=self.api_key)
+        # retries/backoff are done by the shared caller (rate-limit aware), not the SDK
+        self.client = Groq(api_key=self.api_key, max_retries=0, timeout=settings.LLM_TIMEOUT)
+        self.caller = get_llm_caller()
+
+        # cumulative token usage reported by Groq for this process
+        self.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._usage_lock = threading.Lock()
+
+    def _record_usage(self, s, usage):
+        """
+        Add a completion's usage to the running totals and to the span.
+        """
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        with self._usage_lock:
+            self.usage["requests"] += 1
+            self.usage["prompt_tokens"] += prompt_tokens
+            self.usage["completion_tokens"] += completion_tokens
+        s.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def _complete(self, s, messages, temperature: float, model: str = None, **kwargs):
+        """
+        One non-streaming completion through the resilient caller (deadline,
+        retries, rate limit, hedging, single-flight). Usage is recorded once,
+        for the request whose completion is returned: coalesced callers and
+        a losing hedge don't count it again.
+        """
+        model = model or self.model
+
+        def request(timeout):
+            return self.client.chat.completions.create(
+                model=model, messages=messages, temperature=temperature, timeout=timeout, **kwargs)
+
+        return self.caller.call(request, key=request_key(model, messages, temperature, **kwargs),
+                                on_result=lambda completion: self._record_usage(s, completion.usage))
 
     # -----------------------------
     # GENERATE (Single Prompt)
     # -----------------------------
     def generate(self, prompt: str, temperature: float = 0.7):
-        try:
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are an expert education advisor."},
+        with span("llm_generate", model=self.model) as s:
+            try:
+                messages = [
+                    {"role": "system", "content": SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
-                ],
-                temperature=temperature
-            )
-            return completion.choices[0].message.content
+                ]
+                completion = self._complete(s, messages, temperature)
+                return completion.choices[0].message.content
 
-        except Exception as e:
-            logger.error("LLM generation error: %s", e)
-            return "⚠️ Sorry, I couldn't generate the roadmap right now."
+            except Exception as e:
+                logger.error("LLM generation error: %s", e)
+                s.fail(e)
+                return GENERATE_ERROR
 
     # -----------------------------
     # CHAT (Conversation Mode)
     # -----------------------------
     def chat(self, user_message: str, history):
-        try:
-            # history already formatted in retriever
-            history.append({"role": "user", "content": user_message})
+        with span("llm_chat", model=self.model) as s:
+            try:
+                # history already formatted in retriever
+                history.append({"role": "user", "content": user_message})
+
+                completion = self._complete(s, history, 0.7)
+                return completion.choices[0].message.content
+
+            except Exception as e:
+                logger.error("Chat continuation failed: %s", e)
+                s.fail(e)
+                return CHAT_ERROR
+
+    # -----------------------------
+    # SUMMARIZE (rolling chat memory)
+    # -----------------------------
+    def summarize(self, previous_summary: str, turns, max_tokens: int = 300):
+        """
+        Fold conversation turns into an updated running summary.
+        Raises on failure so the caller can fall back.
+        """
+        transcript = "\n".join(f"{role}: {msg}" for role, msg in turns)
+        prompt = (
+            "Update the running summary of a conversation between a student and an education advisor.\n"
+            f"Keep it under {max_tokens} tokens; keep facts about the student's goals, level, "
+            "constraints and any decisions made.\n\n"
+            f"Current summary:\n{previous_summary or '(empty)'}\n\n"
+            f"New messages:\n{transcript}\n\nUpdated summary:"
+        )
+        with span("llm_summarize", model=self.summary_model) as s:
+            completion = self._complete(s, [{"role": "user", "content": prompt}], 0.2,
+                                        model=self.summary_model, max_tokens=max_tokens)
+        return completion.choices[0].message.content.strip()
+
+    # -----------------------------
+    # ASYNC variants
+    # -----------------------------
+    @property
+    def async_client(self):
+        # AsyncGroq owns an httpx.AsyncClient, which belongs to one event loop
+        return per_loop(("groq", id(self)), lambda: AsyncGroq(api_key=self.api_key, max_retries=0,
+                                                                      timeout=settings.LLM_TIMEOUT))
+
+    async def generate_async(self, prompt: str, temperature: float = 0.7):
+        """
+        generate() for asyncio callers; at most ASYNC_LLM_CONCURRENCY
+        requests are in flight per event loop.
+        """
+        async with loop_semaphore("llm", settings.ASYNC_LLM_CONCURRENCY):
+            with span("llm_generate", model=self.model) as s:
+                try:
+                    messages = [
+                        {"role": "system", "content": SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt}
+                    ]
+                    completion = await self.caller.call_async(
+                        lambda timeout: self.async_client.chat.completions.create(
+                            model=self.model, messages=messages, temperature=temperature, timeout=timeout))
+                    self._record_usage(s, completion.usage)
+                    return completion.choices[0].message.content
+
+                except Exception as e:
+                    logger.error("LLM generation error: %s", e)
+                    s.fail(e)
+                    return GENERATE_ERROR
+
+    async def chat_async(self, user_message: str, history):
+        """
+        chat() for asyncio callers.
+        """
+        async with loop_semaphore("llm", settings.ASYNC_LLM_CONCURRENCY):
+            with span("llm_chat", model=self.model) as s:
+                try:
+                    history.append({"role": "user", "content": user_message})
+
+                    completion = await self.caller.call_async(
+                        lambda timeout: self.async_client.chat.completions.create(
+                            model=self.model, messages=history, temperature=0.7, timeout=timeout))
+                    self._record_usage(s, completion.usage)
+                    return completion.choices[0].message.content
+
+                except Exception as e:
+                    logger.error("Chat continuation failed: %s", e)
+                    s.fail(e)
+                    return CHAT_ERROR
+
+    # -----------------------------
+    # STREAMING variants
+    # -----------------------------
+    def _stream(self, messages, temperature: float, error_message: str, stage: str):
+        """
+        Yield content deltas from a streamed completion.
+        On failure the error message is yielded so the UI always gets text.
+        """
+        with span(stage, model=self.model) as s:
+            try:
+                # the slot is held until the stream is exhausted or the generator is closed
+                with self.caller.slot():
+                    # retries only cover opening the stream (before any text was shown)
+                    stream = self.caller.call(
+                        lambda timeout: self.client.chat.completions.create(
+                            model=self.model, messages=messages, temperature=temperature,
+                            stream=True, timeout=timeout),
+                        hedge=False, slotted=True)
+                    try:
+                        first = True
+                        for chunk in stream:
+                            # Groq reports usage on the last chunk (x_groq.usage)
+                            usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+                            if usage is not None:
+                                self._record_usage(s, usage)
+                            if not chunk.choices:
+                                continue
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                if first:
+                                    s.set(ttft_seconds=s.elapsed())
+                                    first = False
+                                yield delta
+                    finally:
+                        # abandoned mid-stream: close the HTTP response too
+                        close = getattr(stream, "close", None)
+                        if close is not None:
+                            close()
 
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=history,
-                temperature=0.7,
-            )
+            except Exception as e:
+                logger.error("LLM streaming error: %s", e)
+                s.fail(e)
+                yield error_message
 
-            return completion.choices[0].message.content
+    def generate_stream(self, prompt: str, temperature: float = 0.7):
+        """
+        Streaming version of generate(): returns a generator of text pieces.
+        """
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        return self._stream(messages, temperature, GENERATE_ERROR, "llm_generate_stream")
 
-        except Exception as e:
-            logger.error("Chat continuation failed: %s", e)
-            return "⚠️ Sorry, I could not continue the conversation."
+    def chat_stream(self, user_message: str, history):
+        """
+        Streaming version of chat(): returns a generator of text pieces.
+        """
+        history.append({"role": "user", "content": user_message})
+        return self._stream(history, 0.7, CHAT_ERROR, "llm_chat_stream")
@@ -0,0 +1,340 @@
+# models/llm_client.py
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+from config.config import settings
+from utils.cache import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = {408, 429}
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    pass
+
+
+class TokenBucket:
+    """
+    Process-wide request rate limiter. reserve() always takes a token and
+    returns how long the caller must wait before using it, so callers
+    queue in arrival order instead of failing.
+    """
+
+    def __init__(self, rate_per_s: float, capacity: float):
+        self.rate = rate_per_s
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float = None):
+        """
+        Seconds to wait for a token, or None (nothing taken) if that is
+        longer than max_wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            wait_s = (1 - self.tokens) / self.rate
+            if max_wait is not None and wait_s > max_wait:
+                return None
+            self.tokens -= 1  # goes negative: later callers queue behind this one
+            return wait_s
+
+    def try_take(self) -> bool:
+        return self.reserve(max_wait=0) is not None
+
+
+def is_retryable(error) -> bool:
+    """
+    429, 408 and 5xx responses, timeouts and connection errors.
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRY_STATUS or status >= 500
+    name = type(error).__name__
+    return isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)) or name in ("APITimeoutError", "APIConnectionError")
+
+
+def retry_after(error):
+    """
+    Server-requested delay in seconds (Retry-After / retry-after-ms), if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def request_key(model: str, messages, temperature: float, **params) -> str:
+    """
+    Single-flight key: every request parameter (max_tokens, ...) is part of it.
+    """
+    payload = json.dumps([model, messages, temperature, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResilientCaller:
+    """
+    Wraps a single LLM request fn(timeout) with:
+    - an overall deadline and a per-attempt timeout,
+    - jittered exponential retry on 429/5xx/timeouts, honoring Retry-After,
+    - a global token bucket (requests/s) and a cap on in-flight requests,
+    - optional hedging: a second attempt if the first is slower than hedge_after
+      and there is spare capacity (a free slot and a rate-limit token),
+    - single-flight: identical in-flight requests (same key) share one call.
+    """
+
+    def __init__(self, timeout: float = 30.0, deadline: float = 60.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, rate_per_min: float = 0,
+                 burst: int = 5, max_concurrency: int = 8, hedge_after: float = 0,
+                 single_flight: bool = True):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.bucket = TokenBucket(rate_per_min / 60.0, burst) if rate_per_min > 0 else None
+        self.slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self.hedge_after = hedge_after
+        self.flight = SingleFlight() if single_flight else None
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max(2, 2 * max_concurrency),
+                                              thread_name_prefix="llm-hedge") if hedge_after > 0 else None
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "coalesced": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            timeout=settings.LLM_TIMEOUT,
+            deadline=settings.LLM_DEADLINE,
+            max_retries=settings.LLM_MAX_RETRIES,
+            backoff_base=settings.LLM_BACKOFF_BASE,
+            backoff_max=settings.LLM_BACKOFF_MAX,
+            rate_per_min=settings.LLM_RATE_LIMIT_RPM,
+            burst=settings.LLM_RATE_LIMIT_BURST,
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            hedge_after=settings.LLM_HEDGE_AFTER,
+            single_flight=settings.LLM_SINGLE_FLIGHT,
+        )
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _backoff(self, attempt: int, error) -> float:
+        server = retry_after(error)
+        if server is not None:
+            return server
+        # "full jitter": uniform over the exponential window
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _remaining(self, deadline_at: float) -> float:
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise LLMDeadlineExceeded("LLM request deadline exceeded")
+        return remaining
+
+    def _wait_for_rate(self, deadline_at: float):
+        if self.bucket is None:
+            return
+        wait_s = self.bucket.reserve(max_wait=self._remaining(deadline_at))
+        if wait_s is None:
+            raise LLMDeadlineExceeded("Rate limit queue longer than the request deadline")
+        if wait_s:
+            time.sleep(wait_s)
+
+    # -----------------------------
+    # SYNC
+    # -----------------------------
+    @contextmanager
+    def slot(self):
+        """
+        Hold one concurrency slot for the whole body. Used by streams, whose
+        request lasts until the last chunk is read; call(..., slotted=True)
+        inside it then skips taking a second slot.
+        """
+        if not self.slots.acquire(timeout=self.deadline):
+            raise LLMDeadlineExceeded("No free LLM slot before the deadline")
+        try:
+            yield
+        finally:
+            self.slots.release()
+
+    def call(self, fn, key: str = None, hedge: bool = True, slotted: bool = False, on_result=None):
+        """
+        Run fn(timeout) with retries; identical keys in flight are coalesced.
+        slotted=True: the caller already holds a slot (see slot()).
+        on_result(result) runs once for the request that produced the
+        returned result: not for coalesced callers, failed attempts or a
+        losing hedge (use it to record usage).
+        """
+        if key is not None and self.flight is not None:
+            leader = []
+            def run():
+                leader.append(True)
+                return self._call(fn, hedge, slotted, on_result)
+            result = self.flight.do(key, run)
+            if not leader:
+                self._count("coalesced")
+            return result
+        return self._call(fn, hedge, slotted, on_result)
+
+    def _call(self, fn, hedge: bool, slotted: bool = False, on_result=None):
+        self._count("calls")
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            self._wait_for_rate(deadline_at)
+            if not slotted and not self.slots.acquire(timeout=self._remaining(deadline_at)):
+                raise LLMDeadlineExceeded("No free LLM slot before the deadline")
+            try:
+                timeout = min(self.timeout, self._remaining(deadline_at))
+                if hedge and self._hedge_pool is not None:
+                    result = self._hedged(fn, timeout)
+                else:
+                    result = fn(timeout)
+                error = None
+            except Exception as e:
+                error = e
+            finally:
+                if not slotted:
+                    self.slots.release()
+            if error is None:
+                if on_result is not None:
+                    on_result(result)
+                return result
+
+            if not is_retryable(error) or attempt >= self.max_retries:
+                self._count("failures")
+                raise error
+            delay = self._backoff(attempt, error)
+            if delay >= deadline_at - time.monotonic():
+                self._count("failures")
+                raise error
+            logger.warning("LLM request failed (%s), retry %d in %.2fs", error, attempt + 1, delay)
+            self._count("retries")
+            time.sleep(delay)
+            attempt += 1
+
+    def _hedged(self, fn, timeout: float):
+        """
+        Start fn; if it has not answered after hedge_after seconds, start a
+        duplicate and take whichever wins. The duplicate needs a free slot
+        (held until it finishes) and a rate-limit token, so there are no
+        hedges under load. The loser is cancelled if it has not started;
+        a request already sent cannot be recalled, so its result is
+        discarded (and closed) when it arrives.
+        """
+        first = self._hedge_pool.submit(fn, timeout)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done or not self.slots.acquire(blocking=False):
+            return first.result()
+        if self.bucket is not None and not self.bucket.try_take():
+            self.slots.release()
+            return first.result()
+
+        self._count("hedges")
+        second = self._hedge_pool.submit(fn, max(0.1, timeout - self.hedge_after))
+        second.add_done_callback(lambda f: self.slots.release())
+        futures, winner, error = [first, second], None, None
+        try:
+            while futures and winner is None:
+                done, pending = wait(futures, return_when=FIRST_COMPLETED)
+                for f in done:
+                    if f.exception() is None:
+                        winner = f
+                        break
+                    error = f.exception()
+                futures = list(pending)
+        finally:
+            for f in futures:
+                if f is not winner and not f.cancel():
+                    f.add_done_callback(_discard)
+        if winner is None:
+            raise error
+        return winner.result()
+
+    # -----------------------------
+    # ASYNC
+    # -----------------------------
+    async def call_async(self, fn):
+        """
+        Async version of call(): await fn(timeout) with the same deadline,
+        retry and rate-limit rules (no hedging or single-flight).
+        """
+        self._count("calls")
+        deadline_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                wait_s = self.bucket.reserve(max_wait=self._remaining(deadline_at))
+                if wait_s is None:
+                    raise LLMDeadlineExceeded("Rate limit queue longer than the request deadline")
+                if wait_s:
+                    await asyncio.sleep(wait_s)
+            try:
+                timeout = min(self.timeout, self._remaining(deadline_at))
+                return await asyncio.wait_for(fn(timeout), timeout)
+            except Exception as e:
+                error = e
+
+            if not is_retryable(error) or attempt >= self.max_retries:
+                self._count("failures")
+                raise error
+            delay = self._backoff(attempt, error)
+            if delay >= deadline_at - time.monotonic():
+                self._count("failures")
+                raise error
+            logger.warning("LLM request failed (%s), retry %d in %.2fs", error, attempt + 1, delay)
+            self._count("retries")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def _discard(future):
+    # the losing hedge: drop its result, closing it if it holds a response
+    if future.cancelled() or future.exception() is not None:
+        return
+    close = getattr(future.result(), "close", None)
+    if callable(close):
+        close()
+
+
+_caller = None
+_caller_lock = threading.Lock()
+
+
+def get_llm_caller() -> ResilientCaller:
+    """
+    One caller per process, so the rate limit and slots are shared by every session.
+    """
+    global _caller
+    if _caller is None:
+        with _caller_lock:
+            if _caller is None:
+                _caller = ResilientCaller.from_settings()
+    return _caller
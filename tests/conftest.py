@@ -0,0 +1,40 @@
+# tests/conftest.py
+import zlib
+
+import numpy as np
+import pytest
+
+from config.config import settings
+
+
+def hashing_embed(texts, use_cache: bool = True) -> np.ndarray:
+    """
+    Deterministic bag-of-words vectors (no model download).
+    """
+    if isinstance(texts, str):
+        texts = [texts]
+    out = np.zeros((len(texts), 32), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for tok in str(text).lower().split():
+            out[i, zlib.crc32(tok.encode("utf-8")) % 32] += 1.0
+    out[:, 0] += 1e-3
+    return out
+
+
+@pytest.fixture
+def local_index(tmp_path, monkeypatch):
+    """
+    A fresh in-process vector index, course store and ingest manifest under tmp_path,
+    with the hashing embedder in place of the model.
+    """
+    from utils import indexer, ingest_courses
+    from utils.local_index import LocalVectorIndex
+
+    index = LocalVectorIndex(str(tmp_path / "index"), dtype="float32",
+                             filter_fields=list(indexer.PAYLOAD_INDEX_FIELDS))
+    monkeypatch.setattr(indexer, "_backend", index)
+    monkeypatch.setattr(settings, "COURSE_STORE_PATH", str(tmp_path / "course_store.arrow"))
+    monkeypatch.setattr(settings, "INGEST_MANIFEST_PATH", str(tmp_path / "manifest.sqlite"))
+    monkeypatch.setattr(ingest_courses, "embed_texts_np", hashing_embed)
+    monkeypatch.setattr(ingest_courses, "embed_texts", lambda texts, use_cache=True: hashing_embed(texts).tolist())
+    return index
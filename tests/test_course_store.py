@@ -0,0 +1,59 @@
+# tests/test_course_store.py
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from config.config import settings
+from utils import course_store
+from utils.course_store import CourseStore, normalize_frame, write_course_store
+
+
+def catalogue():
+    return pd.DataFrame({
+        "course_title": ["Intro to Python", None, "SQL Basics"],
+        "url": ["https://a", "https://b", None],
+        "short_intro": [None, "Learn Java", "Queries"],
+        "rating": ["4.5", None, "bad"],
+        "level": ["Beginner", None, "Advanced"],
+    })
+
+
+def test_normalize_frame_keeps_missing_values_as_none():
+    frame = normalize_frame(catalogue())
+    assert frame["title"].tolist() == ["Intro to Python", None, "SQL Basics"]
+    assert frame["intro"].tolist() == [None, "Learn Java", "Queries"]
+    assert frame["category"].tolist() == [None, None, None]
+    assert "nan" not in frame.drop(columns="rating").astype(object).values.ravel().tolist()
+
+
+def test_round_trip_through_the_store(tmp_path):
+    path = str(tmp_path / "courses.arrow")
+    write_course_store(catalogue(), ["p1", "p2", "p3"], path)
+    store = CourseStore(path)
+
+    first, missing, second, third = store.get_many(["p1", "unknown", "p2", "p3"])
+    assert missing is None
+    assert first["title"] == "Intro to Python" and first["intro"] is None and first["rating"] == 4.5
+    assert second["title"] is None and second["level"] is None and second["rating"] is None
+    assert third["url"] is None and third["rating"] is None
+    assert len(store) == 3
+
+
+def test_aborted_writer_keeps_the_previous_store(tmp_path):
+    path = str(tmp_path / "courses.arrow")
+    write_course_store(catalogue(), ["p1", "p2", "p3"], path)
+    with pytest.raises(RuntimeError):
+        with course_store.CourseStoreWriter(path) as writer:
+            writer.append(catalogue().head(1), ["x"])
+            raise RuntimeError("ingest failed")
+    assert not (tmp_path / "courses.arrow.tmp").exists()
+    assert CourseStore(path).get_many(["p1"])[0]["title"] == "Intro to Python"
+
+
+def test_get_course_store_reloads_on_change(tmp_path, monkeypatch):
+    path = str(tmp_path / "courses.arrow")
+    monkeypatch.setattr(settings, "COURSE_STORE_PATH", path)
+    assert course_store.get_course_store() is None
+    write_course_store(catalogue(), ["p1", "p2", "p3"], path)
+    assert len(course_store.get_course_store()) == 3
@@ -0,0 +1,38 @@
+# tests/test_embedding_cache.py
+import numpy as np
+
+from models.embedding_cache import EmbeddingCache
+
+
+def test_cached_rows_do_not_keep_their_batch_alive():
+    cache = EmbeddingCache("model", max_bytes=1 << 20)
+    batch = np.random.rand(256, 32).astype(np.float32)
+    keys = [cache.key(f"text {i}") for i in range(len(batch))]
+    cache.set_many(dict(zip(keys, batch)))
+
+    row = cache.get_many(keys[:1])[keys[0]]
+    assert row.base is None and row.nbytes == 32 * 4
+    np.testing.assert_array_equal(row, batch[0])
+
+
+def test_memory_limit_counts_real_bytes():
+    cache = EmbeddingCache("model", max_bytes=10 * 32 * 4)
+    batch = np.random.rand(64, 32).astype(np.float32)
+    keys = [cache.key(i) for i in range(len(batch))]
+    cache.set_many(dict(zip(keys, batch)))
+    assert len(cache.get_many(keys)) == 10
+
+
+def test_keys_normalize_whitespace_and_depend_on_the_model():
+    cache = EmbeddingCache("model", max_bytes=1024)
+    assert cache.key("machine   learning\n") == cache.key("machine learning")
+    assert cache.key("machine learning") != EmbeddingCache("other", max_bytes=1024).key("machine learning")
+
+
+def test_disk_tier_survives_restarts(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    vec = np.arange(8, dtype=np.float32)
+    EmbeddingCache("model", max_bytes=1024, disk_path=path).set_many({"k": vec})
+    fresh = EmbeddingCache("model", max_bytes=1024, disk_path=path)
+    np.testing.assert_array_equal(fresh.get_many(["k"])["k"], vec)
+    assert fresh.stats()["disk_hits"] == 1
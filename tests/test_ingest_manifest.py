@@ -0,0 +1,85 @@
+# tests/test_ingest_manifest.py
+import pandas as pd
+import pytest
+
+from utils import ingest_courses
+from utils.indexer import course_point_id
+from utils.ingest_courses import ingest, ingest_incremental, ingest_pipelined, open_manifest
+
+
+def write_catalogue(path, rows):
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return str(path)
+
+
+def courses(*titles):
+    return [{"title": t, "url": f"https://courses/{t.lower().replace(' ', '-')}", "level": "Beginner",
+             "skills": f"{t} basics"} for t in titles]
+
+
+def manifest_ids():
+    manifest = open_manifest()
+    try:
+        return set(manifest.keys())
+    finally:
+        manifest.close()
+
+
+@pytest.mark.parametrize("full_ingest", [ingest, ingest_pipelined])
+def test_full_ingest_records_hashes_for_incremental_runs(tmp_path, local_index, full_ingest):
+    path = write_catalogue(tmp_path / "cat.csv", courses("Python", "SQL", "Java"))
+    full_ingest(path, batch_size=2)
+    assert local_index.count() == 3
+    assert manifest_ids() == {course_point_id(f"https://courses/{t}") for t in ("python", "sql", "java")}
+
+    report = ingest_incremental(path, batch_size=2)
+    assert report == {"rows": 3, "upserted": 0, "unchanged": 3, "deleted": 0}
+
+
+def test_incremental_upserts_changes_and_deletes_missing(tmp_path, local_index):
+    path = write_catalogue(tmp_path / "cat.csv", courses("Python", "SQL", "Java"))
+    ingest(path)
+
+    rows = courses("Python", "SQL", "Rust")
+    rows[1]["level"] = "Advanced"
+    write_catalogue(tmp_path / "cat.csv", rows)
+    report = ingest_incremental(path)
+    assert report == {"rows": 3, "upserted": 2, "unchanged": 1, "deleted": 1}
+    assert local_index.count() == 3
+    java = course_point_id("https://courses/java")
+    assert java not in manifest_ids()
+    assert local_index.retrieve([java]) == {}
+    sql = local_index.retrieve([course_point_id("https://courses/sql")])
+    assert next(iter(sql.values()))["level"] == "Advanced"
+
+
+def test_manifest_resets_when_the_embedding_model_changes(tmp_path, local_index, monkeypatch):
+    path = write_catalogue(tmp_path / "cat.csv", courses("Python", "SQL"))
+    ingest(path)
+    assert len(manifest_ids()) == 2
+
+    monkeypatch.setattr(ingest_courses, "EMBEDDING_ID", "another-model@torch")
+    assert manifest_ids() == set()
+    report = ingest_incremental(path)
+    assert report["upserted"] == 2
+
+
+def test_manifest_resets_when_the_collection_was_wiped(tmp_path, local_index):
+    path = write_catalogue(tmp_path / "cat.csv", courses("Python", "SQL"))
+    ingest(path)
+    local_index.delete(list(local_index._row_of))
+    assert ingest_incremental(path)["upserted"] == 2
+
+
+def test_failed_pipelined_ingest_keeps_the_previous_course_store(tmp_path, local_index, monkeypatch):
+    path = write_catalogue(tmp_path / "cat.csv", courses("Python", "SQL"))
+    ingest(path)
+
+    def broken(texts, use_cache=True):
+        raise RuntimeError("encoder crashed")
+
+    monkeypatch.setattr(ingest_courses, "embed_texts_np", broken)
+    with pytest.raises(RuntimeError):
+        ingest_pipelined(path)
+    assert not (tmp_path / "course_store.arrow.tmp").exists()
+    assert (tmp_path / "course_store.arrow").exists()
@@ -0,0 +1,159 @@
+# tests/test_llm_client.py
+import threading
+import time
+
+import pytest
+
+from models.llm_client import LLMDeadlineExceeded, ResilientCaller, TokenBucket, is_retryable, retry_after
+
+
+class APIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+def make_caller(**kwargs):
+    defaults = dict(timeout=2.0, deadline=5.0, max_retries=3, backoff_base=0.01, backoff_max=0.02)
+    defaults.update(kwargs)
+    return ResilientCaller(**defaults)
+
+
+def test_retryable_errors():
+    assert is_retryable(APIError(429)) and is_retryable(APIError(408)) and is_retryable(APIError(503))
+    assert not is_retryable(APIError(409)) and not is_retryable(APIError(400))
+    assert is_retryable(TimeoutError()) and is_retryable(ConnectionError())
+    assert not is_retryable(ValueError())
+
+
+def test_retry_after_header():
+    assert retry_after(APIError(429, {"retry-after": "2"})) == 2.0
+    assert retry_after(APIError(429, {"retry-after-ms": "150"})) == 0.15
+    assert retry_after(APIError(429)) is None
+
+
+def test_retries_transient_errors_then_succeeds():
+    caller = make_caller()
+    attempts = []
+
+    def fn(timeout):
+        attempts.append(timeout)
+        if len(attempts) < 3:
+            raise APIError(429, {"retry-after": "0"})
+        return "ok"
+
+    assert caller.call(fn) == "ok"
+    assert len(attempts) == 3 and caller.stats["retries"] == 2 and caller.stats["failures"] == 0
+
+
+def test_permanent_errors_are_not_retried():
+    caller = make_caller()
+    attempts = []
+
+    def fn(timeout):
+        attempts.append(1)
+        raise APIError(400)
+
+    with pytest.raises(APIError):
+        caller.call(fn)
+    assert len(attempts) == 1 and caller.stats["failures"] == 1
+
+
+def test_gives_up_after_max_retries():
+    caller = make_caller(max_retries=2)
+    attempts = []
+
+    def fn(timeout):
+        attempts.append(1)
+        raise APIError(503)
+
+    with pytest.raises(APIError):
+        caller.call(fn)
+    assert len(attempts) == 3
+
+
+def test_deadline_bounds_the_rate_limit_queue():
+    caller = make_caller(deadline=0.2, rate_per_min=60, burst=1)
+    assert caller.call(lambda timeout: "first") == "first"
+    with pytest.raises(LLMDeadlineExceeded):
+        caller.call(lambda timeout: "second")
+
+
+def test_token_bucket_queues_callers():
+    bucket = TokenBucket(rate_per_s=10, capacity=1)
+    assert bucket.reserve() == 0.0
+    assert 0.05 < bucket.reserve() <= 0.1
+    assert bucket.reserve(max_wait=0.1) is None
+
+
+def test_single_flight_coalesces_identical_requests():
+    caller = make_caller()
+    calls, results, recorded = [], [], []
+
+    def fn(timeout):
+        calls.append(1)
+        time.sleep(0.05)
+        return "answer"
+
+    threads = [threading.Thread(target=lambda: results.append(
+        caller.call(fn, key="same", on_result=recorded.append))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["answer"] * 4
+    assert len(calls) == 1 and recorded == ["answer"] and caller.stats["coalesced"] == 3
+
+
+def test_hedge_wins_and_the_loser_is_discarded():
+    caller = make_caller(hedge_after=0.05)
+    attempts, recorded = [], []
+    closed = threading.Event()
+
+    class Result:
+        def __init__(self, name):
+            self.name = name
+
+        def close(self):
+            closed.set()
+
+    def fn(timeout):
+        attempts.append(1)
+        if len(attempts) == 1:
+            time.sleep(0.3)          # slow first request
+            return Result("first")
+        return Result("hedge")
+
+    assert caller.call(fn, on_result=recorded.append).name == "hedge"
+    assert [r.name for r in recorded] == ["hedge"] and caller.stats["hedges"] == 1
+    assert closed.wait(1.0)          # the late first result is closed, not used
+    # the hedge's slot is given back
+    assert all(caller.slots.acquire(blocking=False) for _ in range(8))
+
+
+def test_no_hedge_without_a_free_slot():
+    caller = make_caller(hedge_after=0.02, max_concurrency=1)
+    attempts = []
+
+    def fn(timeout):
+        attempts.append(1)
+        time.sleep(0.1)
+        return "slow"
+
+    assert caller.call(fn) == "slow"
+    assert len(attempts) == 1 and caller.stats["hedges"] == 0
+
+
+def test_failed_hedge_falls_back_to_the_first_request():
+    caller = make_caller(hedge_after=0.02, max_retries=0)
+    attempts = []
+
+    def fn(timeout):
+        attempts.append(1)
+        if len(attempts) == 1:
+            time.sleep(0.1)
+            return "first"
+        raise APIError(400)
+
+    assert caller.call(fn) == "first"
@@ -0,0 +1,80 @@
+# tests/test_local_index.py
+import numpy as np
+
+from utils.local_index import LocalVectorIndex
+
+
+def unit(i: int, dim: int = 8) -> np.ndarray:
+    v = np.zeros(dim, dtype=np.float32)
+    v[i] = 1.0
+    return v
+
+
+def make_index(path, n: int = 6) -> LocalVectorIndex:
+    index = LocalVectorIndex(str(path), dtype="float32")
+    index.upsert([f"p{i}" for i in range(n)], np.stack([unit(i) for i in range(n)]),
+                 [{"level": "Beginner" if i % 2 else "Advanced", "rating": float(i)} for i in range(n)])
+    return index
+
+
+def test_upsert_and_search(tmp_path):
+    index = make_index(tmp_path)
+    hits = index.search(unit(3), top_k=2)
+    assert hits[0]["id"] == "p3" and abs(hits[0]["score"] - 1.0) < 1e-6
+    assert hits[0]["payload"]["rating"] == 3.0
+    assert index.count() == 6
+
+
+def test_search_batch_with_filters(tmp_path):
+    index = make_index(tmp_path)
+    first, second = index.search_batch([unit(2), unit(3)], top_k=6, query_filter={"level": "beginner"})
+    assert {h["id"] for h in first} == {h["id"] for h in second} == {"p1", "p3", "p5"}
+    assert second[0]["id"] == "p3"
+    hits = index.search(unit(0), top_k=6, query_filter={"rating": {"gte": 4}})
+    assert {h["id"] for h in hits} == {"p4", "p5"}
+
+
+def test_upsert_replaces_existing_points(tmp_path):
+    index = make_index(tmp_path)
+    index.upsert(["p0", "p6", "p6"], np.stack([unit(5), unit(6), unit(7)]), [{"v": 1}, {"v": 2}, {"v": 3}])
+    assert index.count() == 7
+    assert {h["id"] for h in index.search(unit(5), top_k=2)} == {"p0", "p5"}
+    # the last write of a point inside one batch wins
+    assert index.search(unit(7), top_k=1)[0]["id"] == "p6"
+    assert index.retrieve(["p6"]) == {"p6": {"v": 3}}
+
+
+def test_delete_hides_points(tmp_path):
+    index = make_index(tmp_path)
+    index.delete(["p3", "missing"])
+    assert index.count() == 5
+    assert "p3" not in {h["id"] for h in index.search(unit(3), top_k=6)}
+    assert index.retrieve(["p3", "p4"]).keys() == {"p4"}
+
+
+def test_save_load_and_write_after_load(tmp_path):
+    index = make_index(tmp_path)
+    index.delete(["p1"])
+    index.save()
+
+    loaded = LocalVectorIndex(str(tmp_path), dtype="float32")
+    assert loaded.count() == 5
+    assert loaded.search(unit(4), top_k=1)[0]["id"] == "p4"
+
+    loaded.upsert(["p4", "p9"], np.stack([unit(0), unit(1)]), [{}, {}])
+    assert {h["id"] for h in loaded.search(unit(0), top_k=2)} == {"p0", "p4"}
+    assert loaded.search(unit(1), top_k=1)[0]["id"] == "p9"
+    ids, vectors, payloads = zip(*[(i, v, p) for batch in loaded.iter_points(batch_size=4)
+                                   for i, v, p in zip(*batch)])
+    assert sorted(ids) == ["p0", "p2", "p3", "p4", "p5", "p9"]
+
+
+def test_many_small_upserts(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), dtype="float32")
+    for start in range(0, 1000, 7):
+        ids = list(range(start, min(start + 7, 1000)))
+        index.upsert(ids, np.stack([unit(i % 8) for i in ids]), [{"n": i} for i in ids])
+        if start % 70 == 0:
+            index.search(unit(0), top_k=1)
+    assert index.count() == 1000
+    assert index.retrieve([999]) == {999: {"n": 999}}
@@ -0,0 +1,103 @@
+# tests/test_response_cache.py
+import asyncio
+import threading
+import time
+
+from utils.response_cache import ResponseCache, roadmap_cache_key
+
+
+def make_cache(tmp_path=None):
+    return ResponseCache(ttl=60, max_entries=16, disk_path=str(tmp_path / "responses.sqlite") if tmp_path else None)
+
+
+def test_roadmap_key_ignores_order_and_case():
+    a = roadmap_cache_key({"field_of_interest": "Data Science", "skills_to_master": "sql, python"},
+                          [{"id": 2}, {"id": 1}], "m")
+    b = roadmap_cache_key({"field_of_interest": "data  science", "skills_to_master": "python,sql"},
+                          [{"id": 1}, {"id": 2}], "m")
+    assert a == b
+    assert a != roadmap_cache_key({"field_of_interest": "data science"}, [{"id": 1}, {"id": 2}], "other")
+
+
+def test_concurrent_identical_requests_share_one_call(tmp_path):
+    cache = make_cache(tmp_path)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return "roadmap"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["roadmap"] * 5 and len(calls) == 1
+    assert make_cache(tmp_path).get("k") == "roadmap"   # persisted to disk
+
+
+def test_uncacheable_results_are_recomputed():
+    cache = make_cache()
+    assert cache.get_or_compute("k", lambda: "error", cacheable=lambda r: r != "error") == "error"
+    assert cache.get_or_compute("k", lambda: "ok", cacheable=lambda r: r != "error") == "ok"
+
+
+def test_async_single_flight():
+    cache = make_cache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "roadmap"
+
+    async def main():
+        return await asyncio.gather(*[cache.get_or_compute_async("k", compute) for _ in range(5)])
+
+    assert asyncio.run(main()) == ["roadmap"] * 5
+    assert len(calls) == 1
+    assert cache.get("k") == "roadmap"
+
+
+def test_async_follower_takes_over_when_the_leader_is_cancelled():
+    cache = make_cache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return f"roadmap {len(calls)}"
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_compute_async("k", compute))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(cache.get_or_compute_async("k", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == "roadmap 2"
+
+
+def test_stream_is_shared_by_concurrent_callers():
+    cache = make_cache()
+    calls = []
+    started = threading.Event()
+
+    def stream():
+        calls.append(1)
+        started.set()
+        for piece in ["a", "b", "c"]:
+            time.sleep(0.02)
+            yield piece
+
+    leader = []
+    t = threading.Thread(target=lambda: leader.extend(cache.stream_or_compute("k", stream)))
+    t.start()
+    started.wait()
+    follower = list(cache.stream_or_compute("k", stream))
+    t.join()
+    assert leader == ["a", "b", "c"] and follower == ["abc"] and len(calls) == 1
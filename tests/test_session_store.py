@@ -0,0 +1,69 @@
+# tests/test_session_store.py
+import time
+
+from utils import session_store
+from utils.session_store import SessionRegistry
+
+
+def make_registry(tmp_path, **kwargs):
+    return SessionRegistry(str(tmp_path / "sessions.sqlite"), **kwargs)
+
+
+def test_history_spills_old_turns(tmp_path):
+    registry = make_registry(tmp_path)
+    history = registry.get("s").history
+    history.max_turns = 3
+    for i in range(10):
+        history.append("user", f"message {i}")
+    assert len(history) == 10 and history.offset == 7 and len(history.recent) == 3
+    assert history[0] == ("user", "message 0") and history[-1] == ("user", "message 9")
+    assert [m for _, m in history[5:8]] == ["message 5", "message 6", "message 7"]
+    assert len(history.earlier()) == 7
+
+
+def test_idle_sessions_are_parked_and_restored(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_store, "get_course_store", lambda: None)
+    registry = make_registry(tmp_path, idle_seconds=0.01)
+    state = registry.get("a")
+    state.profile["level"] = "Beginner"
+    state.set_courses([{"id": "p1", "score": 0.9, "payload": {"title": "Python", "url": "https://p"}}])
+    state.history.append("user", "hi")
+
+    time.sleep(0.03)
+    registry.get("b")
+    assert registry.memory_report()["sessions"] == 1 and registry.states.keys() == ["a"]
+
+    restored = registry.get("a")
+    assert restored is not state
+    assert restored.profile["level"] == "Beginner" and list(restored.history) == [("user", "hi")]
+    assert restored.courses()[0]["course"]["title"] == "Python"
+    assert registry.states.keys() == [] and registry.stats["restored"] == 1
+
+
+def test_expired_sessions_are_deleted_with_their_turns(tmp_path):
+    registry = make_registry(tmp_path, idle_seconds=0.01, ttl_seconds=0.05)
+    history = registry.get("a").history
+    history.max_turns = 1
+    for i in range(3):
+        history.append("user", f"m{i}")
+    assert len(registry.turns) == 2
+
+    time.sleep(0.03)
+    registry.get("b")                       # parks a
+    time.sleep(0.1)
+    registry._last_sweep = 0
+    registry.sweep()                        # a expires, idle b is parked
+    assert registry.states.keys() == ["b"] and len(registry.turns) == 0
+    assert registry.stats["expired"] == 1
+
+
+def test_turn_eviction_does_not_drop_parked_sessions(tmp_path):
+    registry = make_registry(tmp_path, idle_seconds=0.01, max_entries=2)
+    registry.get("a").profile["level"] = "Advanced"
+    time.sleep(0.03)
+    history = registry.get("b").history     # parks a
+    history.max_turns = 1
+    for i in range(6):
+        history.append("user", f"m{i}")
+    assert len(registry.turns) == 2
+    assert registry.get("a").profile["level"] == "Advanced"
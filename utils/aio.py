@@ -0,0 +1,33 @@
+# utils/aio.py
+import asyncio
+import weakref
+
+# event loop -> {name: object}; entries go away with their loop
+_per_loop = weakref.WeakKeyDictionary()
+
+
+def per_loop(name, factory):
+    """
+    Return the object registered under name for the running event loop,
+    creating it with factory() on first use. Asyncio primitives and async
+    HTTP clients are bound to one loop, so they cannot be plain singletons.
+    """
+    loop = asyncio.get_running_loop()
+    objects = _per_loop.setdefault(loop, {})
+    if name not in objects:
+        objects[name] = factory()
+    return objects[name]
+
+
+def pop_per_loop(name):
+    """
+    Remove and return the running loop's object (None if absent).
+    """
+    return _per_loop.get(asyncio.get_running_loop(), {}).pop(name, None)
+
+
+def loop_semaphore(name: str, limit: int) -> asyncio.Semaphore:
+    """
+    Shared concurrency limit for one kind of call on the running loop.
+    """
+    return per_loop(("semaphore", name), lambda: asyncio.Semaphore(max(1, limit)))
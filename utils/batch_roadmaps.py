@@ -0,0 +1,217 @@
+# utils/batch_roadmaps.py
+"""
+Pre-generate learning paths for many student profiles.
+
+    python -m utils.batch_roadmaps cohort.jsonl --out roadmaps.jsonl --workers 8
+
+Input is JSONL or CSV. Each record may hold profile fields directly
+(field_of_interest, skills_to_master, ...) and/or free text in "message",
+which is parsed with parse_profile_from_message (explicit fields win).
+Records are identified by "id" / "student_id" (else their line number).
+Results are appended to the output JSONL as they finish; re-running the
+same command skips ids already written with status "ok" (resume).
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from config.config import settings
+from models.embeddings import embed_texts
+from models.llm import GENERATE_ERROR
+from utils.course_store import normalize_course
+from utils.prompts import PROFILE_KEYS
+from utils.retrieve import (
+    CourseRetriever, build_subqueries, filters_from_profile, parse_profile_from_message,
+    reciprocal_rank_fusion,
+)
+
+ID_COLUMNS = ["id", "student_id", "user_id", "email"]
+TEXT_COLUMNS = ["message", "text", "profile_text"]
+
+
+def read_profiles(path: str):
+    """
+    Yield (record id, profile dict) from a JSONL or CSV file.
+    """
+    if path.endswith(".csv"):
+        records = pd.read_csv(path, dtype=str, keep_default_na=False).to_dict("records")
+    else:
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+
+    for n, rec in enumerate(records):
+        rid = next((str(rec[c]) for c in ID_COLUMNS if rec.get(c)), str(n))
+        text = next((rec[c] for c in TEXT_COLUMNS if rec.get(c)), "")
+        profile = parse_profile_from_message(text) if text else {}
+        profile = {k: profile.get(k) for k in PROFILE_KEYS}
+        profile.update({k: rec[k] for k in PROFILE_KEYS if rec.get(k)})
+        yield rid, profile
+
+
+def completed_ids(out_path: str) -> set:
+    """
+    Ids already written successfully (a truncated last line is ignored).
+    """
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if row.get("status") == "ok":
+                done.add(row["id"])
+    return done
+
+
+def retrieve_chunk(retriever: CourseRetriever, profiles: list, top_k: int) -> list:
+    """
+    Retrieval for many profiles at once: every distinct sub-query is embedded
+    in one embed_texts call and searched in one batch per distinct filter
+    (ids only when the course store is built; fusion hydrates the winners).
+    Profiles whose filters leave too few courses are back-filled from one
+    shared unfiltered batch.
+    """
+    plans = []
+    for profile in profiles:
+        filters = filters_from_profile(profile)
+        plans.append((build_subqueries(profile), filters, json.dumps(filters, sort_keys=True, default=str)))
+
+    texts = sorted({q for queries, _, _ in plans for q in queries})
+    vectors = dict(zip(texts, embed_texts(texts))) if texts else {}
+
+    # (query, filter key) -> hits, one batched search per filter spec
+    by_filter = {}
+    for queries, filters, key in plans:
+        group = by_filter.setdefault(key, (filters, []))[1]
+        group.extend(q for q in queries if q not in group)
+    hits = {}
+    for key, (filters, queries) in by_filter.items():
+        lists = retriever.search_vectors([vectors[q] for q in queries], top_k, filters)
+        hits.update({(q, key): r for q, r in zip(queries, lists)})
+
+    # back-fill: the unfiltered hits of every sub-query of a short filtered profile
+    unfiltered = {q: r for (q, key), r in hits.items() if not by_filter[key][0]}
+    short = set()
+    for queries, filters, key in plans:
+        if filters and len(reciprocal_rank_fusion([hits[(q, key)] for q in queries], top_k)) < top_k:
+            short.update(q for q in queries if q not in unfiltered)
+    if short:
+        short = sorted(short)
+        unfiltered.update(zip(short, retriever.search_vectors([vectors[q] for q in short], top_k)))
+
+    results = []
+    for queries, filters, key in plans:
+        result_lists = [hits[(q, key)] for q in queries]
+        fill = [unfiltered[q] for q in queries] if all(q in unfiltered for q in queries) else None
+        results.append(retriever.fuse_subquery_results(queries, result_lists, top_k, filters, top_k,
+                                                       unfiltered_lists=fill))
+    return results
+
+
+def course_summary(hit: dict) -> dict:
+    course = hit.get("course") or normalize_course(hit.get("payload") or {})
+    return {"id": hit.get("id"), "title": course["title"], "url": course["url"]}
+
+
+def run(input_path: str, out_path: str, workers: int = 8, chunk_size: int = 256, top_k: int = None,
+        limit: int = None) -> dict:
+    top_k = top_k or settings.TOP_K
+    retriever = CourseRetriever()
+    done = completed_ids(out_path)
+    usage_start = dict(getattr(retriever.llm, "usage", {}))
+
+    stats = {"ok": 0, "error": 0, "skipped": 0, "llm_s": 0.0}
+    wall_start = time.perf_counter()
+
+    def generate(rid, profile, retrieved):
+        t0 = time.perf_counter()
+        try:
+            roadmap = retriever.generate_learning_path(profile, retrieved)
+            error = None if roadmap != GENERATE_ERROR else "generation failed"
+        except Exception as e:
+            roadmap, error = None, str(e)
+        return {
+            "id": rid,
+            "status": "error" if error else "ok",
+            "error": error,
+            "profile": profile,
+            "courses": [course_summary(h) for h in retrieved],
+            "roadmap": roadmap,
+            "latency_s": round(time.perf_counter() - t0, 3),
+        }
+
+    pending = []
+    with open(out_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+
+        def write(row):
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            out.flush()  # every finished row is a checkpoint
+            stats[row["status"]] += 1
+            stats["llm_s"] += row["latency_s"]
+
+        def process(chunk):
+            retrieved = retrieve_chunk(retriever, [p for _, p in chunk], top_k)
+            futures = [pool.submit(generate, rid, p, r) for (rid, p), r in zip(chunk, retrieved)]
+            for f in as_completed(futures):
+                write(f.result())
+            total = stats["ok"] + stats["error"]
+            print(f"{total} roadmaps written ({total / (time.perf_counter() - wall_start):.2f}/s)")
+
+        seen = 0
+        for rid, profile in read_profiles(input_path):
+            if limit is not None and seen >= limit:
+                break
+            seen += 1
+            if rid in done:
+                stats["skipped"] += 1
+                continue
+            pending.append((rid, profile))
+            if len(pending) >= chunk_size:
+                process(pending)
+                pending = []
+        if pending:
+            process(pending)
+
+    wall = time.perf_counter() - wall_start
+    usage = getattr(retriever.llm, "usage", {})
+    prompt_tokens = usage.get("prompt_tokens", 0) - usage_start.get("prompt_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0) - usage_start.get("completion_tokens", 0)
+    generated = stats["ok"] + stats["error"]
+    report = {
+        "generated": generated,
+        "ok": stats["ok"],
+        "errors": stats["error"],
+        "skipped_already_done": stats["skipped"],
+        "wall_s": round(wall, 2),
+        "roadmaps_per_s": round(generated / wall, 3) if wall else None,
+        "mean_llm_latency_s": round(stats["llm_s"] / generated, 3) if generated else None,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "estimated_cost_usd": round(prompt_tokens / 1e6 * settings.LLM_PRICE_INPUT_PER_M
+                                    + completion_tokens / 1e6 * settings.LLM_PRICE_OUTPUT_PER_M, 4),
+    }
+    print("Batch finished:", json.dumps(report))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch learning-path generation")
+    parser.add_argument("input", help="profiles (.jsonl or .csv)")
+    parser.add_argument("--out", required=True, help="output JSONL (appended; used to resume)")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent LLM calls")
+    parser.add_argument("--chunk-size", type=int, default=256, help="profiles retrieved per batch")
+    parser.add_argument("--top-k", type=int, default=None)
+    parser.add_argument("--limit", type=int, default=None, help="only the first N input records")
+    args = parser.parse_args()
+    run(args.input, args.out, args.workers, args.chunk_size, args.top_k, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+# utils/cache.py
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache.
+    Evicts least recently used entries once max_entries (or max_bytes,
+    when a sizeof function is given) is exceeded. Keeps hit/miss counters.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes if sizeof else None
+        self._sizeof = sizeof
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def get_many(self, keys) -> dict:
+        """
+        Return {key: value} for the keys that are cached (counts hits/misses).
+        """
+        found = {}
+        with self._lock:
+            for k in keys:
+                if k in self._data:
+                    self._data.move_to_end(k)
+                    found[k] = self._data[k]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items: dict):
+        with self._lock:
+            for k, v in items.items():
+                if k in self._data:
+                    self._bytes -= self._size(self._data.pop(k))
+                self._data[k] = v
+                self._bytes += self._size(v)
+            self._evict()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data.pop(key)
+            self._bytes -= self._size(value)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes if self._sizeof else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+    def _size(self, value) -> int:
+        return self._sizeof(value) if self._sizeof else 0
+
+    def _evict(self):
+        while self._data and (
+            (self.max_entries and len(self._data) > self.max_entries) or
+            (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            _, value = self._data.popitem(last=False)
+            self._bytes -= self._size(value)
+            self.evictions += 1
+
+
+class SqliteStore:
+    """
+    Persistent key -> blob store backed by a single sqlite file.
+    Rows carry created/accessed timestamps; once max_entries is exceeded
+    the least recently accessed rows are deleted.
+    """
+
+    # sqlite's default limit on bound parameters per statement
+    _CHUNK = 500
+
+    def __init__(self, path: str, table: str = "kv", max_entries: int = None):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table}(accessed)")
+
+    def get(self, key, max_age: float = None):
+        return self.get_many([key], max_age=max_age).get(key)
+
+    def get_many(self, keys, max_age: float = None) -> dict:
+        """
+        Fetch {key: blob} for keys present in the store (and younger than
+        max_age seconds, when given). Touches the access time of every hit.
+        """
+        keys = list(keys)
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), self._CHUNK):
+                chunk = keys[i:i + self._CHUNK]
+                marks = ",".join("?" * len(chunk))
+                sql = f"SELECT key, value FROM {self.table} WHERE key IN ({marks})"
+                args = list(chunk)
+                if max_age is not None:
+                    sql += " AND created >= ?"
+                    args.append(now - max_age)
+                for k, v in self._conn.execute(sql, args):
+                    found[k] = v
+            if found:
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET accessed = ? WHERE key = ?",
+                    [(now, k) for k in found]
+                )
+        return found
+
+    def set(self, key, value: bytes):
+        self.set_many({key: value})
+
+    def set_many(self, items: dict):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                [(k, v, now, now) for k, v in items.items()]
+            )
+            self._conn.execute("COMMIT")
+            self._evict()
+
+    def delete(self, keys):
+        keys = list(keys)
+        with self._lock:
+            for i in range(0, len(keys), self._CHUNK):
+                chunk = keys[i:i + self._CHUNK]
+                marks = ",".join("?" * len(chunk))
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key IN ({marks})", chunk)
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def keys(self, idle_for: float = None) -> list:
+        """
+        All keys, or only those not accessed for idle_for seconds.
+        """
+        sql, args = f"SELECT key FROM {self.table}", []
+        if idle_for is not None:
+            sql += " WHERE accessed < ?"
+            args.append(time.time() - idle_for)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql, args)]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self):
+        if not self.max_entries:
+            return
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed ASC LIMIT ?)",
+                (excess,)
+            )
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one execution:
+    the first caller runs fn(), the others wait and share its result.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines: concurrent awaits of do() for the same key
+    on one event loop share a single run of fn(). If the leader is
+    cancelled, a waiting caller runs fn() itself.
+    """
+
+    def __init__(self):
+        self._calls = {}   # (loop, key) -> future of the run in flight
+
+    async def do(self, key, fn):
+        loop = asyncio.get_running_loop()
+        flight = (loop, key)
+        while True:
+            future = self._calls.get(flight)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # this caller was cancelled, not the leader
+
+        future = self._calls[flight] = loop.create_future()
+        # nobody may be waiting: don't warn about an unretrieved exception
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._calls.pop(flight, None)
@@ -0,0 +1,95 @@
+# utils/catalogue.py
+"""
+Streaming catalogue sources for ingestion.
+
+Courses are read in fixed-size chunks from CSV, Parquet or JSONL files, so
+memory stays flat however large the catalogue is. Chunks missing an
+embedding_text are given one by the column-wise builder in text_chunking.
+"""
+import logging
+
+import pandas as pd
+
+from config.config import settings
+from utils.text_chunking import build_embedding_texts
+
+# pyarrow is optional: only Parquet catalogues need it
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".json": "jsonl",
+}
+
+
+def catalogue_format(path: str) -> str:
+    for ext, fmt in FORMATS.items():
+        if path.lower().endswith(ext):
+            return fmt
+    raise ValueError(f"Unsupported catalogue format: {path} (expected one of {sorted(FORMATS)})")
+
+
+def iter_catalogue(path: str, chunk_rows: int = None, columns: list = None):
+    """
+    Yield the catalogue as DataFrames of at most chunk_rows rows (each with
+    a fresh 0-based index). columns restricts what is read, where the
+    format allows it; missing columns are skipped.
+    """
+    chunk_rows = chunk_rows or settings.INGEST_CHUNK_ROWS
+    fmt = catalogue_format(path)
+
+    if fmt == "csv":
+        usecols = (lambda c: c in columns) if columns else None
+        with pd.read_csv(path, chunksize=chunk_rows, usecols=usecols) as reader:
+            for chunk in reader:
+                yield chunk.reset_index(drop=True)
+
+    elif fmt == "parquet":
+        if pq is None:
+            raise ImportError("Reading Parquet catalogues requires pyarrow")
+        parquet = pq.ParquetFile(path)
+        cols = [c for c in columns if c in parquet.schema_arrow.names] if columns else None
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=cols):
+            yield batch.to_pandas()
+
+    else:
+        with pd.read_json(path, lines=True, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                if columns:
+                    chunk = chunk[[c for c in columns if c in chunk.columns]]
+                yield chunk.reset_index(drop=True)
+
+
+def with_embedding_text(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fill in embedding_text from the raw fields where it is missing or empty.
+    """
+    if "embedding_text" not in df.columns:
+        return df.assign(embedding_text=build_embedding_texts(df))
+    missing = df["embedding_text"].isna() | (df["embedding_text"].astype(str).str.strip() == "")
+    if missing.any():
+        df = df.copy()
+        df.loc[missing, "embedding_text"] = build_embedding_texts(df[missing])
+    return df
+
+
+def iter_courses(path: str, chunk_rows: int = None):
+    """
+    iter_catalogue, with embedding_text guaranteed on every chunk.
+    """
+    built = 0
+    for chunk in iter_catalogue(path, chunk_rows):
+        if "embedding_text" not in chunk.columns:
+            built += len(chunk)
+        yield with_embedding_text(chunk)
+    if built:
+        logger.info("Built embedding_text for %d rows of %s", built, path)
@@ -0,0 +1,132 @@
+# utils/conversation.py
+import hashlib
+import logging
+
+from config.config import settings
+from utils.tokens import count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+CHAT_SYSTEM_PROMPT = (
+    "You are Edu.AI, an expert education advisor. Answer the student's "
+    "follow-up questions concisely, consistent with the learning path you gave them."
+)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+def compact_roadmap(roadmap: str, max_tokens: int) -> str:
+    """
+    Keep the skeleton of a roadmap (headings, steps, course names, URLs)
+    and drop the prose, capped at max_tokens.
+    """
+    keep = []
+    for line in (roadmap or "").splitlines():
+        s = line.strip()
+        if s.startswith("#") or s.startswith("- **Step") or s.startswith("- **URL") or s.startswith("- **Platform"):
+            keep.append(s)
+    return truncate_to_tokens("\n".join(keep) or roadmap or "", max_tokens)
+
+
+def _fallback_summary(previous: str, turns, max_tokens: int) -> str:
+    """
+    Extractive summary used when the LLM summarizer is unavailable.
+    """
+    lines = [previous] if previous else []
+    lines += [f"{role}: {truncate_to_tokens(msg, 40)}" for role, msg in turns]
+    text = "\n".join(lines)
+    # keep the most recent part if it overflows
+    while count_tokens(text) > max_tokens and len(lines) > 1:
+        lines.pop(0)
+        text = "\n".join(lines)
+    return truncate_to_tokens(text, max_tokens)
+
+
+class ConversationMemory:
+    """
+    Token-budgeted context window for continue_conversation.
+    - the last max_turns messages are kept verbatim within max_tokens
+    - older messages are folded once into a rolling summary
+    - the roadmap is pinned as a compact reference instead of full markdown
+    Keep one instance per session (e.g. in st.session_state).
+    """
+
+    def __init__(self, max_tokens: int = None, max_turns: int = None,
+                 summary_tokens: int = None, roadmap_tokens: int = None):
+        self.max_tokens = max_tokens or settings.CHAT_MAX_TOKENS
+        self.max_turns = max_turns or settings.CHAT_MAX_TURNS
+        self.summary_tokens = summary_tokens or settings.CHAT_SUMMARY_TOKENS
+        self.roadmap_tokens = roadmap_tokens or settings.CHAT_ROADMAP_TOKENS
+        self.summary = ""
+        self.summarized_upto = 0    # history entries already folded into the summary
+        self.roadmap_ref = ""
+        self._roadmap_digest = None
+
+    def pin_roadmap(self, roadmap: str):
+        self.roadmap_ref = compact_roadmap(roadmap, self.roadmap_tokens)
+        self._roadmap_digest = _digest(roadmap)
+
+    def system_message(self) -> str:
+        parts = [CHAT_SYSTEM_PROMPT]
+        if self.roadmap_ref:
+            parts.append("Learning path you already gave the student (outline):\n" + self.roadmap_ref)
+        if self.summary:
+            parts.append("Summary of the earlier conversation:\n" + self.summary)
+        return "\n\n".join(parts)
+
+    def build_messages(self, history, user_message: str, summarize=None) -> list:
+        """
+        Turn [(role, msg), ...] into the chat messages to send (without the
+        new user message, which LLMModel.chat appends).
+        summarize(previous_summary, turns, max_tokens) folds dropped turns;
+        without it, dropped turns are summarized extractively.
+        history may be any sequence supporting len() and slicing (e.g. a
+        SessionHistory); only turns not yet summarized are read.
+        """
+        history = history if history is not None else []
+        end = len(history)
+        # app.py appends the new user message before calling us
+        if end and tuple(history[end - 1]) == ("user", user_message):
+            end -= 1
+
+        # reserve room for the system message with a full-size summary
+        reserved = count_tokens(CHAT_SYSTEM_PROMPT) + count_tokens(self.roadmap_ref) + self.summary_tokens + 32
+        budget = self.max_tokens - count_tokens(user_message) - reserved
+
+        start = end
+        used = 0
+        while start > self.summarized_upto and end - start < self.max_turns:
+            role, msg = history[start - 1]
+            cost = self._turn_tokens(msg)
+            if used + cost > budget:
+                break
+            used += cost
+            start -= 1
+
+        dropped = history[self.summarized_upto:start] if start > self.summarized_upto else []
+        dropped = [(r, m) for r, m in dropped if _digest(m) != self._roadmap_digest]
+        if dropped:
+            self.summary = self._fold(dropped, summarize)
+        self.summarized_upto = max(self.summarized_upto, start)
+
+        messages = [{"role": "system", "content": self.system_message()}]
+        for role, msg in history[start:end]:
+            if _digest(msg) == self._roadmap_digest:
+                msg = "[Learning path shared above — see outline in the system message]"
+            messages.append({"role": role, "content": msg})
+        return messages
+
+    def _turn_tokens(self, msg: str) -> int:
+        if _digest(msg) == self._roadmap_digest:
+            return 16
+        return count_tokens(msg) + 4
+
+    def _fold(self, turns, summarize) -> str:
+        if summarize is not None:
+            try:
+                return summarize(self.summary, turns, self.summary_tokens)
+            except Exception as e:
+                logger.warning("Conversation summarization failed, using fallback: %s", e)
+        return _fallback_summary(self.summary, turns, self.summary_tokens)
@@ -0,0 +1,209 @@
+# utils/course_store.py
+"""
+Columnar course metadata, built at ingest time.
+
+The catalogue is written once as an Arrow IPC file with a normalized schema
+(title/url/intro aliases resolved) and memory-mapped at query time. Vector
+search then only needs to return point ids + scores; course records are
+looked up here by id, reading just the rows a query returns.
+"""
+import importlib.util
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING
+
+from config.config import settings
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas and pyarrow are imported where they are used: this module sits on the
+# app's import path (retrieve, session_store), which only reads small records.
+# pyarrow is optional: without it the store is disabled and payloads are used
+HAVE_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+logger = logging.getLogger(__name__)
+
+# canonical column -> source columns tried in order (first non-empty wins)
+COURSE_COLUMNS = {
+    "title": ["title", "course_title"],
+    "url": ["url", "course_url", "final_url"],
+    "site": ["site"],
+    "rating": ["rating"],
+    "skills": ["skills"],
+    "instructors": ["instructors"],
+    "category": ["category", "sub-category"],
+    "intro": ["short_intro", "course_short_intro", "Short Intro"],
+    "level": ["level"],
+    "language": ["language"],
+}
+
+
+def course_store_enabled() -> bool:
+    return bool(settings.COURSE_STORE_PATH) and HAVE_PYARROW
+
+
+def slim_payloads() -> bool:
+    """
+    Opt-in (COURSE_STORE_SLIM_PAYLOADS): vector payloads keep only the
+    filter fields, and every replica must have the course store file.
+    """
+    return settings.COURSE_STORE_SLIM_PAYLOADS and course_store_enabled()
+
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([("id", pa.string())] +
+                     [(c, pa.float64() if c == "rating" else pa.string()) for c in COURSE_COLUMNS])
+
+
+def normalize_course(payload: dict) -> dict:
+    """
+    Canonical record from one raw payload (used when there is no store).
+    """
+    record = {}
+    for column, aliases in COURSE_COLUMNS.items():
+        record[column] = next((payload[a] for a in aliases if payload.get(a) is not None), None)
+    return record
+
+
+def normalize_frame(df: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Column-wise version of normalize_course for a whole catalogue.
+    """
+    import pandas as pd
+
+    out = pd.DataFrame(index=df.index)
+    for column, aliases in COURSE_COLUMNS.items():
+        col = None
+        for alias in aliases:
+            if alias in df.columns:
+                col = df[alias] if col is None else col.where(col.notna(), df[alias])
+        if col is None:
+            col = pd.Series(None, index=df.index, dtype=object)
+        if column == "rating":
+            out[column] = pd.to_numeric(col, errors="coerce")
+        else:
+            # object dtype throughout: pandas' string dtype would turn None back into NaN ("nan")
+            values = [None if pd.isna(v) else str(v) for v in col.astype(object)]
+            out[column] = pd.Series(values, index=df.index, dtype=object)
+    return out
+
+
+class CourseStoreWriter:
+    """
+    Streaming writer: append() one chunk at a time, so ingestion never holds
+    the whole catalogue. The file replaces the old store on close().
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or settings.COURSE_STORE_PATH
+        self.tmp = self.path + ".tmp"
+        self.schema = _schema()
+        self.rows = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        self._sink = pa.OSFile(self.tmp, "wb")
+        self._writer = ipc.new_file(self._sink, self.schema)
+
+    def append(self, df: "pd.DataFrame", ids):
+        import pyarrow as pa
+        frame = normalize_frame(df.reset_index(drop=True))
+        frame.insert(0, "id", [str(pid) for pid in ids])
+        self._writer.write_table(pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+        self.rows += len(frame)
+
+    def close(self) -> str:
+        self._writer.close()
+        self._sink.close()
+        os.replace(self.tmp, self.path)
+        logger.info("Wrote course store %s (%d courses)", self.path, self.rows)
+        return self.path
+
+    def abort(self):
+        """
+        Drop the partial file; the previous store stays in place.
+        """
+        try:
+            self._writer.close()
+            self._sink.close()
+        finally:
+            if os.path.exists(self.tmp):
+                os.remove(self.tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def open_course_store_writer(path: str = None):
+    """
+    A CourseStoreWriter, or None when the store is disabled.
+    """
+    return CourseStoreWriter(path) if course_store_enabled() else None
+
+
+def write_course_store(df: "pd.DataFrame", ids, path: str = None) -> str:
+    """
+    Write the normalized catalogue (one row per point id) atomically.
+    """
+    with CourseStoreWriter(path) as writer:
+        writer.append(df, ids)
+    return writer.path
+
+
+class CourseStore:
+    """
+    Read side: the IPC file is memory-mapped (no copy, no parse); get_many
+    materializes only the requested rows.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        self.mtime = os.path.getmtime(path)
+        self.table = ipc.open_file(pa.memory_map(path, "r")).read_all()
+        self._row_of = {pid: i for i, pid in enumerate(self.table.column("id").to_pylist())}
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def get_many(self, ids) -> list:
+        """
+        Course records for ids, in order (None for unknown ids).
+        """
+        import pyarrow as pa
+        rows = [self._row_of.get(str(pid)) for pid in ids]
+        found = [r for r in rows if r is not None]
+        records = iter(self.table.take(pa.array(found, type=pa.int64())).to_pylist() if found else [])
+        return [next(records) if r is not None else None for r in rows]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_course_store():
+    """
+    Shared store, reloaded when the file changes.
+    None when COURSE_STORE_PATH is unset or the store has not been built yet.
+    """
+    global _store
+    path = settings.COURSE_STORE_PATH
+    if not course_store_enabled() or not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    if _store is None or _store.path != path or _store.mtime != mtime:
+        with _store_lock:
+            if _store is None or _store.path != path or _store.mtime != mtime:
+                _store = CourseStore(path)
+                logger.info("Loaded course store %s (%d courses)", path, len(_store))
+    return _store
@@ -0,0 +1,320 @@
+# utils/embedding_artifacts.py
+"""
+Versioned embedding artifacts: restore an index without re-encoding.
+
+    python -m utils.embedding_artifacts export artifacts/v1
+    python -m utils.embedding_artifacts import artifacts/v1
+    python -m utils.embedding_artifacts export artifacts/snap --snapshot
+
+An artifact directory holds
+  vectors.npy          float16 matrix, one row per point
+  ids.json             point id per row
+  payloads.jsonl       one payload per row
+  course_store.arrow   the course store, when one is built
+  manifest.json        embedding model, dimension, count and content hashes
+or, with --snapshot, a Qdrant collection snapshot plus the same manifest.
+Importing checks the manifest against settings.EMBEDDING_MODEL and refuses
+to load vectors from a different model.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+from config.config import settings
+from models.embeddings import MODEL_NAME, EMBEDDING_ID
+from utils.course_store import get_course_store
+from utils.indexer import (
+    count_points, ensure_collection, flush_index, get_qdrant_client, iter_points, upsert_batch,
+)
+from utils.ingest_courses import open_manifest
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+VECTORS = "vectors.npy"
+IDS = "ids.json"
+PAYLOADS = "payloads.jsonl"
+COURSE_STORE = "course_store.arrow"
+
+
+class ArtifactMismatch(ValueError):
+    """
+    The artifact was built with a different embedding model (or is corrupt).
+    """
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(files: dict) -> str:
+    """
+    One hash over the per-file hashes, identifying the artifact's content.
+    """
+    raw = json.dumps(files, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _write_manifest(out_dir: str, kind: str, dim: int, count: int, files: list, **extra) -> dict:
+    hashes = {name: file_sha256(os.path.join(out_dir, name)) for name in files}
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "kind": kind,
+        "embedding_model": MODEL_NAME,
+        "embedding_id": EMBEDDING_ID,
+        "dim": dim,
+        "count": count,
+        "collection": settings.COLLECTION_NAME,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "files": hashes,
+        "content_hash": content_hash(hashes),
+        **extra,
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(artifact_dir: str, verify: bool = True) -> dict:
+    """
+    Load the manifest and fail loudly if the artifact does not fit this deployment.
+    """
+    path = os.path.join(artifact_dir, MANIFEST)
+    if not os.path.exists(path):
+        raise ArtifactMismatch(f"No {MANIFEST} in {artifact_dir}")
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ArtifactMismatch(f"Unsupported artifact format {manifest.get('format_version')} "
+                               f"(expected {FORMAT_VERSION})")
+    if manifest.get("embedding_model") != MODEL_NAME:
+        raise ArtifactMismatch(
+            f"Artifact was embedded with {manifest.get('embedding_model')!r} but EMBEDDING_MODEL is "
+            f"{MODEL_NAME!r}; queries would be encoded in a different vector space. "
+            f"Re-export with the matching model or re-run ingestion.")
+    if manifest.get("embedding_id") != EMBEDDING_ID:
+        # same model, different runtime (e.g. onnx-int8): close, but not bit-identical
+        logger.warning("Artifact embedding runtime %s differs from %s", manifest.get("embedding_id"), EMBEDDING_ID)
+
+    if verify:
+        for name, expected in manifest["files"].items():
+            if file_sha256(os.path.join(artifact_dir, name)) != expected:
+                raise ArtifactMismatch(f"{name} in {artifact_dir} does not match its manifest hash")
+    return manifest
+
+
+# ------------------------------------------------------
+# VECTORS + PAYLOADS
+# ------------------------------------------------------
+def export_artifacts(out_dir: str, batch_size: int = 1024) -> dict:
+    """
+    Dump every point of the current vector store (no encoding involved).
+    """
+    total = count_points()
+    if not total:
+        raise ValueError("The vector store is empty, nothing to export")
+    os.makedirs(out_dir, exist_ok=True)
+    vectors_path = os.path.join(out_dir, VECTORS)
+
+    vectors, ids, n = None, [], 0
+    with open(os.path.join(out_dir, PAYLOADS), "w", encoding="utf-8") as payload_file:
+        for batch_ids, batch_vectors, batch_payloads in iter_points(batch_size):
+            batch_vectors = np.asarray(batch_vectors, dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float16,
+                                                    shape=(total, batch_vectors.shape[1]))
+            if n + len(batch_ids) > total:
+                raise RuntimeError("The collection grew during export; retry once ingestion is done")
+            vectors[n:n + len(batch_ids)] = batch_vectors
+            n += len(batch_ids)
+            ids.extend(batch_ids)
+            for payload in batch_payloads:
+                payload_file.write(json.dumps(payload, default=str, separators=(",", ":")) + "\n")
+    if vectors is None:
+        raise ValueError("The vector store returned no points, nothing to export")
+    dim = vectors.shape[1]
+    vectors.flush()
+    del vectors
+    if n < total:
+        # points deleted during export: keep only the rows written
+        tmp = os.path.join(out_dir, "vectors.tmp.npy")
+        np.save(tmp, np.load(vectors_path, mmap_mode="r")[:n])
+        os.replace(tmp, vectors_path)
+
+    with open(os.path.join(out_dir, IDS), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+
+    files = [VECTORS, IDS, PAYLOADS]
+    store = get_course_store()
+    if store is not None:
+        shutil.copyfile(store.path, os.path.join(out_dir, COURSE_STORE))
+        files.append(COURSE_STORE)
+
+    manifest = _write_manifest(out_dir, "vectors", dim, n, files)
+    print(f"Exported {n} vectors (dim={dim}) to {out_dir}")
+    return manifest
+
+
+def _restore_course_store(artifact_dir: str, manifest: dict):
+    if COURSE_STORE in manifest["files"] and settings.COURSE_STORE_PATH:
+        tmp = settings.COURSE_STORE_PATH + ".tmp"
+        shutil.copyfile(os.path.join(artifact_dir, COURSE_STORE), tmp)
+        os.replace(tmp, settings.COURSE_STORE_PATH)
+
+
+def _record_hashes(ingest_manifest, ids: list, payloads: list) -> int:
+    # points written by incremental ingestion carry their content hash: record them
+    # in the ingest manifest so the next incremental run only embeds real changes
+    hashes = {str(pid): p["content_hash"].encode() for pid, p in zip(ids, payloads) if p.get("content_hash")}
+    ingest_manifest.set_many(hashes)
+    return len(hashes)
+
+
+def _rebuild_ingest_manifest(batch_size: int = 1024) -> int:
+    """
+    Reset the ingest manifest to the hashes of the points now in the collection.
+    """
+    ingest_manifest = open_manifest()
+    try:
+        ingest_manifest.delete(ingest_manifest.keys())
+        restored = 0
+        for ids, _, payloads in iter_points(batch_size, with_vectors=False):
+            restored += _record_hashes(ingest_manifest, ids, payloads)
+    finally:
+        ingest_manifest.close()
+    return restored
+
+
+def import_artifacts(artifact_dir: str, batch_size: int = 1024, verify: bool = True) -> dict:
+    """
+    Bulk-load an exported artifact into the configured vector store.
+    """
+    manifest = read_manifest(artifact_dir, verify=verify)
+    if manifest["kind"] == "qdrant_snapshot":
+        return restore_qdrant_snapshot(artifact_dir, verify=False)
+
+    vectors = np.load(os.path.join(artifact_dir, VECTORS), mmap_mode="r")
+    with open(os.path.join(artifact_dir, IDS), encoding="utf-8") as f:
+        ids = json.load(f)
+    if vectors.shape != (manifest["count"], manifest["dim"]) or len(ids) != manifest["count"]:
+        raise ArtifactMismatch(f"Artifact shape {vectors.shape} / {len(ids)} ids does not match its manifest")
+
+    ensure_collection(manifest["dim"])
+    t0 = time.perf_counter()
+    ingest_manifest = open_manifest()
+    restored = 0
+    try:
+        with open(os.path.join(artifact_dir, PAYLOADS), encoding="utf-8") as payload_file:
+            for start in range(0, len(ids), batch_size):
+                batch_ids = ids[start:start + batch_size]
+                payloads = [json.loads(next(payload_file)) for _ in batch_ids]
+                upsert_batch(np.asarray(vectors[start:start + len(batch_ids)], dtype=np.float32), payloads,
+                             ids=batch_ids)
+                restored += _record_hashes(ingest_manifest, batch_ids, payloads)
+        flush_index()
+    finally:
+        ingest_manifest.close()
+
+    _restore_course_store(artifact_dir, manifest)
+
+    report = {"points": len(ids), "dim": manifest["dim"], "seconds": round(time.perf_counter() - t0, 2),
+              "ingest_manifest_rows": restored, "content_hash": manifest["content_hash"]}
+    print("Import finished:", report)
+    return report
+
+
+# ------------------------------------------------------
+# QDRANT SNAPSHOTS
+# ------------------------------------------------------
+def _qdrant_http(path: str) -> tuple:
+    headers = {"api-key": settings.QDRANT_API_KEY} if settings.QDRANT_API_KEY else {}
+    return f"{settings.QDRANT_URL.rstrip('/')}/collections/{settings.COLLECTION_NAME}{path}", headers
+
+
+def create_qdrant_snapshot(out_dir: str) -> dict:
+    """
+    Snapshot the Qdrant collection server-side and download it next to a manifest.
+    """
+    import requests
+
+    client = get_qdrant_client()
+    info = client.get_collection(settings.COLLECTION_NAME)
+    vectors_config = info.config.params.vectors
+    snapshot = client.create_snapshot(collection_name=settings.COLLECTION_NAME)
+
+    os.makedirs(out_dir, exist_ok=True)
+    url, headers = _qdrant_http(f"/snapshots/{snapshot.name}")
+    with requests.get(url, headers=headers, stream=True, timeout=settings.QDRANT_SNAPSHOT_TIMEOUT) as response:
+        response.raise_for_status()
+        with open(os.path.join(out_dir, snapshot.name), "wb") as f:
+            for block in response.iter_content(1 << 20):
+                f.write(block)
+
+    files = [snapshot.name]
+    store = get_course_store()
+    if store is not None:
+        shutil.copyfile(store.path, os.path.join(out_dir, COURSE_STORE))
+        files.append(COURSE_STORE)
+    manifest = _write_manifest(out_dir, "qdrant_snapshot", vectors_config.size, count_points(), files,
+                               snapshot=snapshot.name)
+    print(f"Saved Qdrant snapshot {snapshot.name} to {out_dir}")
+    return manifest
+
+
+def restore_qdrant_snapshot(artifact_dir: str, verify: bool = True) -> dict:
+    """
+    Upload a downloaded snapshot to Qdrant, replacing the collection.
+    """
+    import requests
+
+    manifest = read_manifest(artifact_dir, verify=verify)
+    if manifest["kind"] != "qdrant_snapshot":
+        raise ArtifactMismatch(f"{artifact_dir} is not a Qdrant snapshot artifact")
+
+    t0 = time.perf_counter()
+    url, headers = _qdrant_http("/snapshots/upload?priority=snapshot")
+    with open(os.path.join(artifact_dir, manifest["snapshot"]), "rb") as f:
+        response = requests.post(url, headers=headers, files={"snapshot": f},
+                                 timeout=settings.QDRANT_SNAPSHOT_TIMEOUT)
+    response.raise_for_status()
+    _restore_course_store(artifact_dir, manifest)
+    restored = _rebuild_ingest_manifest()
+
+    report = {"points": manifest["count"], "dim": manifest["dim"], "seconds": round(time.perf_counter() - t0, 2),
+              "ingest_manifest_rows": restored, "content_hash": manifest["content_hash"]}
+    print("Snapshot restored:", report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / import precomputed embeddings")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("path", help="artifact directory")
+    parser.add_argument("--snapshot", action="store_true", help="export a Qdrant collection snapshot")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--no-verify", action="store_true", help="skip file hash checks on import")
+    args = parser.parse_args()
+
+    if args.action == "export":
+        if args.snapshot:
+            create_qdrant_snapshot(args.path)
+        else:
+            export_artifacts(args.path, args.batch_size)
+    else:
+        import_artifacts(args.path, args.batch_size, verify=not args.no_verify)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,422 @@
 # utils/indexer.py
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+import asyncio
+
+import httpx
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, PointIdsList, QueryRequest,
+    Filter, FieldCondition, MatchValue, MatchAny, Range, PayloadSchemaType,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    BinaryQuantization, BinaryQuantizationConfig, SearchParams, QuantizationSearchParams,
+)
 from config.config import settings
+from utils.aio import per_loop, pop_per_loop, loop_semaphore
+from utils.tracing import span
 import logging
+import threading
+import uuid
 
 logger = logging.getLogger(__name__)
 
+# Namespace for deterministic point IDs derived from course keys
+COURSE_ID_NAMESPACE = uuid.UUID("6f1d3c1e-6b43-4c1a-9a39-1f0f8d2a7c55")
 
-def get_qdrant_client():
+# Payload fields indexed in Qdrant so filtered search stays fast
+PAYLOAD_INDEX_FIELDS = {
+    "site": PayloadSchemaType.KEYWORD,
+    "category": PayloadSchemaType.KEYWORD,
+    "level": PayloadSchemaType.KEYWORD,
+    "language": PayloadSchemaType.KEYWORD,
+    "rating": PayloadSchemaType.FLOAT,
+}
+
+# One client per process: it owns a pooled keep-alive HTTP (or gRPC) connection
+_client = None
+_client_lock = threading.Lock()
+
+
+def _build_qdrant_client(client_class=QdrantClient):
     url = settings.QDRANT_URL
     api_key = settings.QDRANT_API_KEY or None
     if url and url.startswith("http"):
-        return QdrantClient(url=url, api_key=api_key)
-    return QdrantClient()
-
-
-def ensure_collection(vector_size: int):
-    client = get_qdrant_client()
-    try:
-        client.get_collection(settings.COLLECTION_NAME)
-        logger.info("Collection exists: %s", settings.COLLECTION_NAME)
-    except Exception:
-        logger.info("Creating collection: %s", settings.COLLECTION_NAME)
-        client.recreate_collection(
-            collection_name=settings.COLLECTION_NAME,
-            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE)
+        limits = httpx.Limits(
+            max_connections=settings.QDRANT_POOL_SIZE,
+            max_keepalive_connections=settings.QDRANT_POOL_SIZE,
+            keepalive_expiry=settings.QDRANT_KEEPALIVE_SECONDS,
         )
+        return client_class(
+            url=url,
+            api_key=api_key,
+            timeout=settings.QDRANT_TIMEOUT,
+            prefer_grpc=settings.QDRANT_PREFER_GRPC,
+            grpc_port=settings.QDRANT_GRPC_PORT,
+            limits=limits,
+        )
+    return client_class()
+
+
+def get_qdrant_client():
+    """
+    Return the process-wide Qdrant client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                logger.info("Connecting to Qdrant at %s (grpc=%s)", settings.QDRANT_URL, settings.QDRANT_PREFER_GRPC)
+                _client = _build_qdrant_client()
+    return _client
+
+
+def close_qdrant_client():
+    """
+    Close the shared client (e.g. on shutdown); the next call reconnects.
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            try:
+                _client.close()
+            except Exception as e:
+                logger.warning("Error closing Qdrant client: %s", e)
+            _client = None
+
+
+def get_async_qdrant_client():
+    """
+    AsyncQdrantClient for the running event loop (same settings as the
+    sync client). Its connection pool is shared by every coroutine on the loop.
+    """
+    return per_loop("qdrant", lambda: _build_qdrant_client(AsyncQdrantClient))
+
+
+async def close_async_qdrant_client():
+    client = pop_per_loop("qdrant")
+    if client is not None:
+        await client.close()
+
+
+def _hit_to_dict(h):
+    return {"id": h.id, "score": h.score, "payload": h.payload}
+
+
+def _as_list(vector):
+    return vector.tolist() if hasattr(vector, "tolist") else list(vector)
+
+
+def build_qdrant_filter(query_filter: dict):
+    """
+    Translate a filter spec {field: value | [values] | {"gte": x, "lte": y}}
+    into a Qdrant Filter (all conditions must match).
+    """
+    if not query_filter:
+        return None
+    must = []
+    for field, cond in query_filter.items():
+        if isinstance(cond, dict):
+            must.append(FieldCondition(key=field, range=Range(gte=cond.get("gte"), lte=cond.get("lte"))))
+        elif isinstance(cond, (list, tuple, set)):
+            must.append(FieldCondition(key=field, match=MatchAny(any=list(cond))))
+        else:
+            must.append(FieldCondition(key=field, match=MatchValue(value=cond)))
+    return Filter(must=must)
+
+
+def quantization_config(mode: str = None):
+    """
+    Collection quantization for QDRANT_QUANTIZATION: "scalar" (int8),
+    "binary" (1 bit/dim) or "none". Quantized vectors stay in RAM.
+    """
+    mode = (mode or settings.QDRANT_QUANTIZATION).lower()
+    if mode == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if mode == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    if mode not in ("", "none"):
+        raise ValueError(f"Unknown QDRANT_QUANTIZATION: {mode}")
+    return None
+
+
+def search_params(exact: bool = False):
+    """
+    Search-time params: oversample on the quantized vectors, then rescore
+    the candidates against the originals. exact=True bypasses both the
+    HNSW graph and quantization (ground truth for recall checks).
+    """
+    if exact:
+        return SearchParams(exact=True, quantization=QuantizationSearchParams(ignore=True))
+    if settings.QDRANT_QUANTIZATION in ("", "none"):
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(
+        rescore=settings.QDRANT_RESCORE, oversampling=settings.QDRANT_OVERSAMPLING))
+
+
+# ------------------------------------------------------
+# SEARCH BACKENDS
+# ------------------------------------------------------
+class QdrantBackend:
+    """
+    Remote Qdrant collection (default backend).
+    """
+
+    def ensure(self, vector_size: int, on_disk: bool = None):
+        client = get_qdrant_client()
+        try:
+            client.get_collection(settings.COLLECTION_NAME)
+            logger.info("Collection exists: %s", settings.COLLECTION_NAME)
+        except Exception:
+            on_disk = settings.QDRANT_VECTORS_ON_DISK if on_disk is None else on_disk
+            logger.info("Creating collection: %s (quantization=%s, on_disk=%s)",
+                        settings.COLLECTION_NAME, settings.QDRANT_QUANTIZATION, on_disk)
+            client.create_collection(
+                collection_name=settings.COLLECTION_NAME,
+                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE, on_disk=on_disk),
+                quantization_config=quantization_config(),
+            )
+        self.create_payload_indexes()
+
+    def create_payload_indexes(self, fields: dict = None):
+        client = get_qdrant_client()
+        for field, schema in (fields or PAYLOAD_INDEX_FIELDS).items():
+            try:
+                client.create_payload_index(collection_name=settings.COLLECTION_NAME,
+                                            field_name=field, field_schema=schema)
+            except Exception as e:
+                logger.warning("Could not create payload index on %s: %s", field, e)
+
+    def upsert(self, ids, vectors, payloads):
+        points = [PointStruct(id=pid, vector=vec.tolist() if hasattr(vec, "tolist") else vec, payload=meta)
+                  for pid, vec, meta in zip(ids, vectors, payloads)]
+        get_qdrant_client().upsert(collection_name=settings.COLLECTION_NAME, points=points)
+
+    def delete(self, ids):
+        get_qdrant_client().delete(collection_name=settings.COLLECTION_NAME,
+                                   points_selector=PointIdsList(points=list(ids)))
+
+    def search(self, vector, top_k=5, query_filter=None, with_payload=True):
+        response = get_qdrant_client().query_points(collection_name=settings.COLLECTION_NAME,
+                                                   query=_as_list(vector), limit=top_k,
+                                                   query_filter=build_qdrant_filter(query_filter),
+                                                   search_params=search_params(),
+                                                   with_payload=with_payload)
+        return [_hit_to_dict(h) for h in response.points]
+
+    def search_batch(self, vectors, top_k=5, query_filter=None, with_payload=True):
+        qfilter = build_qdrant_filter(query_filter)
+        params = search_params()
+        requests = [QueryRequest(query=_as_list(v), limit=top_k, filter=qfilter, params=params,
+                                 with_payload=with_payload)
+                    for v in vectors]
+        responses = get_qdrant_client().query_batch_points(collection_name=settings.COLLECTION_NAME,
+                                                           requests=requests)
+        return [[_hit_to_dict(h) for h in response.points] for response in responses]
+
+    async def search_async(self, vector, top_k=5, query_filter=None, with_payload=True):
+        response = await get_async_qdrant_client().query_points(collection_name=settings.COLLECTION_NAME,
+                                                               query=_as_list(vector), limit=top_k,
+                                                               query_filter=build_qdrant_filter(query_filter),
+                                                               search_params=search_params(),
+                                                               with_payload=with_payload)
+        return [_hit_to_dict(h) for h in response.points]
+
+    async def search_batch_async(self, vectors, top_k=5, query_filter=None, with_payload=True):
+        qfilter = build_qdrant_filter(query_filter)
+        params = search_params()
+        requests = [QueryRequest(query=_as_list(v), limit=top_k, filter=qfilter, params=params,
+                                 with_payload=with_payload)
+                    for v in vectors]
+        responses = await get_async_qdrant_client().query_batch_points(collection_name=settings.COLLECTION_NAME,
+                                                                       requests=requests)
+        return [[_hit_to_dict(h) for h in response.points] for response in responses]
+
+    def retrieve(self, ids, with_payload=True) -> dict:
+        records = get_qdrant_client().retrieve(collection_name=settings.COLLECTION_NAME, ids=list(ids),
+                                               with_payload=with_payload, with_vectors=False)
+        return {r.id: r.payload or {} for r in records}
+
+    def count(self) -> int:
+        return get_qdrant_client().count(collection_name=settings.COLLECTION_NAME, exact=True).count
+
+    def iter_points(self, batch_size: int = 1024, with_vectors: bool = True):
+        """
+        Scroll the whole collection: (ids, vectors, payloads) per page.
+        """
+        client = get_qdrant_client()
+        offset = None
+        while True:
+            records, offset = client.scroll(collection_name=settings.COLLECTION_NAME, limit=batch_size,
+                                            offset=offset, with_payload=True, with_vectors=with_vectors)
+            if records:
+                vectors = [r.vector for r in records] if with_vectors else None
+                yield [r.id for r in records], vectors, [r.payload or {} for r in records]
+            if offset is None:
+                return
+
+    def flush(self):
+        pass
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _backend_name() -> str:
+    name = settings.VECTOR_BACKEND
+    if name == "auto":
+        url = settings.QDRANT_URL
+        return "qdrant" if url and url.startswith("http") else "local"
+    return name
+
+
+def get_search_backend():
+    """
+    Process-wide search backend chosen by VECTOR_BACKEND:
+    "qdrant" (remote), "local" (in-process index) or "auto"
+    (local whenever QDRANT_URL is not an http URL).
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = _backend_name()
+                if name == "local":
+                    from utils.local_index import LocalVectorIndex
+                    _backend = LocalVectorIndex(settings.LOCAL_INDEX_PATH, dtype=settings.LOCAL_INDEX_DTYPE,
+                                                filter_fields=list(PAYLOAD_INDEX_FIELDS))
+                elif name == "qdrant":
+                    _backend = QdrantBackend()
+                else:
+                    raise ValueError(f"Unknown VECTOR_BACKEND: {name}")
+                logger.info("Vector search backend: %s", name)
+    return _backend
+
+
+def ensure_collection(vector_size: int, on_disk: bool = None):
+    """
+    Create the collection if missing. on_disk keeps original vectors on
+    disk (only the quantized copy in RAM); defaults to QDRANT_VECTORS_ON_DISK.
+    """
+    get_search_backend().ensure(vector_size, on_disk=on_disk)
+
+
+def course_point_id(course_key: str) -> str:
+    """
+    Stable point ID for a course: the same key always maps to the same UUID,
+    so inserting rows in the catalogue never shifts other IDs.
+    """
+    return str(uuid.uuid5(COURSE_ID_NAMESPACE, str(course_key).strip().lower()))
+
+
+def upsert_batch(batch_vectors, batch_payloads, start_id=0, ids=None):
+    """
+    Upsert a batch of vectors. Pass explicit ids (e.g. from course_point_id)
+    to avoid positional IDs.
+    """
+    if ids is None:
+        ids = range(start_id, start_id + len(batch_vectors))
+    with span("upsert", vectors=len(batch_vectors)):
+        get_search_backend().upsert(list(ids), batch_vectors, batch_payloads)
+
+
+def delete_points(ids):
+    get_search_backend().delete(ids)
+
+
+def fetch_payloads(ids, payload_fields=None) -> dict:
+    """
+    Payloads of the given points by id (points that no longer exist are absent).
+    """
+    if not ids:
+        return {}
+    return get_search_backend().retrieve(ids, _with_payload(payload_fields))
+
+
+def count_points() -> int:
+    return get_search_backend().count()
+
+
+def iter_points(batch_size: int = 1024, with_vectors: bool = True):
+    """
+    Every stored point as (ids, vectors, payloads) batches, for exports.
+    """
+    return get_search_backend().iter_points(batch_size, with_vectors)
+
+
+def flush_index():
+    """
+    Persist pending writes (no-op for Qdrant, saves the local index).
+    """
+    get_search_backend().flush()
+
+
+def _with_payload(payload_fields):
+    # None -> full payload, False -> ids + scores only, list -> just those keys
+    if payload_fields is False:
+        return False
+    return list(payload_fields) if payload_fields else True
+
+
+def search_vector(vector, top_k=5, query_filter=None, payload_fields=None):
+    """
+    Nearest courses to vector. query_filter is pushed down into the search
+    ({field: value | [values] | {"gte": x}}); payload_fields limits the
+    payload returned to the listed keys (False: ids + scores only).
+    """
+    with_payload = _with_payload(payload_fields)
+    with span("search", queries=1, top_k=top_k, filtered=bool(query_filter)) as s:
+        hits = get_search_backend().search(vector, top_k, query_filter, with_payload)
+        s.set(hits=len(hits))
+    return hits
+
+
+def search_vectors_batch(vectors, top_k=5, query_filter=None, payload_fields=None):
+    """
+    Search many query vectors in a single round trip.
+    Returns one result list per input vector, in the same order.
+    """
+    if not vectors:
+        return []
+    with_payload = _with_payload(payload_fields)
+    with span("search_batch", queries=len(vectors), top_k=top_k, filtered=bool(query_filter)) as s:
+        results = get_search_backend().search_batch(vectors, top_k, query_filter, with_payload)
+        s.set(hits=sum(len(r) for r in results))
+    return results
 
 
-def upsert_batch(batch_vectors, batch_payloads, start_id=0):
-    client = get_qdrant_client()
-    points = []
-    for i, (vec, meta) in enumerate(zip(batch_vectors, batch_payloads)):
-        points.append(PointStruct(id=start_id + i, vector=vec, payload=meta))
-    client.upsert(collection_name=settings.COLLECTION_NAME, points=points)
+# ------------------------------------------------------
+# ASYNC SEARCH
+# ------------------------------------------------------
+async def search_vector_async(vector, top_k=5, query_filter=None, payload_fields=None):
+    """
+    search_vector for asyncio callers. Qdrant is queried with the async
+    client; the in-process index (CPU-bound) runs in a worker thread.
+    """
+    with_payload = _with_payload(payload_fields)
+    backend = get_search_backend()
+    async with loop_semaphore("search", settings.ASYNC_SEARCH_CONCURRENCY):
+        with span("search", queries=1, top_k=top_k, filtered=bool(query_filter)) as s:
+            if hasattr(backend, "search_async"):
+                hits = await backend.search_async(vector, top_k, query_filter, with_payload)
+            else:
+                hits = await asyncio.to_thread(backend.search, vector, top_k, query_filter, with_payload)
+            s.set(hits=len(hits))
+    return hits
 
 
-def search_vector(vector, top_k=5):
-    client = get_qdrant_client()
-    hits = client.search(collection_name=settings.COLLECTION_NAME,
-                         query_vector=vector, limit=top_k, with_payload=True)
-    result = []
-    for h in hits:
-        result.append({"id": h.id, "score": h.score, "payload": h.payload})
-    return result
+async def search_vectors_batch_async(vectors, top_k=5, query_filter=None, payload_fields=None):
+    """
+    search_vectors_batch for asyncio callers.
+    """
+    if not vectors:
+        return []
+    with_payload = _with_payload(payload_fields)
+    backend = get_search_backend()
+    async with loop_semaphore("search", settings.ASYNC_SEARCH_CONCURRENCY):
+        with span("search_batch", queries=len(vectors), top_k=top_k, filtered=bool(query_filter)) as s:
+            if hasattr(backend, "search_batch_async"):
+                results = await backend.search_batch_async(vectors, top_k, query_filter, with_payload)
+            else:
+                results = await asyncio.to_thread(backend.search_batch, vectors, top_k, query_filter, with_payload)
+            s.set(hits=sum(len(r) for r in results))
+    return results
@@ -1,78 +1,426 @@
 # utils/ingest_courses.py
 
+import hashlib
+import json
+import queue
+import threading
+import time
+
 import pandas as pd
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
 from tqdm import tqdm
-import os
-import pandas as pd
 
 from config.config import settings
-from models.embeddings import embed_texts   # <-- using the shared embedding function
+from models.embeddings import embed_texts, embed_texts_np, EMBEDDING_ID   # <-- using the shared embedding function
+from utils.cache import SqliteStore
+from utils.catalogue import iter_catalogue, iter_courses
+from utils.course_store import open_course_store_writer, slim_payloads
+from utils.indexer import (
+    ensure_collection, upsert_batch, delete_points, flush_index, course_point_id, count_points,
+    PAYLOAD_INDEX_FIELDS,
+)
+from utils.tracing import span
 
 COLLECTION = settings.COLLECTION_NAME
 
 
-def get_qdrant_client():
-    url = os.getenv("QDRANT_URL", settings.QDRANT_URL)
-    api_key = os.getenv("QDRANT_API_KEY", settings.QDRANT_API_KEY) or None
+def build_payloads(batch: pd.DataFrame, meta_fields: list) -> list:
+    """
+    Column-wise payload construction (no iterrows): NaN cells become None.
+    """
+    meta = batch[meta_fields].astype(object)
+    return meta.where(pd.notna(meta), None).to_dict("records")
 
-    if url and url.startswith("http"):
-        return QdrantClient(url=url, api_key=api_key)
-    return QdrantClient()
+
+def payload_columns(df: pd.DataFrame) -> list:
+    """
+    Columns stored in the vector payload. With slim payloads (opt-in),
+    only the filterable fields; everything else is read from the course store.
+    """
+    meta_fields = [c for c in df.columns if c != "embedding_text"]
+    if slim_payloads():
+        return [c for c in meta_fields if c in PAYLOAD_INDEX_FIELDS]
+    return meta_fields
 
 
-def ingest(cleaned_csv_path: str, batch_size: int = 256):
-    df = pd.read_csv(cleaned_csv_path)
-    print(f"Loaded {len(df)} rows from {cleaned_csv_path}")
+def row_hashes(df: pd.DataFrame, texts: list, payloads: list) -> list:
+    """
+    Content hash per row, as recorded in the ingest manifest.
+    """
+    # hash the full row, so metadata-only edits (kept in the course store) still count as changes
+    full = build_payloads(df, [c for c in df.columns if c != "embedding_text"]) if slim_payloads() else payloads
+    return [content_hash(t, p) for t, p in zip(texts, full)]
 
-    qdrant = get_qdrant_client()
 
+def ingest(catalogue_path: str, batch_size: int = 256, vectors_on_disk: bool = None, chunk_rows: int = None,
+           key_columns=None):
+    """
+    Stream the catalogue (CSV, Parquet or JSONL) chunk by chunk into the index.
+    Points get the same course-key ids and content hashes as
+    ingest_incremental, and are recorded in its manifest, so the two can be
+    run against one collection.
+    """
     # sample vector size
     sample_vec = embed_texts("test")[0]
-    vector_size = len(sample_vec)
+    ensure_collection(len(sample_vec), on_disk=vectors_on_disk)
 
-    # recreate collection if not exists
+    store = open_course_store_writer()
+    hashes = {}
+    start = 0
     try:
-        qdrant.get_collection(COLLECTION)
-    except Exception:
-        print("Creating collection:", COLLECTION)
-        qdrant.recreate_collection(
-            collection_name=COLLECTION,
-            vectors_config=VectorParams(
-                size=vector_size,
-                distance=Distance.COSINE
-            ),
-        )
+        for chunk in iter_courses(catalogue_path, chunk_rows):
+            chunk, keys, ids = keyed_rows(chunk, key_columns)
+            meta_fields = payload_columns(chunk)
 
-    meta_fields = [c for c in df.columns if c != "embedding_text"]
+            for offset in range(0, len(chunk), batch_size):
+                batch = chunk.iloc[offset:offset + batch_size]
+
+                texts = batch["embedding_text"].astype(str).tolist()
+                batch_ids = ids[offset:offset + batch_size]
+
+                with span("ingest_batch", rows=len(texts)):
+                    # use external embedding module
+                    embeddings = embed_texts_np(texts, use_cache=False)
+                    payloads = build_payloads(batch, meta_fields)
+                    batch_hashes = row_hashes(batch, texts, payloads)
+                    for payload, key, h in zip(payloads, keys[offset:offset + batch_size], batch_hashes):
+                        payload.update(course_key=key, content_hash=h)
+
+                    upsert_batch(embeddings, payloads, ids=batch_ids)
+                hashes.update(zip(batch_ids, batch_hashes))
+                print(f"Upserted rows {start}..{start + len(batch) - 1}")
+                start += len(batch)
+
+            if store is not None:
+                store.append(chunk, ids)
+    except BaseException:
+        if store is not None:
+            store.abort()
+        raise
+
+    flush_index()
+    record_hashes(hashes)
+    if store is not None:
+        store.close()
+    print(f"Ingestion finished ({start} rows from {catalogue_path}).")
+
+
+# ------------------------------------------------------
+# PIPELINED INGESTION
+# ------------------------------------------------------
+def ingest_pipelined(catalogue_path: str, batch_size: int = 256,
+                     upsert_workers: int = 4, queue_size: int = 8, vectors_on_disk: bool = None,
+                     chunk_rows: int = None, key_columns=None):
+    """
+    Overlap CPU encoding with network upserts.
+    A producer streams the catalogue, embeds batches and builds payloads;
+    a bounded queue (backpressure) feeds several concurrent upsert workers.
+    Returns a throughput report with rows/s per stage.
+    """
+    sample_vec = embed_texts("test")[0]
+    ensure_collection(len(sample_vec), on_disk=vectors_on_disk)
+
+    work = queue.Queue(maxsize=queue_size)
+    stats = {"embed_s": 0.0, "payload_s": 0.0, "upsert_s": 0.0, "rows": 0, "wait_s": 0.0}
+    stats_lock = threading.Lock()
+    errors = []
+    progress = tqdm(desc="Upserted", unit="rows")
+
+    def upsert_worker():
+        while True:
+            item = work.get()
+            try:
+                if item is None:
+                    return
+                if errors:
+                    continue  # drain the queue after a failure
+                ids, embeddings, payloads = item
+                t0 = time.perf_counter()
+                upsert_batch(embeddings, payloads, ids=ids)
+                elapsed = time.perf_counter() - t0
+                with stats_lock:
+                    stats["upsert_s"] += elapsed
+                    stats["rows"] += len(payloads)
+                progress.update(len(payloads))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                work.task_done()
+
+    workers = [threading.Thread(target=upsert_worker, daemon=True) for _ in range(max(1, upsert_workers))]
+    for w in workers:
+        w.start()
+
+    store = open_course_store_writer()
+    hashes = {}
+    rows = 0
+    wall_start = time.perf_counter()
+    try:
+        for chunk in iter_courses(catalogue_path, chunk_rows):
+            chunk, keys, ids = keyed_rows(chunk, key_columns)
+            meta_fields = payload_columns(chunk)
+            texts_all = chunk["embedding_text"].astype(str).tolist()
+
+            for offset in range(0, len(chunk), batch_size):
+                if errors:
+                    break
+                end = min(offset + batch_size, len(chunk))
+
+                t0 = time.perf_counter()
+                embeddings = embed_texts_np(texts_all[offset:end], use_cache=False)
+                t1 = time.perf_counter()
+                payloads = build_payloads(chunk.iloc[offset:end], meta_fields)
+                batch_hashes = row_hashes(chunk.iloc[offset:end], texts_all[offset:end], payloads)
+                for payload, key, h in zip(payloads, keys[offset:end], batch_hashes):
+                    payload.update(course_key=key, content_hash=h)
+                hashes.update(zip(ids[offset:end], batch_hashes))
+                t2 = time.perf_counter()
+
+                # blocks while the queue is full -> producer never runs ahead of the network
+                work.put((ids[offset:end], embeddings, payloads))
+                t3 = time.perf_counter()
+
+                stats["embed_s"] += t1 - t0
+                stats["payload_s"] += t2 - t1
+                stats["wait_s"] += t3 - t2
+            if errors:
+                break
+
+            if store is not None:
+                store.append(chunk, ids)
+            rows += len(chunk)
+    except BaseException:
+        # producer failed (read, embed, store.append): drop the partial course store
+        if store is not None:
+            store.abort()
+        raise
+    finally:
+        for _ in workers:
+            work.put(None)
+        for w in workers:
+            w.join()
+        progress.close()
+
+    if errors:
+        if store is not None:
+            store.abort()
+        raise errors[0]
+    flush_index()
+    record_hashes(hashes)
+    if store is not None:
+        store.close()
+
+    wall = time.perf_counter() - wall_start
+    report = {
+        "rows": rows,
+        "wall_s": round(wall, 3),
+        "rows_per_s": round(rows / wall, 1) if wall else None,
+        "embed_rows_per_s": round(rows / stats["embed_s"], 1) if stats["embed_s"] else None,
+        "payload_rows_per_s": round(rows / stats["payload_s"], 1) if stats["payload_s"] else None,
+        # per-worker rate times the number of workers = aggregate upsert capacity
+        "upsert_rows_per_s": round(stats["rows"] / stats["upsert_s"] * len(workers), 1) if stats["upsert_s"] else None,
+        "producer_blocked_s": round(stats["wait_s"], 3),
+        "upsert_workers": len(workers),
+    }
+    print("Ingestion finished:", report)
+    return report
+
+
+# ------------------------------------------------------
+# INCREMENTAL INGESTION
+# ------------------------------------------------------
+# columns tried (in order) to identify a course across catalogue refreshes
+COURSE_KEY_COLUMNS = ["url", "course_url", "final_url", "title", "course_title"]
+
+
+def course_keys(df: pd.DataFrame, key_columns=None) -> pd.Series:
+    """
+    First non-empty key column per row (url, then title, ...).
+    """
+    cols = [c for c in (key_columns or COURSE_KEY_COLUMNS) if c in df.columns]
+    if not cols:
+        raise ValueError(f"None of the key columns {key_columns or COURSE_KEY_COLUMNS} found in catalogue")
+    keys = df[cols].astype(object).where(df[cols].notna() & (df[cols].astype(str) != ""))
+    return keys.bfill(axis=1).iloc[:, 0]
+
+
+def content_hash(text: str, payload: dict) -> str:
+    """
+    Hash of everything that ends up in Qdrant for a point (model + backend, text, payload).
+    """
+    raw = EMBEDDING_ID + "\x00" + text + "\x00" + json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def keyed_rows(df: pd.DataFrame, key_columns=None):
+    """
+    Drop rows without a course key; returns (rows, keys, point ids).
+    """
+    keys = course_keys(df, key_columns)
+    valid = keys.notna()
+    if not valid.all():
+        print(f"Skipping {int((~valid).sum())} rows without a course key")
+        df, keys = df[valid].reset_index(drop=True), keys[valid].reset_index(drop=True)
+    keys = keys.astype(str).tolist()
+    return df, keys, [course_point_id(k) for k in keys]
+
+
+def manifest_scope() -> bytes:
+    return json.dumps({"collection": settings.COLLECTION_NAME, "embedding_id": EMBEDDING_ID},
+                      sort_keys=True).encode("utf-8")
+
+
+def open_manifest(manifest_path: str = None) -> SqliteStore:
+    """
+    The incremental-ingestion manifest (point id -> content hash). It is
+    only valid for the collection and embedding model it was built with;
+    if either changed, it is emptied so every row is re-uploaded.
+    """
+    path = manifest_path or settings.INGEST_MANIFEST_PATH
+    manifest = SqliteStore(path, table="points")
+    meta = SqliteStore(path, table="meta")
+    try:
+        scope = manifest_scope()
+        stored = meta.get("scope")
+        if stored != scope:
+            if len(manifest):
+                print(f"Ingest manifest was built for {(stored or b'an unknown collection').decode()}, starting over")
+                manifest.delete(manifest.keys())
+            meta.set("scope", scope)
+    finally:
+        meta.close()
+    return manifest
+
+
+def record_hashes(hashes: dict, manifest_path: str = None):
+    """
+    Record point id -> content hash for points a full ingest wrote (call
+    after flush_index), so incremental runs skip them and delete_missing
+    sees them.
+    """
+    manifest = open_manifest(manifest_path)
+    try:
+        manifest.set_many({pid: h.encode() for pid, h in hashes.items()})
+    finally:
+        manifest.close()
+
+
+def scan_course_ids(catalogue_path: str, key_columns=None, chunk_rows: int = None) -> dict:
+    """
+    First pass of incremental ingestion: reads only the key columns and
+    returns point id -> row position of its last occurrence.
+    """
+    last = {}
+    position = skipped = rows = 0
+    for chunk in iter_catalogue(catalogue_path, chunk_rows, columns=key_columns or COURSE_KEY_COLUMNS):
+        keys = course_keys(chunk, key_columns)
+        valid = keys.notna()
+        ids = keys[valid].map(course_point_id)
+        # later rows overwrite earlier ones -> last occurrence wins
+        last.update(zip(ids, (position + keys.index[valid]).tolist()))
+        skipped += int((~valid).sum())
+        position += len(chunk)
+        rows += len(chunk)
+    if skipped:
+        print(f"Skipping {skipped} rows without a course key")
+    if rows - skipped > len(last):
+        print(f"Dropping {rows - skipped - len(last)} duplicate courses (keeping the last occurrence)")
+    return last
+
+
+def ingest_incremental(catalogue_path: str, batch_size: int = 256,
+                       manifest_path: str = None, key_columns=None,
+                       delete_missing: bool = True, checkpoint_every: int = 20,
+                       vectors_on_disk: bool = None, chunk_rows: int = None):
+    """
+    Idempotent re-ingestion with stable, content-addressed points.
+    - point IDs derive from a course key, not the row position
+    - only new or changed rows (by content hash) are embedded and upserted
+    - points whose course left the catalogue are deleted
+    The catalogue is streamed twice: once for the keys (to resolve
+    duplicates), once chunk by chunk for the rows themselves.
+    The manifest (point id -> content hash) is committed every
+    checkpoint_every batches, right after the index is flushed, so an
+    interrupted run resumes from the last checkpoint.
+    """
+    last = scan_course_ids(catalogue_path, key_columns, chunk_rows)
+    keep = set(last.values())
+
+    sample_vec = embed_texts("test")[0]
+    ensure_collection(len(sample_vec), on_disk=vectors_on_disk)
+
+    manifest = open_manifest(manifest_path)
+    if len(manifest) > count_points():
+        # the manifest lists points the collection no longer has (recreated / wiped)
+        print("Collection has fewer points than the ingest manifest, re-uploading everything")
+        manifest.delete(manifest.keys())
+    store = open_course_store_writer()
+    upserted = batches = position = 0
+    pending = {}
+    try:
+        for chunk in iter_courses(catalogue_path, chunk_rows):
+            positions = pd.RangeIndex(position, position + len(chunk))
+            position += len(chunk)
+            df = chunk[positions.isin(keep)].reset_index(drop=True)
+            if df.empty:
+                continue
+
+            keys = course_keys(df, key_columns)
+            ids = keys.map(course_point_id).tolist()
+            meta_fields = payload_columns(df)
+            texts = df["embedding_text"].astype(str).tolist()
+            payloads = build_payloads(df, meta_fields)
+            hashes = row_hashes(df, texts, payloads)
 
-    for start in range(0, len(df), batch_size):
-        end = min(start + batch_size, len(df))
-        batch = df.iloc[start:end]
+            known = {k: v.decode() for k, v in manifest.get_many(ids).items()}
+            changed = [i for i, (pid, h) in enumerate(zip(ids, hashes)) if known.get(pid) != h]
 
-        texts = batch["embedding_text"].astype(str).tolist()
+            for start in range(0, len(changed), batch_size):
+                rows = changed[start:start + batch_size]
+                with span("ingest_batch", rows=len(rows)):
+                    embeddings = embed_texts_np([texts[i] for i in rows], use_cache=False)
 
-        # use external embedding module
-        embeddings = embed_texts(texts)
+                    batch_payloads = [dict(payloads[i], course_key=str(keys[i]), content_hash=hashes[i]) for i in rows]
+                    upsert_batch(embeddings, batch_payloads, ids=[ids[i] for i in rows])
+                pending.update({ids[i]: hashes[i].encode() for i in rows})
+                upserted += len(rows)
+                batches += 1
+                print(f"Upserted {upserted} changed rows ({position} rows read)")
 
-        points = []
-        for i, (emb, (_, row)) in enumerate(zip(embeddings, batch.iterrows())):
-            payload = {k: (None if pd.isna(row[k]) else row[k]) for k in meta_fields}
+                # only record rows once the index has persisted them -> safe to resume after a crash
+                if batches % checkpoint_every == 0:
+                    flush_index()
+                    manifest.set_many(pending)
+                    pending = {}
 
-            # include final_url if present
-            if "final_url" in row and pd.notna(row["final_url"]):
-                payload["final_url"] = row["final_url"]
+            if store is not None:
+                store.append(df, ids)
 
-            points.append(
-                PointStruct(
-                    id=start + i,
-                    vector=emb,
-                    payload=payload
-                )
-            )
+        if pending:
+            flush_index()
+            manifest.set_many(pending)
+            pending = {}
+    except BaseException:
+        if store is not None:
+            store.abort()
+        manifest.close()
+        raise
 
-        qdrant.upsert(collection_name=COLLECTION, points=points)
-        print(f"Upserted points {start}..{end-1}")
+    deleted = 0
+    if delete_missing:
+        stale = [pid for pid in manifest.keys() if pid not in last]
+        for start in range(0, len(stale), batch_size):
+            chunk = stale[start:start + batch_size]
+            delete_points(chunk)
+            manifest.delete(chunk)
+        deleted = len(stale)
+        if deleted:
+            print(f"Deleted {deleted} points no longer in the catalogue")
 
-    print("Ingestion finished.")
+    flush_index()
+    manifest.close()
+    if store is not None:
+        store.close()
+    report = {"rows": len(last), "upserted": upserted,
+              "unchanged": len(last) - upserted, "deleted": deleted}
+    print("Incremental ingestion finished:", report)
+    return report
@@ -0,0 +1,330 @@
+# utils/local_index.py
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# payload fields kept as in-memory columns for fast filtering
+DEFAULT_FILTER_FIELDS = ["site", "category", "level", "language", "rating"]
+
+# rows scored per matmul chunk (bounds the float16 -> float32 upcast buffer)
+_SCORE_CHUNK = 65536
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class _PayloadStore:
+    """
+    Compact payload storage: one JSON document per row in a single file,
+    memory-mapped and decoded only for the rows a search returns.
+    Rows written since the last save live in an in-memory overlay.
+    """
+
+    def __init__(self):
+        self._blob = b""
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._overlay = {}
+        self._size = 0
+
+    def load(self, blob_path: str, offsets_path: str):
+        self._offsets = np.load(offsets_path)
+        self._size = len(self._offsets) - 1
+        self._overlay = {}
+        if self._size and os.path.getsize(blob_path):
+            self._blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            self._blob = b""
+
+    def save(self, blob_path: str, offsets_path: str, rows):
+        offsets = [0]
+        with open(blob_path + ".tmp", "wb") as f:
+            for r in rows:
+                raw = self.raw(r)
+                f.write(raw)
+                offsets.append(offsets[-1] + len(raw))
+        np.save(offsets_path + ".tmp.npy", np.asarray(offsets, dtype=np.int64))
+        os.replace(blob_path + ".tmp", blob_path)
+        os.replace(offsets_path + ".tmp.npy", offsets_path)
+
+    def raw(self, row: int) -> bytes:
+        if row in self._overlay:
+            return self._overlay[row]
+        start, end = self._offsets[row], self._offsets[row + 1]
+        return bytes(self._blob[start:end])
+
+    def get(self, row: int) -> dict:
+        return json.loads(self.raw(row))
+
+    def put(self, row: int, payload: dict):
+        self._overlay[row] = json.dumps(payload, default=str, separators=(",", ":")).encode("utf-8")
+        self._size = max(self._size, row + 1)
+
+    def __len__(self):
+        return self._size
+
+
+class LocalVectorIndex:
+    """
+    In-process exact cosine search over a memory-mapped embedding matrix.
+    Layout under `path`:
+      vectors.npy               L2-normalized float16/float32 matrix
+      ids.json                  point id per row
+      payloads.bin/offsets.npy  compact payload store
+    Exact top-k is a vectorized matmul + argpartition; filters run on
+    in-memory payload columns. Writes are buffered and folded into the
+    matrix on the next search or save: appends go into a preallocated
+    array that grows geometrically, so bulk loads stay linear.
+    """
+
+    def __init__(self, path: str, dtype: str = "float16", filter_fields=None):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.filter_fields = list(filter_fields or DEFAULT_FILTER_FIELDS)
+        self._lock = threading.RLock()
+        self._matrix = None            # (n, dim) normalized vectors: memmap, or a view of _buffer
+        self._buffer = None            # owned, preallocated matrix once anything was written
+        self._pending = []             # batches of rows appended since the last materialize
+        self._updates = {}             # row -> vector, rewrites since the last materialize
+        self._ids = []
+        self._row_of = {}
+        self._dead = set()             # deleted rows (dropped on save)
+        self._mask = None              # cached alive mask, see _alive()
+        self._payloads = _PayloadStore()
+        self._columns = {}
+        self.dim = None
+        if os.path.exists(os.path.join(path, "vectors.npy")):
+            self.load()
+
+    # -----------------------------
+    # persistence
+    # -----------------------------
+    def load(self):
+        with self._lock:
+            self._matrix = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+            self.dim = self._matrix.shape[1]
+            with open(os.path.join(self.path, "ids.json")) as f:
+                self._ids = json.load(f)
+            self._row_of = {pid: i for i, pid in enumerate(self._ids)}
+            self._buffer = None
+            self._pending, self._updates = [], {}
+            self._dead, self._mask = set(), None
+            self._payloads.load(os.path.join(self.path, "payloads.bin"),
+                                os.path.join(self.path, "offsets.npy"))
+            self._columns = {}
+            logger.info("Loaded local index %s: %d vectors (dim=%d)", self.path, len(self._ids), self.dim)
+
+    def save(self):
+        """
+        Compact deleted rows and write everything to disk.
+        """
+        with self._lock:
+            self._materialize()
+            os.makedirs(self.path, exist_ok=True)
+            rows = np.flatnonzero(self._alive())
+            matrix = np.ascontiguousarray(self._matrix[rows]) if self._matrix is not None \
+                else np.zeros((0, self.dim or 0), dtype=self.dtype)
+            tmp = os.path.join(self.path, "vectors.tmp.npy")
+            np.save(tmp, matrix)
+            self._payloads.save(os.path.join(self.path, "payloads.bin"),
+                                os.path.join(self.path, "offsets.npy"), rows)
+            with open(os.path.join(self.path, "ids.json.tmp"), "w") as f:
+                json.dump([self._ids[r] for r in rows], f)
+            os.replace(tmp, os.path.join(self.path, "vectors.npy"))
+            os.replace(os.path.join(self.path, "ids.json.tmp"), os.path.join(self.path, "ids.json"))
+        self.load()
+
+    def flush(self):
+        self.save()
+
+    # -----------------------------
+    # writes
+    # -----------------------------
+    def ensure(self, vector_size: int, on_disk: bool = None):
+        # the matrix is always memory-mapped from disk, on_disk is accepted for API parity
+        if self.dim is None:
+            self.dim = vector_size
+        elif self.dim != vector_size:
+            raise ValueError(f"Local index has dim={self.dim}, got vectors of size {vector_size}")
+
+    def create_payload_indexes(self, fields=None):
+        # "indexes" here are the in-memory filter columns
+        if fields:
+            self.filter_fields = list(fields)
+            self._columns = {}
+
+    def upsert(self, ids, vectors, payloads):
+        vectors = _normalize(vectors).astype(self.dtype)
+        with self._lock:
+            self.ensure(vectors.shape[1])
+            # new rows get the next ids (matrix + pending rows); nothing is copied until _materialize
+            new = []
+            for i, (pid, payload) in enumerate(zip(ids, payloads)):
+                row = self._row_of.get(pid)
+                if row is None:
+                    row = len(self._ids)
+                    self._ids.append(pid)
+                    self._row_of[pid] = row
+                    new.append(i)
+                else:
+                    self._updates[row] = vectors[i]
+                self._payloads.put(row, payload or {})
+            if new:
+                self._pending.append(vectors[new])
+            self._mask = None
+            self._columns = {}
+
+    def delete(self, ids):
+        with self._lock:
+            for pid in ids:
+                row = self._row_of.pop(pid, None)
+                if row is not None:
+                    self._dead.add(row)
+            self._mask = None
+
+    def retrieve(self, ids, with_payload=True) -> dict:
+        with self._lock:
+            rows = {pid: self._row_of.get(pid) for pid in ids}
+            return {pid: self._hit(row, 0.0, with_payload)["payload"] or {}
+                    for pid, row in rows.items() if row is not None and row not in self._dead}
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._ids) - len(self._dead)
+
+    def iter_points(self, batch_size: int = 1024, with_vectors: bool = True):
+        """
+        Yield (ids, vectors, payloads) for every live point, batch by batch
+        (vectors is None when with_vectors is False).
+        """
+        with self._lock:
+            self._materialize()
+            rows = np.flatnonzero(self._alive())
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            # copy under the lock, yield outside it: the consumer may take its time
+            with self._lock:
+                batch = ([self._ids[r] for r in chunk],
+                         np.array(self._matrix[chunk]) if with_vectors else None,
+                         [self._payloads.get(r) for r in chunk])
+            yield batch
+
+    # -----------------------------
+    # search
+    # -----------------------------
+    def search(self, vector, top_k: int = 5, query_filter: dict = None, with_payload=True):
+        return self.search_batch([vector], top_k, query_filter, with_payload)[0]
+
+    def search_batch(self, vectors, top_k: int = 5, query_filter: dict = None, with_payload=True):
+        with self._lock:
+            self._materialize()
+            if self._matrix is None or not len(self._ids):
+                return [[] for _ in vectors]
+            queries = _normalize(vectors)
+            mask = self._alive() & self._filter_mask(query_filter)
+            candidates = np.flatnonzero(mask)
+            if not len(candidates):
+                return [[] for _ in vectors]
+
+            scores = np.empty((len(candidates), len(queries)), dtype=np.float32)
+            for start in range(0, len(candidates), _SCORE_CHUNK):
+                rows = candidates[start:start + _SCORE_CHUNK]
+                scores[start:start + len(rows)] = self._matrix[rows].astype(np.float32) @ queries.T
+
+            k = min(top_k, len(candidates))
+            results = []
+            for q in range(len(queries)):
+                col = scores[:, q]
+                top = np.argpartition(-col, k - 1)[:k]
+                top = top[np.argsort(-col[top])]
+                results.append([self._hit(candidates[i], float(col[i]), with_payload) for i in top])
+            return results
+
+    def _hit(self, row: int, score: float, with_payload):
+        payload = None
+        if with_payload:
+            payload = self._payloads.get(row)
+            if isinstance(with_payload, (list, tuple)):
+                payload = {k: payload.get(k) for k in with_payload}
+        return {"id": self._ids[row], "score": score, "payload": payload}
+
+    # -----------------------------
+    # filtering
+    # -----------------------------
+    def _filter_mask(self, query_filter: dict) -> np.ndarray:
+        """
+        query_filter maps field -> value | [values] | {"gte": x, "lte": y}.
+        All conditions must hold.
+        """
+        mask = np.ones(len(self._ids), dtype=bool)
+        for field, cond in (query_filter or {}).items():
+            col = self._column(field)
+            if isinstance(cond, dict):
+                nums = np.array([v if isinstance(v, (int, float)) else np.nan for v in col], dtype=np.float64)
+                with np.errstate(invalid="ignore"):
+                    if "gte" in cond:
+                        mask &= nums >= cond["gte"]
+                    if "lte" in cond:
+                        mask &= nums <= cond["lte"]
+            else:
+                values = cond if isinstance(cond, (list, tuple, set)) else [cond]
+                wanted = {v.lower() if isinstance(v, str) else v for v in values}
+                mask &= np.fromiter((v in wanted for v in col), dtype=bool, count=len(col))
+        return mask
+
+    def _column(self, field: str) -> np.ndarray:
+        col = self._columns.get(field)
+        if col is None:
+            values = []
+            for row in range(len(self._ids)):
+                v = self._payloads.get(row).get(field)
+                values.append(v.lower() if isinstance(v, str) else v)
+            col = np.array(values, dtype=object)
+            if field in self.filter_fields:
+                self._columns[field] = col
+        return col
+
+    # -----------------------------
+    # internals
+    # -----------------------------
+    def _alive(self) -> np.ndarray:
+        if self._mask is None:
+            mask = np.ones(len(self._ids), dtype=bool)
+            if self._dead:
+                mask[list(self._dead)] = False
+            self._mask = mask
+        return self._mask
+
+    def _materialize(self):
+        """
+        Fold pending appends and rewrites into the matrix. The first write
+        after a load copies the memory-mapped matrix into an owned buffer;
+        from then on appends fill its spare capacity (doubled when full).
+        """
+        if not self._pending and not self._updates:
+            return
+        n = len(self._ids)
+        base = 0 if self._matrix is None else len(self._matrix)
+        if self._buffer is None or len(self._buffer) < n:
+            capacity = max(n, 2 * len(self._buffer)) if self._buffer is not None else n
+            buffer = np.empty((capacity, self.dim), dtype=self.dtype)
+            if base:
+                buffer[:base] = self._matrix
+            self._buffer = buffer
+        for batch in self._pending:
+            self._buffer[base:base + len(batch)] = batch
+            base += len(batch)
+        for row, vec in self._updates.items():
+            self._buffer[row] = vec
+        self._matrix = self._buffer[:n]
+        self._pending, self._updates = [], {}
@@ -0,0 +1,126 @@
+# utils/prefetch.py
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config.config import settings
+from utils.indexer import PAYLOAD_INDEX_FIELDS
+from utils.retrieve import COURSE_PAYLOAD_FIELDS, build_subqueries, filters_from_profile, hydrate_hits
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _prefetch_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max(1, settings.PREFETCH_WORKERS),
+                                               thread_name_prefix="prefetch")
+    return _executor
+
+
+def matches_filter(payload: dict, query_filter: dict) -> bool:
+    """
+    Client-side check of the filter spec used by search_vector
+    ({field: value | [values] | {"gte": x, "lte": y}}).
+    """
+    for field, cond in (query_filter or {}).items():
+        value = payload.get(field)
+        if isinstance(cond, dict):
+            try:
+                if "gte" in cond and not float(value) >= cond["gte"]:
+                    return False
+                if "lte" in cond and not float(value) <= cond["lte"]:
+                    return False
+            except (TypeError, ValueError):
+                return False
+        elif isinstance(cond, (list, tuple, set)):
+            if value not in cond:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+class RetrievalPrefetcher:
+    """
+    Per-session speculative retrieval.
+    While follow-up questions are asked, prefetch() starts embedding + search
+    for the sub-queries the profile already implies, in the background.
+    Prefetched searches are unfiltered and over-fetched (the level usually
+    arrives last), carrying the filterable payload fields, so retrieve()
+    can apply the final filters locally. Only sub-queries that are new, or
+    whose filtered hits run short, are searched on the critical path.
+    """
+
+    def __init__(self, retriever, top_k: int = 5, per_query_k: int = None, overfetch: int = None):
+        self.retriever = retriever
+        self.top_k = top_k
+        self.per_query_k = per_query_k or top_k
+        self.overfetch = overfetch or settings.PREFETCH_OVERFETCH
+        self._pending = {}   # query -> (future, index in the future's result)
+        self.stats = {"prefetched": 0, "reused": 0, "fetched": 0}
+
+    def prefetch(self, user_profile: dict) -> int:
+        """
+        Launch background search for sub-queries not seen yet.
+        Needs at least field_of_interest; returns the number of queries started.
+        """
+        if not (user_profile or {}).get("field_of_interest"):
+            return 0
+        queries = [q for q in build_subqueries(user_profile) if q.lower() not in self._pending]
+        if not queries:
+            return 0
+
+        payload_fields = COURSE_PAYLOAD_FIELDS + list(PAYLOAD_INDEX_FIELDS)
+        future = _prefetch_executor().submit(self.retriever.search_subqueries, queries,
+                                             self.per_query_k * max(1, self.overfetch), None, payload_fields)
+        for i, q in enumerate(queries):
+            self._pending[q.lower()] = (future, i)
+        self.stats["prefetched"] += len(queries)
+        return len(queries)
+
+    def _reuse(self, query: str, filters: dict):
+        """
+        Prefetched hits for query narrowed to filters, or None if unusable.
+        """
+        entry = self._pending.get(query.lower())
+        if entry is None:
+            return None
+        future, idx = entry
+        try:
+            hits = hydrate_hits(future.result()[idx])
+        except Exception as e:
+            logger.warning("Prefetched search failed, retrying inline: %s", e)
+            return None
+        kept = [h for h in hits if matches_filter(h.get("payload") or {}, filters)]
+        # too few left after filtering: a filtered search could find more
+        if filters and len(kept) < self.per_query_k and len(hits) >= self.per_query_k * max(1, self.overfetch):
+            return None
+        return kept[:self.per_query_k]
+
+    def retrieve(self, user_profile: dict) -> list:
+        """
+        Same result shape as CourseRetriever.retrieve_courses_multi, using
+        prefetched sub-query results where they still apply.
+        """
+        filters = filters_from_profile(user_profile)
+        queries = build_subqueries(user_profile)
+        result_lists = [self._reuse(q, filters) for q in queries]
+
+        missing = [i for i, hits in enumerate(result_lists) if hits is None]
+        self.stats["reused"] += len(queries) - len(missing)
+        if missing:
+            fresh = self.retriever.search_subqueries([queries[i] for i in missing], self.per_query_k, filters)
+            for i, hits in zip(missing, fresh):
+                result_lists[i] = hits
+            self.stats["fetched"] += len(missing)
+
+        return self.retriever.fuse_subquery_results(queries, result_lists, self.top_k, filters, self.per_query_k)
+
+    def clear(self):
+        self._pending.clear()
@@ -0,0 +1,156 @@
+# utils/profile_extractor.py
+import json
+import os
+import re
+import threading
+
+from config.config import settings
+
+_TOKEN_RE = re.compile(r"[a-z0-9+#]+")
+_GOAL_RE = re.compile(r"become (an? )?([a-z ]+)")
+_HOURS_RE = re.compile(r"(\d+)\s*(hours|hrs|hour)\/?\s*(week|weekly)?")
+
+_END = "$"   # trie key holding the entries that end at a node
+
+# taxonomy section -> profile field it fills
+_SECTIONS = {
+    "fields": "field_of_interest",
+    "skills": "skills_to_master",
+    "preferences": "preference",
+    "levels": "level",
+}
+
+DEFAULT_TAXONOMY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                     "config", "taxonomy.json")
+
+
+def _tokens(text: str) -> list:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class ProfileExtractor:
+    """
+    Taxonomy-driven intent + profile extraction.
+    Every phrase and synonym in the taxonomy is compiled once into a
+    word-level trie; a message is tokenized once and scanned in a single
+    pass, so cost depends on message length, not vocabulary size.
+    Matching whole words avoids substring hits like "ml" in "html".
+    """
+
+    def __init__(self, taxonomy: dict):
+        self.taxonomy = taxonomy
+        self._trie = {}
+        self._max_len = 1
+
+        for phrase in taxonomy.get("intent", []):
+            self._add(phrase, ("intent", phrase, 0))
+        for section, field in _SECTIONS.items():
+            for priority, entry in enumerate(taxonomy.get(section, [])):
+                name = entry["name"]
+                for phrase in [name] + entry.get("synonyms", []):
+                    self._add(phrase, (field, name, priority))
+
+    @classmethod
+    def from_file(cls, path: str):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _add(self, phrase: str, entry: tuple):
+        words = _tokens(phrase)
+        if not words:
+            return
+        node = self._trie
+        for w in words:
+            node = node.setdefault(w, {})
+        node.setdefault(_END, []).append(entry)
+        self._max_len = max(self._max_len, len(words))
+
+    def _matches(self, words: list) -> list:
+        """
+        All (start, end, entry) matches, overlapping ones included.
+        """
+        found = []
+        for start in range(len(words)):
+            node = self._trie
+            for end in range(start, min(len(words), start + self._max_len)):
+                node = node.get(words[end])
+                if node is None:
+                    break
+                for entry in node.get(_END, ()):
+                    found.append((start, end + 1, entry))
+        return found
+
+    def analyze(self, message: str):
+        """
+        Return (profile dict, learning intent flag) for one message.
+        """
+        profile = {
+            "field_of_interest": None,
+            "skills_to_master": None,
+            "preference": None,
+            "level": None,
+            "career_goal": None,
+            "availability": None
+        }
+        if not message:
+            return profile, False
+
+        m = " ".join(message.lower().split())
+        matches = self._matches(_tokens(m))
+
+        # drop matches nested inside a longer match of the same kind ("js" in "node.js")
+        spans = {}
+        for start, end, (kind, _, _) in matches:
+            spans.setdefault(kind, []).append((start, end))
+        def nested(kind, start, end):
+            return any(s <= start and end <= e and (s, e) != (start, end) for s, e in spans[kind])
+
+        intent = False
+        best = {}
+        skills = set()
+        for start, end, (kind, name, priority) in matches:
+            if kind == "intent":
+                intent = True
+            elif nested(kind, start, end):
+                continue
+            elif kind == "skills_to_master":
+                skills.add(name)
+            elif kind not in best or priority < best[kind][0]:
+                best[kind] = (priority, name)
+
+        for kind, (_, name) in best.items():
+            profile[kind] = name
+        if skills:
+            profile["skills_to_master"] = ", ".join(sorted(skills))
+
+        goal_match = _GOAL_RE.search(m)
+        if goal_match:
+            profile["career_goal"] = goal_match.group(2).strip()
+
+        time_match = _HOURS_RE.search(m)
+        if time_match:
+            profile["availability"] = time_match.group(1) + " hours/week"
+
+        return profile, intent
+
+    def extract(self, message: str) -> dict:
+        return self.analyze(message)[0]
+
+    def is_learning_intent(self, message: str) -> bool:
+        return self.analyze(message)[1]
+
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+
+def get_profile_extractor() -> ProfileExtractor:
+    """
+    Process-wide extractor compiled from TAXONOMY_PATH on first use.
+    """
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                _extractor = ProfileExtractor.from_file(settings.TAXONOMY_PATH or DEFAULT_TAXONOMY_PATH)
+    return _extractor
@@ -1,21 +1,17 @@
 # utils/prompts.py
+import logging
+import re
 
-def build_learning_path_prompt(user_profile, courses):
-    course_block = "\n".join([
-        f"""
-Course:
-- Title: {c.get('title')}
-- URL: {c.get('url')}
-- Platform: {c.get('site')}
-- Rating: {c.get('rating')}
-- Skills: {c.get('skills')}
-- Instructor: {c.get('instructors')}
-- Intro: {c.get('intro')}
-"""
-        for c in courses
-    ])
+from config.config import settings
+from utils.tokens import count_tokens, truncate_to_tokens
+from utils.tracing import span
 
-    return f"""
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------
+# STATIC BLOCKS (compiled once at import)
+# ------------------------------------------------------
+_HEADER = """
 You are Edu.AI — an expert AI mentor specializing in designing highly structured, professional learning paths.
 Your outputs must always follow a clean, readable, bullet-point-driven format.
 
@@ -57,22 +53,182 @@ Describe in 2–3 sentences what the learner will be able to do after completing
 
 -------------------------------------------------------------------
 
-User Profile:
-- Field of interest: {user_profile.get('field_of_interest')}
-- Skills to master: {user_profile.get('skills_to_master')}
-- Preference: {user_profile.get('preference')}
-- Skill level: {user_profile.get('level')}
-- Weekly study hours: {user_profile.get('availability')}
-- Career goal: {user_profile.get('career_goal')}
+"""
+
+_PROFILE = """User Profile:
+- Field of interest: {p[field_of_interest]}
+- Skills to master: {p[skills_to_master]}
+- Preference: {p[preference]}
+- Skill level: {p[level]}
+- Weekly study hours: {p[availability]}
+- Career goal: {p[career_goal]}
+
+"""
 
-Recommended Course Metadata:
+_COURSES = """Recommended Course Metadata:
 {course_block}
 
-RULES:
+"""
+
+_RULES = """RULES:
 - Absolutely NO long paragraphs.
 - Only structured sections + bullets.
 - Every course must be separated clearly.
 - URLs must appear on their own lines.
 - Output must look like a professional curriculum created by Edu.AI.
 """
-    
+
+_STATIC_TOKENS = count_tokens(_HEADER) + count_tokens(_RULES) + count_tokens(_COURSES)
+
+PROFILE_KEYS = ["field_of_interest", "skills_to_master", "preference", "level", "availability", "career_goal"]
+
+# course fields in prompt order: (label, key)
+_COURSE_FIELDS = [
+    ("Title", "title"),
+    ("URL", "url"),
+    ("Platform", "site"),
+    ("Rating", "rating"),
+    ("Skills", "skills"),
+    ("Instructor", "instructors"),
+    ("Intro", "intro"),
+]
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_LIST_SPLIT_RE = re.compile(r"\s*[,;|]\s*")
+_TITLE_KEY_RE = re.compile(r"[^a-z0-9]+")
+
+
+# ------------------------------------------------------
+# COURSE CONDENSING
+# ------------------------------------------------------
+def shorten_text(text, max_tokens: int) -> str:
+    """
+    Keep whole leading sentences that fit in max_tokens; if even the first
+    sentence is too long, cut it at a word boundary.
+    """
+    text = " ".join(str(text or "").split())
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    kept, used = [], 0
+    for sentence in _SENTENCE_RE.split(text):
+        n = count_tokens(sentence)
+        if used + n > max_tokens:
+            break
+        kept.append(sentence)
+        used += n
+    return " ".join(kept) if kept else truncate_to_tokens(text, max_tokens)
+
+
+def shorten_list(value, max_items: int) -> str:
+    """
+    First max_items distinct entries of a comma/semicolon separated field.
+    """
+    items = []
+    for item in _LIST_SPLIT_RE.split(str(value or "").strip().strip("[]")):
+        item = item.strip(" '\"")
+        if item and item.lower() not in (i.lower() for i in items):
+            items.append(item)
+    if len(items) > max_items:
+        return ", ".join(items[:max_items]) + ", …"
+    return ", ".join(items)
+
+
+def _course_key(course: dict):
+    title = _TITLE_KEY_RE.sub(" ", str(course.get("title") or "").lower()).strip()
+    return title or str(course.get("url") or "")
+
+
+def dedupe_courses(courses: list) -> list:
+    """
+    Drop near-identical courses (same normalized title or same URL),
+    keeping the first, i.e. best-ranked, occurrence.
+    """
+    seen_titles, seen_urls, unique = set(), set(), []
+    for c in courses:
+        key, url = _course_key(c), c.get("url")
+        if (key and key in seen_titles) or (url and url in seen_urls):
+            continue
+        seen_titles.add(key)
+        if url:
+            seen_urls.add(url)
+        unique.append(c)
+    return unique
+
+
+def _render_course(course: dict, intro_tokens: int, max_skills: int) -> str:
+    lines = ["Course:"]
+    for label, key in _COURSE_FIELDS:
+        value = course.get(key)
+        if value is None or str(value).strip() in ("", "nan", "None"):
+            continue
+        if key == "intro":
+            value = shorten_text(value, intro_tokens)
+        elif key == "skills":
+            value = shorten_list(value, max_skills)
+        elif key == "instructors":
+            value = shorten_list(value, 2)
+        if value:
+            lines.append(f"- {label}: {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------------------------------
+# COMPILER
+# ------------------------------------------------------
+def compile_learning_path_prompt(user_profile, courses, max_tokens: int = None):
+    """
+    Build the roadmap prompt within an input-token budget.
+    Courses are deduplicated, then intros are shortened step by step,
+    then skill lists, and only then are the lowest-ranked courses dropped.
+    Returns (prompt, report) where report holds the token accounting.
+    """
+    budget = max_tokens or settings.PROMPT_MAX_TOKENS
+    p = {k: (user_profile or {}).get(k) for k in PROFILE_KEYS}
+    profile_block = _PROFILE.format(p=p)
+    fixed = _STATIC_TOKENS + count_tokens(profile_block)
+
+    unique = dedupe_courses(list(courses))
+    kept = list(unique)
+    intro_tokens = settings.PROMPT_INTRO_TOKENS
+    max_skills = settings.PROMPT_MAX_SKILLS
+
+    def render():
+        blocks = [_render_course(c, intro_tokens, max_skills) for c in kept]
+        return blocks, sum(count_tokens(b) for b in blocks)
+
+    blocks, course_tokens = render()
+    while fixed + course_tokens > budget:
+        if intro_tokens > 15:
+            intro_tokens //= 2
+        elif intro_tokens > 0:
+            intro_tokens = 0
+        elif max_skills > 3:
+            max_skills = 3
+        elif len(kept) > 1:
+            kept.pop()
+        else:
+            break
+        blocks, course_tokens = render()
+
+    course_block = "\n".join(blocks)
+    prompt = _HEADER + profile_block + _COURSES.format(course_block=course_block) + _RULES
+    report = {
+        "tokens": fixed + course_tokens,
+        "budget": budget,
+        "courses_in": len(courses),
+        "duplicates": len(courses) - len(unique),
+        "courses_kept": len(kept),
+        "intro_tokens": intro_tokens,
+        "max_skills": max_skills,
+    }
+    return prompt, report
+
+
+def build_learning_path_prompt(user_profile, courses):
+    with span("prompt_build", courses=len(courses)) as s:
+        prompt, report = compile_learning_path_prompt(user_profile, courses)
+        s.set(tokens=report["tokens"], courses_kept=report["courses_kept"])
+    logger.debug("Learning path prompt: %s", report)
+    return prompt
@@ -0,0 +1,120 @@
+# utils/quantization_report.py
+"""
+Memory saved vs. recall@k for the configured collection quantization.
+
+    python -m utils.quantization_report --k 10 --samples 100
+"""
+import argparse
+import json
+import math
+import sys
+
+from qdrant_client.models import SearchParams, QuantizationSearchParams
+
+from config.config import settings
+from utils.indexer import get_qdrant_client, search_params
+
+BYTES_PER_FLOAT = 4
+# rough per-vector HNSW link cost: m=16 links * 2 (layer 0) * 4 bytes
+HNSW_LINK_BYTES = 16 * 2 * 4
+
+
+def collection_quantization(info) -> tuple:
+    """
+    (mode, config) of the collection as Qdrant reports it: "scalar",
+    "binary", "product" or "none" (the collection-wide setting, else the
+    vector params' own).
+    """
+    config = info.config.quantization_config or getattr(info.config.params.vectors, "quantization_config", None)
+    for mode in ("scalar", "binary", "product"):
+        if getattr(config, mode, None) is not None:
+            return mode, getattr(config, mode)
+    return "none", None
+
+
+def memory_estimate(n: int, dim: int, mode: str, on_disk: bool, compression: int = None) -> dict:
+    """
+    RAM needed for vectors + HNSW links, full precision vs. the given mode
+    (compression: the product quantization ratio, e.g. 16 for "x16").
+    """
+    original = n * dim * BYTES_PER_FLOAT
+    if mode == "scalar":
+        quantized = n * dim
+    elif mode == "binary":
+        quantized = n * math.ceil(dim / 8)
+    elif mode == "product":
+        quantized = original // (compression or 1)
+    else:
+        quantized = 0
+    links = n * HNSW_LINK_BYTES
+
+    baseline = original + links
+    ram = links + quantized + (0 if on_disk and quantized else original)
+    return {
+        "points": n,
+        "dim": dim,
+        "baseline_ram_mb": round(baseline / 2**20, 2),
+        "quantized_ram_mb": round(ram / 2**20, 2),
+        "saved_mb": round((baseline - ram) / 2**20, 2),
+        "saved_pct": round(100 * (baseline - ram) / baseline, 1) if baseline else 0.0,
+    }
+
+
+def recall_at_k(k: int = 10, samples: int = 100) -> dict:
+    """
+    Use stored vectors as queries; compare exact search (ground truth)
+    with quantized search with and without rescoring.
+    """
+    client = get_qdrant_client()
+    points, _ = client.scroll(collection_name=settings.COLLECTION_NAME, limit=samples,
+                              with_vectors=True, with_payload=False)
+    rescored = SearchParams(quantization=QuantizationSearchParams(
+        rescore=True, oversampling=settings.QDRANT_OVERSAMPLING))
+    no_rescore = SearchParams(quantization=QuantizationSearchParams(rescore=False, oversampling=1.0))
+
+    totals = {"rescored": 0.0, "no_rescore": 0.0}
+    for p in points:
+        def ids(params):
+            response = client.query_points(collection_name=settings.COLLECTION_NAME, query=p.vector,
+                                           limit=k, search_params=params, with_payload=False)
+            return {h.id for h in response.points}
+
+        truth = ids(search_params(exact=True))
+        if not truth:
+            continue
+        totals["rescored"] += len(truth & ids(rescored)) / len(truth)
+        totals["no_rescore"] += len(truth & ids(no_rescore)) / len(truth)
+
+    n = max(1, len(points))
+    return {f"recall@{k}_{name}": round(v / n, 4) for name, v in totals.items()} | {"queries": len(points)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantization memory/recall report")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=100)
+    args = parser.parse_args()
+
+    info = get_qdrant_client().get_collection(settings.COLLECTION_NAME)
+    vectors = info.config.params.vectors
+    # label with what the collection was built with, not what QDRANT_QUANTIZATION says now
+    mode, config = collection_quantization(info)
+    compression = None
+    if mode == "product":
+        compression = int(str(getattr(config.compression, "value", config.compression)).lstrip("x"))
+    if mode != (settings.QDRANT_QUANTIZATION or "none"):
+        print(f"Note: {settings.COLLECTION_NAME} uses {mode} quantization, "
+              f"QDRANT_QUANTIZATION is {settings.QDRANT_QUANTIZATION}", file=sys.stderr)
+    report = {
+        "collection": settings.COLLECTION_NAME,
+        "quantization": mode,
+        "oversampling": settings.QDRANT_OVERSAMPLING,
+        "memory": memory_estimate(info.points_count or 0, vectors.size, mode,
+                                  bool(vectors.on_disk), compression),
+        "recall": recall_at_k(args.k, args.samples),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
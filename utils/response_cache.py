@@ -0,0 +1,187 @@
+# utils/response_cache.py
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from config.config import settings
+from utils.cache import AsyncSingleFlight, LRUCache, SqliteStore, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS = ["field_of_interest", "skills_to_master", "preference", "level", "availability", "career_goal"]
+
+
+def _norm(value) -> str:
+    return " ".join(str(value or "").lower().split())
+
+
+def roadmap_cache_key(user_profile: dict, retrieved_courses: list, model: str) -> str:
+    """
+    Key = normalized profile fields + sorted retrieved point IDs + model name.
+    """
+    profile = {k: _norm(user_profile.get(k)) for k in PROFILE_FIELDS}
+    skills = [s.strip() for s in profile["skills_to_master"].split(",") if s.strip()]
+    profile["skills_to_master"] = ",".join(sorted(set(skills)))
+    ids = sorted(str(c.get("id")) for c in retrieved_courses if c)
+    raw = json.dumps({"profile": profile, "ids": ids, "model": model}, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache for generated responses, with an optional sqlite
+    backend and a single-flight guard so concurrent identical requests
+    share one LLM call.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, disk_path: str = None):
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_entries)
+        self.disk = None
+        self._flight = SingleFlight()
+        self._async_flight = AsyncSingleFlight()
+        self._streams = {}              # key -> [done event, final text] of the stream in flight
+        self._streams_lock = threading.Lock()
+        if disk_path:
+            try:
+                self.disk = SqliteStore(disk_path, table="responses", max_entries=max_entries * 10)
+            except Exception as e:
+                logger.warning("Response disk cache disabled (%s): %s", disk_path, e)
+
+    def get(self, key):
+        entry = self.memory.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires > time.time():
+                return value
+            self.memory.pop(key)
+
+        if self.disk is not None:
+            blob = self.disk.get(key, max_age=self.ttl)
+            if blob is not None:
+                value = blob.decode("utf-8")
+                self.memory.set(key, (value, time.time() + self.ttl))
+                return value
+        return None
+
+    def set(self, key, value: str):
+        self.memory.set(key, (value, time.time() + self.ttl))
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value.encode("utf-8"))
+            except Exception as e:
+                logger.warning("Response disk cache write failed: %s", e)
+
+    def get_or_compute(self, key, compute, cacheable=None):
+        """
+        Return the cached value for key, or run compute() once across all
+        concurrent callers and cache the result (if cacheable(result)).
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        def run():
+            # another caller may have filled the cache while we waited
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            result = compute()
+            if cacheable is None or cacheable(result):
+                self.set(key, result)
+            return result
+
+        return self._flight.do(key, run)
+
+    async def get_or_compute_async(self, key, compute, cacheable=None):
+        """
+        get_or_compute for asyncio callers: compute is a coroutine function,
+        run once across concurrent identical awaits on the event loop.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        async def run():
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            result = await compute()
+            if cacheable is None or cacheable(result):
+                self.set(key, result)
+            return result
+
+        return await self._async_flight.do(key, run)
+
+    def stream_or_compute(self, key, stream, cacheable=None):
+        """
+        Streaming get_or_compute: a generator of text pieces. The first caller
+        for a key streams stream() and caches the joined text; concurrent
+        identical callers wait for it and yield it in one piece (or stream
+        on their own if the leader failed or was abandoned).
+        """
+        value = self.get(key)
+        if value is not None:
+            yield value
+            return
+
+        with self._streams_lock:
+            call = self._streams.get(key)
+            leader = call is None
+            if leader:
+                call = self._streams[key] = [threading.Event(), None]
+
+        if not leader:
+            call[0].wait()
+            if call[1] is not None:
+                yield call[1]
+                return
+            leader_failed = True
+        else:
+            leader_failed = False
+
+        try:
+            # another caller may have filled the cache while we waited
+            cached = self.get(key)
+            if cached is not None:
+                call[1] = cached
+                yield cached
+                return
+            parts = []
+            for piece in stream():
+                parts.append(piece)
+                yield piece
+            text = "".join(parts)
+            if cacheable is None or cacheable(text):
+                self.set(key, text)
+                call[1] = text
+        finally:
+            if not leader_failed:
+                with self._streams_lock:
+                    self._streams.pop(key, None)
+                call[0].set()
+
+    def stats(self) -> dict:
+        return self.memory.stats()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Process-wide roadmap cache (None when ROADMAP_CACHE_SIZE is 0).
+    """
+    global _cache
+    if _cache is None and settings.ROADMAP_CACHE_SIZE > 0:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    ttl=settings.ROADMAP_CACHE_TTL,
+                    max_entries=settings.ROADMAP_CACHE_SIZE,
+                    disk_path=settings.ROADMAP_CACHE_PATH or None,
+                )
+    return _cache
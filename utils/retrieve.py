@@ -1,141 +1,355 @@
 # utils/retrieve.py
+import asyncio
+import logging
 import re
 import json
-from models.embeddings import embed_single
-from utils.indexer import search_vector
+from config.config import settings
+from models.embeddings import embed_single, embed_texts, embed_single_async, embed_texts_async
+from utils.indexer import (
+    fetch_payloads, search_vector, search_vectors_batch, search_vector_async, search_vectors_batch_async,
+)
 from utils.prompts import build_learning_path_prompt
-from models.llm import LLMModel
+from models.llm import get_llm, GENERATE_ERROR
+from utils.response_cache import get_response_cache, roadmap_cache_key
+from utils.conversation import ConversationMemory
+from utils.profile_extractor import get_profile_extractor
+from utils.course_store import get_course_store, normalize_course, slim_payloads
+
+logger = logging.getLogger(__name__)
+
+# payload keys generate_learning_path reads (incl. alternative column names)
+COURSE_PAYLOAD_FIELDS = [
+    "title", "course_title", "url", "course_url", "final_url", "site", "rating",
+    "skills", "instructors", "category", "sub-category",
+    "short_intro", "course_short_intro", "Short Intro",
+]
+
+
+def _search_payload():
+    """
+    What vector search should return: ids + scores only when payloads are
+    slim and the course store is there, else the prompt's payload fields.
+    """
+    if not slim_payloads():
+        return COURSE_PAYLOAD_FIELDS
+    if get_course_store() is None:
+        logger.error("COURSE_STORE_SLIM_PAYLOADS is on but %s is missing: courses have no metadata",
+                     settings.COURSE_STORE_PATH)
+        return COURSE_PAYLOAD_FIELDS
+    return False
+
+
+def hydrate_hits(hits: list) -> list:
+    """
+    Attach normalized course records to hits (in place) as hit["course"],
+    from the course store when there is one. Hits the store does not know
+    (stale store) get their payload fetched from the vector store instead.
+    """
+    todo = [h for h in hits if h and "course" not in h]
+    if not todo:
+        return hits
+    store = get_course_store()
+    records = store.get_many([h["id"] for h in todo]) if store is not None else [None] * len(todo)
+
+    missing = []
+    for hit, record in zip(todo, records):
+        if record is None:
+            course = normalize_course(hit.get("payload") or {})
+            if course["title"] is None and course["url"] is None:
+                missing.append(hit)
+                continue
+            record = course
+        hit["course"] = record
+        hit["payload"] = hit.get("payload") or record
+
+    if missing:
+        logger.warning("%d retrieved courses are not in the course store, fetching their payloads", len(missing))
+        payloads = fetch_payloads([h["id"] for h in missing], COURSE_PAYLOAD_FIELDS)
+        for hit in missing:
+            hit["payload"] = payloads.get(hit["id"]) or hit.get("payload") or {}
+            hit["course"] = normalize_course(hit["payload"])
+            if hit["course"]["title"] is None:
+                logger.error("Course %s has no metadata in the store or the vector payload", hit["id"])
+    return hits
+
+
+def _case_variants(value: str) -> list:
+    # keyword payload matches are exact in Qdrant, so cover the usual spellings
+    return sorted({value, value.lower(), value.title(), value.upper()})
+
+
+def filters_from_profile(user_profile: dict) -> dict:
+    """
+    Structured search filters derived from the parsed profile + config.
+    Returns {} when profile filtering is disabled.
+    """
+    if not settings.PROFILE_FILTERS:
+        return {}
+    filters = {}
+    level = (user_profile or {}).get("level")
+    if level:
+        filters["level"] = _case_variants(level) + _case_variants("all levels")
+    if settings.COURSE_LANGUAGE:
+        filters["language"] = _case_variants(settings.COURSE_LANGUAGE)
+    if settings.MIN_COURSE_RATING > 0:
+        filters["rating"] = {"gte": settings.MIN_COURSE_RATING}
+    return filters
+
+
+def build_subqueries(user_profile: dict, max_queries: int = 6) -> list:
+    """
+    Split a profile into focused search queries: the combined
+    field + skills query first, then one query per skill.
+    """
+    field = ((user_profile or {}).get("field_of_interest") or "").strip()
+    skills_raw = (user_profile or {}).get("skills_to_master") or ""
+    skills = [s.strip() for s in re.split(r",|/|;|\band\b", skills_raw) if s.strip()]
+
+    new_skills = [s for s in skills if s.lower() not in field.lower()]
+    queries = [(field + " " + ", ".join(new_skills)).strip()]
+    queries += [f"{field} {skill}".strip() for skill in new_skills]
+
+    unique = []
+    for q in queries:
+        if q and q.lower() not in (u.lower() for u in unique):
+            unique.append(q)
+    return unique[:max_queries] or ["machine learning"]
+
+
+def reciprocal_rank_fusion(result_lists, top_k: int, k: int = 60) -> list:
+    """
+    Merge ranked hit lists by point ID; score = sum(1 / (k + rank)).
+    """
+    fused = {}
+    hits_by_id = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, 1):
+            fused[hit["id"]] = fused.get(hit["id"], 0.0) + 1.0 / (k + rank)
+            hits_by_id.setdefault(hit["id"], hit)
+    ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [dict(hits_by_id[pid], score=fused[pid]) for pid in ranked]
+
 
 class CourseRetriever:
 
     def __init__(self):
-        self.llm = LLMModel()
+        self.llm = get_llm()
+        self.response_cache = get_response_cache()
 
     def is_learning_intent(self, text: str) -> bool:
         """
         Lightweight intent detector to decide if user wants to learn / get courses.
-        This keeps the main app fast and simple.
-        """
-        t = (text or "").lower()
-        # phrases that indicate the user wants course recommendations / learning path
-        keywords = [
-            "learn", "learning", "i want to learn", "recommend me a course",
-            "recommend courses", "recommend course", "course for", "teach me",
-            "i want to study", "want to study", "suggest a course", "recommend"
-        ]
-        for k in keywords:
-            if k in t:
-                return True
-        return False
-
-    def retrieve_courses(self, query: str, top_k: int = 5):
+        Intent phrases live in the taxonomy and are matched as whole words.
+        """
+        return get_profile_extractor().is_learning_intent(text or "")
+
+    def retrieve_courses(self, query: str, top_k: int = 5, filters: dict = None):
         """
         Query Qdrant for similar courses.
+        filters (see filters_from_profile) are pushed down into the search;
+        if they leave fewer than top_k hits, the rest is filled unfiltered.
+        Only the payload fields the roadmap prompt uses are fetched.
         """
         if not query:
             query = "machine learning"  # fallback default
         query_vec = embed_single(query)
-        results = search_vector(query_vec, top_k)
-        return results
+        results = search_vector(query_vec, top_k, query_filter=filters or None,
+                                payload_fields=_search_payload())
+        if filters and len(results) < top_k:
+            seen = {r["id"] for r in results}
+            extra = search_vector(query_vec, top_k, payload_fields=_search_payload())
+            results += [r for r in extra if r["id"] not in seen][:top_k - len(results)]
+        return hydrate_hits(results)
 
-    def generate_learning_path(self, user_profile: dict, retrieved_courses: list):
+    def retrieve_courses_multi(self, user_profile: dict, top_k: int = 5, filters: dict = None,
+                               per_query_k: int = None):
         """
-        Build the roadmap using cleaned course data + LLM.
+        Fan-out retrieval: embed every sub-query in one batch, run them as one
+        batched vector search and fuse the results by point ID (RRF).
+        """
+        queries = build_subqueries(user_profile)
+        per_query_k = per_query_k or top_k
+        result_lists = self.search_subqueries(queries, per_query_k, filters)
+        return self.fuse_subquery_results(queries, result_lists, top_k, filters, per_query_k)
+
+    def search_subqueries(self, queries: list, per_query_k: int, filters: dict = None,
+                          payload_fields: list = None) -> list:
+        """
+        One batched embed + one batched search; returns a hit list per query.
         """
+        return self.search_vectors(embed_texts(queries), per_query_k, filters, payload_fields)
 
+    def search_vectors(self, vectors: list, per_query_k: int, filters: dict = None,
+                       payload_fields: list = None) -> list:
+        """
+        One batched search over already embedded queries; a hit list per vector.
+        """
+        payload = _search_payload()
+        if payload is not False and payload_fields:
+            payload = payload_fields
+        return search_vectors_batch(vectors, per_query_k, query_filter=filters or None,
+                                    payload_fields=payload)
+
+    def fuse_subquery_results(self, queries: list, result_lists: list, top_k: int,
+                              filters: dict = None, per_query_k: int = None,
+                              unfiltered_lists: list = None) -> list:
+        """
+        RRF over per-query hit lists; if filters left fewer than top_k
+        courses, the rest is filled from an unfiltered search (or from
+        unfiltered_lists, when the caller already ran it).
+        """
+        results = reciprocal_rank_fusion(result_lists, top_k)
+        if filters and len(results) < top_k:
+            if unfiltered_lists is None:
+                unfiltered_lists = self.search_subqueries(queries, per_query_k or top_k)
+            seen = {r["id"] for r in results}
+            extra = reciprocal_rank_fusion(unfiltered_lists, top_k)
+            results += [r for r in extra if r["id"] not in seen][:top_k - len(results)]
+        return hydrate_hits(results)
+
+    def _build_learning_path_prompt(self, user_profile: dict, retrieved_courses: list):
         cleaned_courses = []
 
         for item in retrieved_courses:
-            payload = item.get("payload", {}) if item else {}
-            cleaned_courses.append({
-                "title": payload.get("title") or payload.get("course_title"),
-                "url": payload.get("url") or payload.get("course_url") or payload.get("final_url"),
-                "site": payload.get("site"),
-                "rating": payload.get("rating"),
-                "skills": payload.get("skills"),
-                "instructors": payload.get("instructors"),
-                "category": payload.get("category") or payload.get("sub-category"),
-                "intro": payload.get("short_intro") or payload.get("course_short_intro") or payload.get("Short Intro")
-            })
-
-        prompt = build_learning_path_prompt(user_profile, cleaned_courses)
-        return self.llm.generate(prompt)
-
-    def continue_conversation(self, user_message, history):
+            item = item or {}
+            # course-store records are already normalized; raw payloads get their aliases resolved
+            cleaned_courses.append(item.get("course") or normalize_course(item.get("payload") or {}))
+
+        return build_learning_path_prompt(user_profile, cleaned_courses)
+
+    def generate_learning_path(self, user_profile: dict, retrieved_courses: list):
+        """
+        Build the roadmap using cleaned course data + LLM.
+        Identical profile + course set + model is served from the roadmap cache.
+        """
+        def generate():
+            prompt = self._build_learning_path_prompt(user_profile, retrieved_courses)
+            return self.llm.generate(prompt)
+
+        if self.response_cache is None:
+            return generate()
+        key = roadmap_cache_key(user_profile, retrieved_courses, self.llm.model)
+        return self.response_cache.get_or_compute(key, generate, cacheable=lambda r: r != GENERATE_ERROR)
+
+    def generate_learning_path_stream(self, user_profile: dict, retrieved_courses: list):
+        """
+        Same as generate_learning_path, but yields the roadmap as it is generated.
+        A cached roadmap is yielded in one piece; a fresh one is cached once
+        complete. Concurrent identical requests share one LLM stream: the
+        others get the finished roadmap in one piece.
+        """
+        def stream():
+            prompt = self._build_learning_path_prompt(user_profile, retrieved_courses)
+            return self.llm.generate_stream(prompt)
+
+        if self.response_cache is None:
+            yield from stream()
+            return
+        key = roadmap_cache_key(user_profile, retrieved_courses, self.llm.model)
+        yield from self.response_cache.stream_or_compute(key, stream, cacheable=lambda t: GENERATE_ERROR not in t)
+
+    def _chat_messages(self, user_message, history, memory):
+        # LLM expects -> [{"role": "...", "content": "..."}], trimmed to the token budget
+        if memory is None:
+            return ConversationMemory().build_messages(history, user_message)
+        return memory.build_messages(history, user_message, summarize=self.llm.summarize)
+
+    def continue_conversation(self, user_message, history, memory: ConversationMemory = None):
         """
         Continue normal chat using LLM.
         history is [(role, msg), (role, msg) ...]
+        Pass the session's ConversationMemory to keep a rolling summary of
+        older turns; without it, turns outside the window are summarized
+        extractively on every call.
         """
-
-        # LLM expects -> [{"role": "...", "content": "..."}]
-        formatted_history = [{"role": r, "content": m} for (r, m) in history]
+        formatted_history = self._chat_messages(user_message, history, memory)
 
         return self.llm.chat(user_message, formatted_history)
 
+    def continue_conversation_stream(self, user_message, history, memory: ConversationMemory = None):
+        """
+        Same as continue_conversation, but yields the reply as it is generated.
+        """
+        formatted_history = self._chat_messages(user_message, history, memory)
+
+        return self.llm.chat_stream(user_message, formatted_history)
+
+    # -----------------------------
+    # ASYNC API (one event loop can serve many sessions)
+    # -----------------------------
+    async def retrieve_courses_async(self, query: str, top_k: int = 5, filters: dict = None):
+        """
+        retrieve_courses for asyncio callers.
+        """
+        if not query:
+            query = "machine learning"
+        query_vec = await embed_single_async(query)
+        results = await search_vector_async(query_vec, top_k, query_filter=filters or None,
+                                            payload_fields=_search_payload())
+        if filters and len(results) < top_k:
+            seen = {r["id"] for r in results}
+            extra = await search_vector_async(query_vec, top_k, payload_fields=_search_payload())
+            results += [r for r in extra if r["id"] not in seen][:top_k - len(results)]
+        return hydrate_hits(results)
+
+    async def retrieve_courses_multi_async(self, user_profile: dict, top_k: int = 5, filters: dict = None,
+                                           per_query_k: int = None):
+        """
+        retrieve_courses_multi for asyncio callers.
+        """
+        queries = build_subqueries(user_profile)
+        per_query_k = per_query_k or top_k
+        vectors = await embed_texts_async(queries)
+
+        result_lists = await search_vectors_batch_async(vectors, per_query_k, query_filter=filters or None,
+                                                        payload_fields=_search_payload())
+        results = reciprocal_rank_fusion(result_lists, top_k)
+
+        if filters and len(results) < top_k:
+            seen = {r["id"] for r in results}
+            extra = reciprocal_rank_fusion(
+                await search_vectors_batch_async(vectors, per_query_k, payload_fields=_search_payload()), top_k)
+            results += [r for r in extra if r["id"] not in seen][:top_k - len(results)]
+        return hydrate_hits(results)
+
+    async def generate_learning_path_async(self, user_profile: dict, retrieved_courses: list):
+        """
+        generate_learning_path for asyncio callers (same roadmap cache and
+        key); concurrent identical requests share one LLM call.
+        """
+        async def generate():
+            prompt = self._build_learning_path_prompt(user_profile, retrieved_courses)
+            return await self.llm.generate_async(prompt)
+
+        if self.response_cache is None:
+            return await generate()
+        key = roadmap_cache_key(user_profile, retrieved_courses, self.llm.model)
+        return await self.response_cache.get_or_compute_async(key, generate,
+                                                              cacheable=lambda r: r != GENERATE_ERROR)
+
+    async def continue_conversation_async(self, user_message, history, memory: ConversationMemory = None):
+        """
+        continue_conversation for asyncio callers.
+        """
+        # building the window may call the (blocking) summarizer -> keep it off the loop
+        formatted_history = await asyncio.to_thread(self._chat_messages, user_message, history, memory)
+
+        return await self.llm.chat_async(user_message, formatted_history)
+
 
 
 # ------------------------------------------------------
 # PROFILE PARSER
 # ------------------------------------------------------
 def parse_profile_from_message(message: str):
-
+    """
+    Extract profile fields from a message in one pass over the compiled
+    taxonomy (config/taxonomy.json).
+    """
     if not message:
         return {}
 
-    m = message.lower()
-
-    extracted = {
-        "field_of_interest": None,
-        "skills_to_master": None,
-        "preference": None,
-        "level": None,
-        "career_goal": None,
-        "availability": None
-    }
-
-    # Field detection (more permissive)
-    fields = [
-        "machine learning", "ml", "web development", "web dev", "cybersecurity",
-        "ui design", "data science", "cloud computing", "ai", "java", "python"
-    ]
-    for f in fields:
-        if f in m:
-            # normalize ml -> machine learning
-            if f == "ml":
-                f = "machine learning"
-            extracted["field_of_interest"] = f
-            break
-
-    # Skills (add a few common keywords)
-    skills = re.findall(r"(python|react|node|sql|javascript|html|css|nlp|dl|ml|data science|java|pandas|numpy|pytorch)", m)
-    if skills:
-        extracted["skills_to_master"] = ", ".join(sorted(set(skills)))
-
-    # Preference detection
-    if "video" in m or "video-based" in m or "videos" in m:
-        extracted["preference"] = "video courses"
-    elif "text" in m or "book" in m or "article" in m:
-        extracted["preference"] = "text-based learning"
-
-    # Level
-    if "beginner" in m:
-        extracted["level"] = "beginner"
-    elif "intermediate" in m:
-        extracted["level"] = "intermediate"
-    elif "advanced" in m:
-        extracted["level"] = "advanced"
-
-    # Career goal
-    goal_match = re.search(r"become (an? )?([a-z ]+)", m)
-    if goal_match:
-        extracted["career_goal"] = goal_match.group(2).strip()
-
-    # Availability (hours)
-    time_match = re.search(r"(\d+)\s*(hours|hrs|hour)\/?\s*(week|weekly)?", m)
-    if time_match:
-        extracted["availability"] = time_match.group(1) + " hours/week"
-
-    return extracted
+    return get_profile_extractor().extract(message)
 
 
 # ------------------------------------------------------
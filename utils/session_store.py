@@ -0,0 +1,261 @@
+# utils/session_store.py
+"""
+Bounded per-session state for the Streamlit app.
+
+Each session keeps at most SESSION_MAX_TURNS turns (and SESSION_MAX_KB of
+text) in memory; older turns are spilled to a sqlite file and read back
+only when needed. Retrieved courses are kept as point id references and
+re-hydrated from the course store. Sessions idle for longer than
+SESSION_IDLE_SECONDS are parked whole in sqlite and restored on their
+next request; parked sessions untouched for SESSION_TTL_SECONDS are
+deleted together with their spilled turns.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+
+from config.config import settings
+from utils.cache import SqliteStore
+from utils.conversation import ConversationMemory
+from utils.course_store import get_course_store, normalize_course
+from utils.prompts import PROFILE_KEYS
+
+logger = logging.getLogger(__name__)
+
+
+def _turn_bytes(role: str, msg: str) -> int:
+    return sys.getsizeof(role) + sys.getsizeof(msg or "")
+
+
+class SessionHistory:
+    """
+    Conversation turns [(role, msg), ...]. Indexing and slicing use absolute
+    turn numbers like a list; turns before `offset` live in sqlite.
+    """
+
+    def __init__(self, session_id: str, spill: SqliteStore, max_turns: int = None, max_bytes: int = None):
+        self.session_id = session_id
+        self.spill = spill
+        self.max_turns = max_turns or settings.SESSION_MAX_TURNS
+        self.max_bytes = max_bytes or settings.SESSION_MAX_KB * 1024
+        self.offset = 0         # turns [0, offset) are spilled
+        self.recent = []
+        self.bytes = 0
+
+    def _key(self, index: int) -> str:
+        return f"{self.session_id}:turn:{index}"
+
+    def __len__(self):
+        return self.offset + len(self.recent)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return self._range(start, stop) if step == 1 else self._range(0, len(self))[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        return self._range(index, index + 1)[0]
+
+    def _range(self, start: int, stop: int) -> list:
+        turns = []
+        if start < min(stop, self.offset):
+            keys = [self._key(i) for i in range(start, min(stop, self.offset))]
+            found = self.spill.get_many(keys)
+            turns += [tuple(json.loads(found[k])) if k in found else ("assistant", "[earlier message expired]")
+                      for k in keys]
+        turns += self.recent[max(start - self.offset, 0):max(stop - self.offset, 0)]
+        return turns
+
+    def append(self, role: str, msg: str):
+        self.recent.append((role, msg))
+        self.bytes += _turn_bytes(role, msg)
+        self._trim()
+
+    def _trim(self):
+        n, size = 0, self.bytes
+        # always keep the newest turn in memory
+        while len(self.recent) - n > 1 and (len(self.recent) - n > self.max_turns or size > self.max_bytes):
+            size -= _turn_bytes(*self.recent[n])
+            n += 1
+        if not n:
+            return
+        self.spill.set_many({self._key(self.offset + i): json.dumps(turn).encode("utf-8")
+                             for i, turn in enumerate(self.recent[:n])})
+        self.recent = self.recent[n:]
+        self.offset += n
+        self.bytes = size
+
+    def earlier(self) -> list:
+        """
+        Spilled turns, read from sqlite.
+        """
+        return self._range(0, self.offset)
+
+    def to_dict(self) -> dict:
+        return {"offset": self.offset, "recent": self.recent}
+
+    def load_dict(self, data: dict):
+        self.offset = data["offset"]
+        self.recent = [tuple(t) for t in data["recent"]]
+        self.bytes = sum(_turn_bytes(r, m) for r, m in self.recent)
+
+
+class SessionState:
+    """
+    Everything one chat session needs between reruns.
+    """
+
+    def __init__(self, session_id: str, spill: SqliteStore):
+        self.session_id = session_id
+        self.history = SessionHistory(session_id, spill)
+        self.memory = ConversationMemory()  # token-budgeted LLM context for follow-up chat
+        self.profile = {k: None for k in PROFILE_KEYS}
+        self.course_refs = []               # [{"id", "score"}] (+ title/url without a course store)
+        self.intent_active = False          # user signalled intent to learn (profile collection in progress)
+        self.roadmap_generated = False      # roadmap already created
+        self.last_active = time.time()
+
+    def set_courses(self, hits: list):
+        """
+        Keep retrieved courses as id references, not full payloads.
+        """
+        keep_fields = get_course_store() is None
+        refs = []
+        for hit in hits or []:
+            ref = {"id": hit["id"], "score": hit.get("score")}
+            if keep_fields:
+                course = hit.get("course") or normalize_course(hit.get("payload") or {})
+                ref.update(title=course["title"], url=course["url"])
+            refs.append(ref)
+        self.course_refs = refs
+
+    def courses(self) -> list:
+        """
+        Retrieved courses in search-hit shape, hydrated from the course store.
+        """
+        store = get_course_store()
+        records = store.get_many([r["id"] for r in self.course_refs]) if store is not None else \
+            [{k: v for k, v in r.items() if k not in ("id", "score")} for r in self.course_refs]
+        return [{"id": r["id"], "score": r["score"], "payload": rec or {}, "course": rec}
+                for r, rec in zip(self.course_refs, records)]
+
+    def memory_bytes(self) -> int:
+        """
+        Approximate bytes held in memory by this session (text dominates).
+        """
+        size = self.history.bytes
+        size += sys.getsizeof(self.memory.summary) + sys.getsizeof(self.memory.roadmap_ref)
+        size += sum(sys.getsizeof(v) for v in self.profile.values() if v)
+        size += sum(sys.getsizeof(r) for r in self.course_refs)
+        return size
+
+    def to_json(self) -> bytes:
+        return json.dumps({
+            "history": self.history.to_dict(),
+            "memory": vars(self.memory),
+            "profile": self.profile,
+            "course_refs": self.course_refs,
+            "intent_active": self.intent_active,
+            "roadmap_generated": self.roadmap_generated,
+        }).encode("utf-8")
+
+    def load_json(self, raw: bytes):
+        data = json.loads(raw)
+        self.history.load_dict(data["history"])
+        vars(self.memory).update(data["memory"])
+        self.profile.update(data["profile"])
+        self.course_refs = data["course_refs"]
+        self.intent_active = data["intent_active"]
+        self.roadmap_generated = data["roadmap_generated"]
+
+
+class SessionRegistry:
+    """
+    Process-wide home of all SessionStates. Idle sessions are parked in the
+    spill file (and dropped from memory); get() brings them back.
+    Spilled turns and parked states live in separate tables: only turns are
+    LRU-capped, a parked state is kept until restored or expired.
+    """
+
+    def __init__(self, spill_path: str = None, idle_seconds: float = None, max_entries: int = None,
+                 ttl_seconds: float = None):
+        path = spill_path or settings.SESSION_SPILL_PATH
+        self.turns = SqliteStore(path, table="session_turns",
+                                 max_entries=max_entries or settings.SESSION_SPILL_MAX_ENTRIES)
+        self.states = SqliteStore(path, table="session_states")
+        self.idle_seconds = idle_seconds or settings.SESSION_IDLE_SECONDS
+        self.ttl_seconds = ttl_seconds or settings.SESSION_TTL_SECONDS
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self.stats = {"parked": 0, "restored": 0, "expired": 0}
+
+    @staticmethod
+    def new_session_id() -> str:
+        return uuid.uuid4().hex
+
+    def get(self, session_id: str) -> SessionState:
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = SessionState(session_id, self.turns)
+                raw = self.states.get(session_id)
+                if raw is not None:
+                    state.load_json(raw)
+                    self.states.delete([session_id])
+                    self.stats["restored"] += 1
+                self._sessions[session_id] = state
+            state.last_active = time.time()
+        self.sweep()
+        return state
+
+    def sweep(self):
+        """
+        Park sessions idle for longer than idle_seconds and delete expired
+        parked ones (at most every idle_seconds / 10).
+        """
+        now = time.time()
+        if now - self._last_sweep < self.idle_seconds / 10:
+            return
+        with self._lock:
+            self._last_sweep = now
+            idle = [s for s in self._sessions.values() if now - s.last_active > self.idle_seconds]
+            for state in idle:
+                self.states.set(state.session_id, state.to_json())
+                del self._sessions[state.session_id]
+            self.stats["parked"] += len(idle)
+            expired = self._expire()
+        if idle or expired:
+            logger.info("Parked %d idle sessions, deleted %d expired; %s", len(idle), expired,
+                        self.memory_report())
+
+    def _expire(self) -> int:
+        # parked sessions nobody came back to, with their spilled turns
+        expired = self.states.keys(idle_for=self.ttl_seconds)
+        self.states.delete(expired)
+        for session_id in expired:
+            self.turns.delete_prefix(f"{session_id}:turn:")
+        # turns of sessions that are neither live nor parked (e.g. the process restarted)
+        known = set(self._sessions) | set(self.states.keys())
+        self.turns.delete([k for k in self.turns.keys(idle_for=self.ttl_seconds)
+                           if k.split(":", 1)[0] not in known])
+        self.stats["expired"] += len(expired)
+        return len(expired)
+
+    def memory_report(self) -> dict:
+        with self._lock:
+            sizes = [s.memory_bytes() for s in self._sessions.values()]
+        return {
+            "sessions": len(sizes),
+            "bytes": sum(sizes),
+            "max_session_bytes": max(sizes, default=0),
+            **self.stats,
+        }
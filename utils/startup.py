@@ -0,0 +1,86 @@
+# utils/startup.py
+import importlib
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# stage -> seconds, filled once per process
+_timings = {}
+
+
+def record_timing(stage: str, seconds: float):
+    """
+    Record a startup stage; the first measurement wins (reruns don't overwrite).
+    """
+    _timings.setdefault(stage, round(seconds, 4))
+
+
+@contextmanager
+def timed(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(stage, time.perf_counter() - t0)
+
+
+def warm_up(embedder: bool = True, llm: bool = True, vector: bool = True) -> dict:
+    """
+    Load the process-wide singletons ahead of the first user request.
+    Each stage is optional and failures are logged, not raised.
+    """
+    if embedder:
+        try:
+            from models.embeddings import get_model, embed_single
+            with timed("warmup:embedder_load"):
+                get_model()
+            with timed("warmup:first_encode"):
+                embed_single("warm up")
+        except Exception as e:
+            logger.warning("Embedder warm-up failed: %s", e)
+
+    if llm:
+        try:
+            from models.llm import get_llm
+            with timed("warmup:llm_client"):
+                get_llm()
+        except Exception as e:
+            logger.warning("LLM warm-up failed: %s", e)
+
+    if vector:
+        try:
+            from utils.indexer import get_search_backend
+            with timed("warmup:vector_backend"):
+                get_search_backend()
+        except Exception as e:
+            logger.warning("Vector backend warm-up failed: %s", e)
+
+    report = startup_report()
+    logger.info("Startup report: %s", json.dumps(report))
+    return report
+
+
+def startup_report() -> dict:
+    return dict(_timings)
+
+
+def main():
+    """
+    python -m utils.startup -> import + warm-up timing report as JSON.
+    """
+    for module in ["config.config", "models.embeddings", "models.llm",
+                   "utils.indexer", "utils.retrieve", "streamlit"]:
+        try:
+            with timed(f"import:{module}"):
+                importlib.import_module(module)
+        except Exception as e:
+            logger.warning("Import of %s failed: %s", module, e)
+    print(json.dumps(warm_up(), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,22 +1,45 @@
 # text_chunking.py
+import pandas as pd
+
+# (label, column) pairs that make up a course's embedding text, in order
+EMBEDDING_FIELDS = [
+    ("Title", "title"),
+    ("Short Intro", "short_intro"),
+    ("Category", "category"),
+    ("Sub Category", "sub-category"),
+    ("Type", "course_type"),
+    ("Language", "language"),
+    ("Skills", "skills"),
+    ("Instructors", "instructors"),
+    ("Rating", "rating"),
+    ("URL", "url"),
+]
+
 
 def chunk_course_row(row):
     """
     Convert a dataframe row into a clean text block used for vector embedding.
     """
 
-    fields = [
-        ("Title", row.get("title", "")),
-        ("Short Intro", row.get("short_intro", "")),
-        ("Category", row.get("category", "")),
-        ("Sub Category", row.get("sub-category", "")),
-        ("Type", row.get("course_type", "")),
-        ("Language", row.get("language", "")),
-        ("Skills", row.get("skills", "")),
-        ("Instructors", row.get("instructors", "")),
-        ("Rating", str(row.get("rating", ""))),
-        ("URL", row.get("url", "")),
-    ]
+    fields = [(label, row.get(column, "")) for label, column in EMBEDDING_FIELDS]
+
+    text = "\n".join(f"{k}: {str(v).strip()}" for k, v in fields
+                     if v is not None and not pd.isna(v) and str(v).strip())
+    return text
 
-    text = "\n".join(f"{k}: {v}" for k, v in fields if v)
+
+def build_embedding_texts(df: pd.DataFrame) -> pd.Series:
+    """
+    Column-wise chunk_course_row for a whole frame: one string operation
+    per field instead of one Python call per row.
+    """
+    text = pd.Series("", index=df.index, dtype=object)
+    for label, column in EMBEDDING_FIELDS:
+        if column not in df.columns:
+            continue
+        values = df[column].astype(str).str.strip()
+        present = df[column].notna() & (values != "")
+        # newline only between fields that are both present
+        text = text.mask(present & (text != ""), text + "\n")
+        text = text + (label + ": " + values).where(present, "")
     return text
@@ -0,0 +1,38 @@
+# utils/tokens.py
+import math
+
+# tiktoken is optional: cl100k_base is close enough to Llama 3's tokenizer
+# for budgeting. Without it we fall back to the ~4 chars/token rule.
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text) -> int:
+    """
+    Approximate number of LLM tokens in text.
+    """
+    if not text:
+        return 0
+    text = str(text)
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def truncate_to_tokens(text, max_tokens: int, suffix: str = "…") -> str:
+    """
+    Cut text to roughly max_tokens, preferring a word boundary.
+    """
+    text = str(text or "")
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        cut = _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        cut = text[:max_tokens * 4]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip() + suffix
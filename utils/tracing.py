@@ -0,0 +1,258 @@
+# utils/tracing.py
+"""
+Per-stage spans for the request path.
+
+    with span("search", top_k=5) as s:
+        hits = ...
+        s.set(hits=len(hits))
+
+Sampled spans feed in-process Prometheus-style metrics (served at
+/metrics on METRICS_PORT) and, with TRACE_LOG, one JSON log line each.
+TRACE_SAMPLE_RATE=0 turns every span into a no-op.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger("edu_ai.trace")
+
+METRIC_PREFIX = "eduai_"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# numeric span attributes summed into <attr>_total counters
+COUNTED_ATTRS = ("vectors", "encoded", "queries", "rows", "prompt_tokens", "completion_tokens")
+# span attributes observed into histograms
+HISTOGRAM_ATTRS = ("ttft_seconds",)
+
+
+# ------------------------------------------------------
+# METRICS REGISTRY
+# ------------------------------------------------------
+class Histogram:
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters and histograms keyed by (name, labels),
+    rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name: str, labels: dict, value: float = 1.0):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: dict, value: float):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        """
+        {name: {labels: value}} for counters, {name: {labels: {count, sum}}} for histograms.
+        """
+        out = {}
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                out.setdefault(name, {})[_label_str(labels)] = value
+            for (name, labels), hist in self._histograms.items():
+                out.setdefault(name, {})[_label_str(labels)] = {"count": hist.count, "sum": round(hist.sum, 6)}
+        return out
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+                    seen.add(name)
+                lines.append(f"{METRIC_PREFIX}{name}{{{_label_str(labels)}}} {value:g}")
+            for (name, labels), hist in sorted(self._histograms.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+                    seen.add(name)
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    le = _label_str(labels + (("le", f"{bound:g}"),))
+                    lines.append(f"{METRIC_PREFIX}{name}_bucket{{{le}}} {cumulative}")
+                le = _label_str(labels + (("le", "+Inf"),))
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{{{le}}} {hist.count}")
+                lines.append(f"{METRIC_PREFIX}{name}_sum{{{_label_str(labels)}}} {hist.sum:.6f}")
+                lines.append(f"{METRIC_PREFIX}{name}_count{{{_label_str(labels)}}} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_str(labels) -> str:
+    return ",".join(f'{k}="{v}"' for k, v in labels)
+
+
+registry = MetricsRegistry()
+
+
+# ------------------------------------------------------
+# SPANS
+# ------------------------------------------------------
+class Span:
+    sampled = True
+
+    def __init__(self, stage: str, attrs: dict):
+        self.stage = stage
+        self.attrs = attrs
+        self.status = "ok"
+        self.start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def fail(self, error):
+        """
+        Mark the span failed without raising (for callers that swallow errors).
+        """
+        self.status = "error"
+        self.attrs["error"] = str(error)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+
+class _NoopSpan:
+    sampled = False
+
+    def set(self, **attrs):
+        pass
+
+    def fail(self, error):
+        pass
+
+    def elapsed(self) -> float:
+        return 0.0
+
+
+_NOOP = _NoopSpan()
+
+
+def _sampled() -> bool:
+    rate = settings.TRACE_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """
+    Time a stage; attributes passed here or via .set() are recorded on exit.
+    """
+    if not _sampled():
+        yield _NOOP
+        return
+    s = Span(stage, attrs)
+    try:
+        yield s
+    except Exception as e:
+        s.fail(e)
+        raise
+    finally:
+        _finish(s, s.elapsed())
+
+
+def _finish(s: Span, duration: float):
+    labels = {"stage": s.stage}
+    registry.observe("stage_duration_seconds", labels, duration)
+    registry.inc("stage_calls_total", {"stage": s.stage, "status": s.status})
+    for attr in COUNTED_ATTRS:
+        value = s.attrs.get(attr)
+        if value:
+            registry.inc(f"{attr}_total", labels, value)
+    for attr in HISTOGRAM_ATTRS:
+        value = s.attrs.get(attr)
+        if value is not None:
+            registry.observe(attr, labels, value)
+
+    if settings.TRACE_LOG:
+        record = {"stage": s.stage, "duration_ms": round(duration * 1000, 3), "status": s.status}
+        record.update(s.attrs)
+        trace_logger.info(json.dumps(record, default=str))
+
+
+def metrics_text() -> str:
+    return registry.render()
+
+
+# ------------------------------------------------------
+# /metrics EXPORTER
+# ------------------------------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of the app log
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = None):
+    """
+    Serve /metrics from a daemon thread (once per process).
+    Does nothing when the port is 0.
+    """
+    global _server
+    port = settings.METRICS_PORT if port is None else port
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e:
+                logger.warning("Metrics server not started on port %s: %s", port, e)
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+            logger.info("Serving metrics on :%s/metrics", port)
+    return _server